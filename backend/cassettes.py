@@ -0,0 +1,217 @@
+"""
+Record/replay of raw Gemini responses ("cassettes")
+In record mode every successful call is saved to GEMINI_CASSETTE_DIR; in replay mode calls are answered from disk.
+The student's name and email in evaluation prompts are redacted before hashing and saving
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+OFF = "off"
+RECORD = "record"
+REPLAY = "replay"
+
+# The STUDENT INFORMATION lines of an evaluation prompt
+_STUDENT_FIELD = re.compile(r"^- (Name|Email): (.+)$", re.MULTILINE)
+
+
+class CassetteMiss(LookupError):
+    """Replay mode found no recorded response for a prompt"""
+
+
+class ReplayedResponse:
+    """Stands in for a GenerateContentResponse loaded from a cassette"""
+
+    def __init__(self, text: str, usage: Optional[Dict[str, int]] = None):
+        self.text = text
+        self.usage_metadata = _Usage(usage) if usage else None
+
+
+class _Usage:
+    def __init__(self, usage: Dict[str, int]):
+        self.prompt_token_count = usage.get("prompt_token_count")
+        self.candidates_token_count = usage.get("candidates_token_count")
+        self.total_token_count = usage.get("total_token_count")
+
+
+def _raw_prompt_text(contents: Any) -> str:
+    items = contents if isinstance(contents, list) else [contents]
+    return "\n".join(item for item in items if isinstance(item, str))
+
+
+def _student_details(text: str) -> Dict[str, str]:
+    """{placeholder: value} for the student's name and email written in an evaluation prompt."""
+    return {
+        f"[student {m.group(1).lower()}]": m.group(2).strip()
+        for m in _STUDENT_FIELD.finditer(text)
+        if m.group(2).strip() not in ("", "Unknown")
+    }
+
+
+def redact(text: str, details: Dict[str, str]) -> str:
+    """`text` with every occurrence of the student's details replaced by its placeholder."""
+    for placeholder, value in sorted(details.items(), key=lambda item: len(item[1]), reverse=True):
+        text = text.replace(value, placeholder)
+    return text
+
+
+def restore(text: str, details: Dict[str, str]) -> str:
+    """Undo redact() with the details of the current prompt's student."""
+    for placeholder, value in details.items():
+        text = text.replace(placeholder, value)
+    return text
+
+
+def prompt_text(contents: Any) -> str:
+    """
+    Text parts of a request, student details redacted (attachments are identified by
+    the filenames in the prompt). The same evaluation for another student has the same text.
+    """
+    text = _raw_prompt_text(contents)
+    return redact(text, _student_details(text))
+
+
+def prompt_kind(text: str) -> str:
+    """paper / section / question / evaluation / other, from the prompt wording."""
+    if 'exactly one entry in "questions"' in text:
+        return "evaluation"
+    if "REPLACEMENT QUESTIONS" in text:
+        return "question"
+    if "ONE SECTION" in text:
+        return "section"
+    if "COMPLETE question paper" in text:
+        return "paper"
+    return "other"
+
+
+def prompt_key(contents: Any) -> str:
+    return hashlib.sha256(prompt_text(contents).encode("utf-8")).hexdigest()
+
+
+def _mode() -> str:
+    return (settings.GEMINI_CASSETTE_MODE or OFF).lower()
+
+
+def _usage_dict(response: Any) -> Optional[Dict[str, int]]:
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return None
+    values = {
+        name: getattr(usage, name, None)
+        for name in ("prompt_token_count", "candidates_token_count", "total_token_count")
+    }
+    return {k: int(v) for k, v in values.items() if v is not None} or None
+
+
+class CassetteStore:
+    """One JSON file per distinct prompt, named <kind>-<prompt hash>.json"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._index: Optional[Dict[str, str]] = None
+        self._lock = threading.Lock()
+
+    def path_for(self, key: str, kind: str) -> str:
+        return os.path.join(self.directory, f"{kind}-{key[:24]}.json")
+
+    def _load_index(self) -> Dict[str, str]:
+        with self._lock:
+            if self._index is None:
+                index = {}
+                for path in self.paths():
+                    name = os.path.basename(path)[:-len(".json")]
+                    index[name.split("-", 1)[-1]] = path
+                self._index = index
+            return self._index
+
+    def paths(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".json")
+        )
+
+    def load(self, path: str) -> Dict[str, Any]:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def find(self, contents: Any) -> Optional[Dict[str, Any]]:
+        path = self._load_index().get(prompt_key(contents)[:24])
+        return self.load(path) if path else None
+
+    def save(self, contents: Any, response: Any, model: Optional[str], latency_seconds: float) -> str:
+        details = _student_details(_raw_prompt_text(contents))
+        text = prompt_text(contents)
+        items = contents if isinstance(contents, list) else [contents]
+        return self.write({
+            "key": prompt_key(contents),
+            "kind": prompt_kind(text),
+            "model": model,
+            "recorded_at": datetime.utcnow().isoformat(),
+            "latency_seconds": round(latency_seconds, 3),
+            "attachments": sum(1 for item in items if not isinstance(item, str)),
+            "prompt": text,
+            "response_text": redact(getattr(response, "text", None) or "", details),
+            "usage": _usage_dict(response),
+        })
+
+    def write(self, entry: Dict[str, Any]) -> str:
+        """Write a cassette entry (needs at least "key" and "kind"); returns its path."""
+        path = self.path_for(entry["key"], entry["kind"])
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._index is not None:
+                self._index[entry["key"][:24]] = path
+        return path
+
+
+store = CassetteStore(settings.GEMINI_CASSETTE_DIR)
+
+
+def replay(contents: Any) -> Optional[ReplayedResponse]:
+    """Recorded response for this prompt in replay mode; None when not replaying."""
+    if _mode() != REPLAY:
+        return None
+    entry = store.find(contents)
+    if entry is None:
+        raise CassetteMiss(
+            f"No recorded Gemini response for this {prompt_kind(prompt_text(contents))} prompt "
+            f"in {store.directory} (GEMINI_CASSETTE_MODE=replay)"
+        )
+    logger.info("AI: cassette replay kind=%s key=%s", entry.get("kind"), entry.get("key", "")[:12])
+    details = _student_details(_raw_prompt_text(contents))
+    return ReplayedResponse(restore(entry.get("response_text", ""), details), entry.get("usage"))
+
+
+def record(contents: Any, response: Any, model: Optional[str], latency_seconds: float) -> None:
+    """Save a successful response in record mode (never fails the call)."""
+    if _mode() != RECORD:
+        return
+    try:
+        path = store.save(contents, response, model, latency_seconds)
+        logger.info("AI: cassette recorded %s", path)
+    except Exception:
+        logger.exception("AI: cassette record failed")
+
+
+async def record_async(contents: Any, response: Any, model: Optional[str], latency_seconds: float) -> None:
+    """record() with the file write off the event loop."""
+    if _mode() != RECORD:
+        return
+    await asyncio.to_thread(record, contents, response, model, latency_seconds)
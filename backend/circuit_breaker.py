@@ -0,0 +1,177 @@
+"""
+Circuit breakers for Gemini models and API keys
+Remembers failing (model, key) pairs across requests so they are skipped without a network call
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import re
+import threading
+import time
+
+from backend.config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Breaker scopes: (model, key_index), (model, None) = model everywhere, (None, key_index) = key for all models
+BreakerKey = Tuple[Optional[str], Optional[int]]
+
+
+class _Breaker:
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0  # consecutive failures
+        self.trips = 0  # consecutive trips without a successful probe
+        self.open_until = 0.0
+        self.probe_started_at: Optional[float] = None
+        self.last_reason: Optional[str] = None
+
+
+class BreakerRegistry:
+    """
+    Closed -> open -> half-open circuit breakers shared by all requests.
+
+    While open, a scope is skipped instantly. After the cooldown one probe
+    request is let through (half-open): success closes the breaker, failure
+    re-opens it with a doubled cooldown (capped).
+    """
+
+    def __init__(self):
+        self._breakers: Dict[BreakerKey, _Breaker] = {}
+        self._lock = threading.Lock()
+
+    def _scopes(self, model: str, key_index: int) -> List[BreakerKey]:
+        return [(model, key_index), (model, None), (None, key_index)]
+
+    def _ready(self, breaker: _Breaker, now: float) -> bool:
+        """True if requests may use this scope now (claims the probe when half-open)."""
+        if breaker.state == CLOSED:
+            return True
+        if breaker.state == OPEN:
+            if now < breaker.open_until:
+                return False
+            breaker.state = HALF_OPEN
+            breaker.probe_started_at = None
+        # HALF_OPEN: a single probe at a time; a probe that never reported back expires
+        if breaker.probe_started_at is not None:
+            if now - breaker.probe_started_at < settings.GEMINI_BREAKER_PROBE_TIMEOUT_SECONDS:
+                return False
+        breaker.probe_started_at = now
+        return True
+
+    def is_open(self, model: Optional[str] = None, key_index: Optional[int] = None) -> bool:
+        """Non-claiming check for a single scope (e.g. the whole model)."""
+        with self._lock:
+            breaker = self._breakers.get((model, key_index))
+            if breaker is None or breaker.state == CLOSED:
+                return False
+            if breaker.state == OPEN:
+                return time.monotonic() < breaker.open_until
+            return breaker.probe_started_at is not None
+
+    def allow(self, model: str, key_index: int) -> bool:
+        """Whether an attempt on (model, key) may be sent; claims half-open probes."""
+        now = time.monotonic()
+        with self._lock:
+            breakers = [self._breakers.get(scope) for scope in self._scopes(model, key_index)]
+            # Check open scopes first so a probe is not claimed on one scope while another blocks
+            for breaker in breakers:
+                if breaker and breaker.state == OPEN and now < breaker.open_until:
+                    return False
+            for breaker in breakers:
+                if breaker and not self._ready(breaker, now):
+                    return False
+            return True
+
+    def release(self, model: str, key_index: int) -> None:
+        """Give back a claimed probe without judging the scope (attempt was not sent or inconclusive)."""
+        with self._lock:
+            for scope in self._scopes(model, key_index):
+                breaker = self._breakers.get(scope)
+                if breaker and breaker.state == HALF_OPEN:
+                    breaker.probe_started_at = None
+
+    def record_success(self, model: str, key_index: int) -> None:
+        with self._lock:
+            for scope in self._scopes(model, key_index):
+                breaker = self._breakers.get(scope)
+                if breaker:
+                    breaker.state = CLOSED
+                    breaker.failures = 0
+                    breaker.trips = 0
+                    breaker.probe_started_at = None
+
+    def record_failure(
+        self,
+        scope: BreakerKey,
+        reason: str,
+        cooldown_seconds: float,
+        threshold: int = 1,
+    ) -> None:
+        """
+        Count a failure on a scope and open it once `threshold` consecutive failures are reached.
+
+        Repeated trips without a successful probe double the cooldown up to
+        GEMINI_BREAKER_MAX_COOLDOWN_SECONDS. A cooldown taken from a server hint
+        should be passed with threshold=1 so it is honoured immediately.
+        """
+        now = time.monotonic()
+        with self._lock:
+            breaker = self._breakers.setdefault(scope, _Breaker())
+            breaker.failures += 1
+            breaker.last_reason = reason
+            if breaker.state != HALF_OPEN and breaker.failures < threshold:
+                return
+            backoff = cooldown_seconds * (2 ** breaker.trips)
+            breaker.trips += 1
+            breaker.state = OPEN
+            breaker.open_until = now + min(backoff, settings.GEMINI_BREAKER_MAX_COOLDOWN_SECONDS)
+            breaker.probe_started_at = None
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Breakers that are not closed, for /api/ai/info."""
+        now = time.monotonic()
+        rows = []
+        with self._lock:
+            for (model, key_index), breaker in self._breakers.items():
+                state = breaker.state
+                if state == OPEN and now >= breaker.open_until:
+                    state = HALF_OPEN
+                if state == CLOSED:
+                    continue
+                rows.append({
+                    "model": model or "*",
+                    "api_key_index": (key_index + 1) if key_index is not None else "*",
+                    "state": state,
+                    "reason": breaker.last_reason,
+                    "consecutive_failures": breaker.failures,
+                    "reopen_in_seconds": round(max(0.0, breaker.open_until - now), 1),
+                })
+        return rows
+
+
+_RETRY_PATTERNS = [
+    re.compile(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", re.IGNORECASE),
+    re.compile(r"retry in (\d+(?:\.\d+)?)\s*s", re.IGNORECASE),
+    re.compile(r"Retry-After['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)", re.IGNORECASE),
+]
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Extract a server-provided retry hint (Retry-After header or RetryInfo.retryDelay)."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        try:
+            value = headers.get("retry-after") or headers.get("Retry-After")
+            if value is not None:
+                return float(value)
+        except (TypeError, ValueError):
+            pass
+
+    message = str(error)
+    for pattern in _RETRY_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return float(match.group(1))
+    return None
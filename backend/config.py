@@ -3,7 +3,7 @@ Configuration management for AI Grader
 Handles environment variables and board-specific patterns
 """
 import os
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -11,6 +11,24 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str = "sqlite:///./ai_grader.db"
+    # "create_all": `alembic upgrade head` at startup (creates a new database, upgrades an existing one)
+    # "migrations": schema is managed by `alembic upgrade head`; startup only checks it is current
+    DB_SCHEMA_MODE: str = "create_all"
+    # Database performance profile
+    DB_ECHO: bool = False  # log every SQL statement (debugging only: synchronous log write per query)
+    # SQLite pragmas applied to each new connection. WAL lets readers run during a write and
+    # NORMAL syncs on checkpoints instead of every commit; use "DELETE" / "FULL" for SQLite's defaults
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # wait this long for the write lock instead of failing at once
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024  # bytes of the file read through mmap; 0 disables
+    SQLITE_ASYNC_POOL_SIZE: int = 5  # aiosqlite connections per worker; SQLite has a single writer anyway
+    # PostgreSQL (and other server databases) connection pool
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20  # extra connections under bursts, closed when returned
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0  # wait for a free connection before erroring
+    DB_POOL_PRE_PING: bool = True  # test connections on checkout (survives server restarts / idle kills)
+    DB_POOL_RECYCLE_SECONDS: int = 1800  # replace connections older than this; -1 disables
     
     # Google Gemini API - Primary and Backup Keys
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
@@ -21,6 +39,49 @@ class Settings(BaseSettings):
     GEMINI_API_KEY_6: str = os.getenv("GEMINI_API_KEY_6", "")
     GEMINI_MODEL: str = "gemini-2.5-flash"
     
+    # Circuit breakers: how long a failing model / key / (model, key) pair is skipped.
+    # Quota cooldowns prefer the server's Retry-After / retryDelay hint when present.
+    GEMINI_INVALID_KEY_COOLDOWN_SECONDS: float = 3600.0
+    GEMINI_QUOTA_COOLDOWN_SECONDS: float = 60.0
+    GEMINI_NOT_FOUND_COOLDOWN_SECONDS: float = 3600.0
+    GEMINI_TRANSIENT_COOLDOWN_SECONDS: float = 30.0
+    GEMINI_BREAKER_FAILURE_THRESHOLD: int = 3  # consecutive 5xx before a pair is cut out
+    GEMINI_BREAKER_MAX_COOLDOWN_SECONDS: float = 6 * 3600.0
+    GEMINI_BREAKER_PROBE_TIMEOUT_SECONDS: float = 300.0
+    
+    # Local rate limits per (API key, model); 0 disables a limit.
+    # Defaults match the Gemini free tier for gemini-2.5-flash.
+    GEMINI_RPM_LIMIT: int = 10
+    GEMINI_TPM_LIMIT: int = 250_000
+    GEMINI_RPD_LIMIT: int = 250
+    # Per-model overrides, e.g. {"gemini-2.5-pro": {"rpm": 5, "rpd": 100}}
+    GEMINI_MODEL_RATE_LIMITS: Dict[str, Dict[str, int]] = {}
+    # Output tokens assumed when estimating a request before it is sent
+    GEMINI_EXPECTED_OUTPUT_TOKENS: int = 8000
+    # Longest wait for local headroom before giving up instead of sending a doomed request
+    GEMINI_RATE_LIMIT_MAX_WAIT_SECONDS: float = 15.0
+    # Reuse Files API uploads per (file hash, key); files expire after 48h, dropped this much earlier
+    GEMINI_UPLOAD_CACHE_ENABLED: bool = True
+    GEMINI_UPLOAD_DEFAULT_TTL_SECONDS: int = 48 * 3600
+    GEMINI_UPLOAD_EXPIRY_MARGIN_SECONDS: int = 600
+    # PDF attachments prepared in parallel per request; inline-bytes fallback size cap
+    GEMINI_UPLOAD_CONCURRENCY: int = 6
+    GEMINI_INLINE_PDF_MAX_BYTES: int = 20 * 1024 * 1024
+    
+    # Gemini backend: "google" (real API) or "fake" (offline stand-in for load tests, backend/fake_gemini.py)
+    GEMINI_BACKEND: str = "google"
+    FAKE_GEMINI_MODELS: List[str] = ["gemini-2.5-flash", "gemini-2.5-flash-lite"]  # other models return 404
+    FAKE_GEMINI_LATENCY: str = "lognormal"  # fixed, uniform or lognormal
+    FAKE_GEMINI_LATENCY_SECONDS: float = 2.0  # median per call
+    FAKE_GEMINI_LATENCY_SPREAD: float = 0.5  # uniform: ± fraction of the median; lognormal: sigma
+    FAKE_GEMINI_UPLOAD_SECONDS: float = 0.2
+    FAKE_GEMINI_RATE_LIMIT_RATE: float = 0.0  # probability a call fails with 429
+    FAKE_GEMINI_NOT_FOUND_RATE: float = 0.0  # probability a call fails with 404
+    FAKE_GEMINI_SEED: Optional[int] = None
+    # Raw response cassettes: "record" saves every successful Gemini response, "replay" answers from disk
+    GEMINI_CASSETTE_MODE: str = "off"
+    GEMINI_CASSETTE_DIR: str = "./cassettes"
+    
     @property
     def all_api_keys(self) -> list:
         """Return list of all configured API keys (non-empty)"""
@@ -34,6 +95,52 @@ class Settings(BaseSettings):
         ]
         return [k for k in keys if k]
     
+    # Paper generation: "single" (one call for the whole paper) or "sectioned" (one concurrent call per section)
+    PAPER_GENERATION_MODE: str = "single"
+    PAPER_SECTION_MAX_ATTEMPTS: int = 3
+    # Generated papers are checked against the board pattern; offending sections/questions are
+    # regenerated with targeted prompts for up to this many rounds (0 = check only)
+    PAPER_REPAIR_MAX_ROUNDS: int = 2
+    PAPER_REPAIR_SECTION_RATIO: float = 0.5  # regenerate the whole section when this share of it is bad
+    
+    # Evaluation: "single" (one call) or "sharded" (one concurrent call per section, or per group of
+    # EVALUATION_SHARD_SIZE questions when > 0)
+    EVALUATION_MODE: str = "single"
+    EVALUATION_SHARD_SIZE: int = 0
+    EVALUATION_SHARD_MAX_ATTEMPTS: int = 2
+    
+    # Evaluation job queue (in-process worker pool)
+    EVALUATION_WORKER_CONCURRENCY: int = 2  # global cap on concurrent evaluations
+    EVALUATION_CONCURRENCY_PER_KEY: int = 0  # when > 0, also cap at this many per configured API key
+    EVALUATION_BATCH_MAX_EXAMS: int = 500
+    EVALUATION_JOB_MAX_ATTEMPTS: int = 3
+    EVALUATION_JOB_BACKOFF_SECONDS: float = 10.0  # doubled after each failed attempt
+    EVALUATION_JOB_MAX_BACKOFF_SECONDS: float = 300.0
+    EVALUATION_JOB_POLL_SECONDS: float = 5.0
+    # A running job's lease is renewed every poll; a job whose process stops renewing it
+    # (crash, restart) is re-queued once it expires. Keep well above EVALUATION_JOB_POLL_SECONDS.
+    EVALUATION_JOB_LEASE_SECONDS: float = 60.0
+    # Streamed evaluation output: how often partial text is saved / polled by the SSE endpoint
+    EVALUATION_STREAM_FLUSH_SECONDS: float = 0.5
+    EVALUATION_STREAM_POLL_SECONDS: float = 0.5
+    
+    # Question paper cache for identical generation inputs: "off", "per_student" (a student only
+    # gets their own earlier papers back) or "shared" (any student may get the same paper, which
+    # is cheaper but lets students who share inputs see each other's questions in advance)
+    PAPER_CACHE_MODE: str = "off"
+    PAPER_CACHE_TTL_SECONDS: int = 7 * 24 * 3600  # 0 = never expires
+    PAPER_CACHE_MAX_ENTRIES: int = 1000  # LRU bound, 0 = unbounded
+    PAPER_CACHE_MAX_REUSE: int = 0  # serve each paper at most N times, 0 = unlimited
+    
+    # Pre-generated paper pool (background refill for hot combinations)
+    PAPER_POOL_ENABLED: bool = False
+    # Entries "BOARD:CLASS:Subject[:difficulty]", e.g. ["CBSE:10:Mathematics:medium"]
+    PAPER_POOL_TARGETS: List[str] = []
+    PAPER_POOL_SIZE: int = 3  # unused papers kept per target
+    PAPER_POOL_REFILL_HOURS: str = "0-6"  # local off-peak window "start-end", empty = any time
+    PAPER_POOL_MAX_GENERATIONS_PER_HOUR: int = 20
+    PAPER_POOL_CHECK_INTERVAL_SECONDS: int = 60
+    
     # File Upload
     UPLOAD_DIR: str = "./uploads"
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
@@ -1,29 +1,192 @@
 """
 Database configuration and session management
 """
-from sqlalchemy import create_engine
+from pathlib import Path
+import logging
+
+from typing import Any, AsyncIterator, Dict
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from backend.config import settings
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+from backend.config import Settings, settings
+
+logger = logging.getLogger(__name__)
+
+# Async driver per database backend (DATABASE_URL itself names the sync driver)
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def _apply_sqlite_pragmas(engine: Engine, profile: Settings) -> None:
+    """Run the SQLITE_* pragmas of `profile` on every new connection of `engine`."""
+    pragmas = (
+        ("journal_mode", profile.SQLITE_JOURNAL_MODE),
+        ("synchronous", profile.SQLITE_SYNCHRONOUS),
+        ("busy_timeout", profile.SQLITE_BUSY_TIMEOUT_MS),
+        ("mmap_size", profile.SQLITE_MMAP_SIZE),
+    )
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def _pool_options(profile: Settings) -> Dict[str, Any]:
+    return dict(
+        pool_size=profile.DB_POOL_SIZE,
+        max_overflow=profile.DB_MAX_OVERFLOW,
+        pool_timeout=profile.DB_POOL_TIMEOUT_SECONDS,
+        pool_pre_ping=profile.DB_POOL_PRE_PING,
+        pool_recycle=profile.DB_POOL_RECYCLE_SECONDS
+    )
+
+
+def make_engine(database_url: str, profile: Settings = settings) -> Engine:
+    """
+    Engine for `database_url` tuned by the DB_* settings of `profile`: SQLite
+    connections get the SQLITE_* pragmas, server databases a sized, pre-pinged pool.
+    """
+    if database_url.startswith("sqlite"):
+        engine = create_engine(
+            database_url,
+            connect_args={"check_same_thread": False},
+            echo=profile.DB_ECHO
+        )
+        _apply_sqlite_pragmas(engine, profile)
+        return engine
+
+    return create_engine(database_url, echo=profile.DB_ECHO, **_pool_options(profile))
+
+
+def async_database_url(database_url: str) -> str:
+    """The async-driver form of a database URL (sqlite -> aiosqlite, postgresql -> asyncpg)."""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend!r} databases")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+def make_async_engine(database_url: str, profile: Settings = settings) -> AsyncEngine:
+    """make_engine for the request path: same settings, served by aiosqlite or asyncpg."""
+    url = make_url(async_database_url(database_url))
+    if url.get_backend_name() == "sqlite":
+        in_memory = url.database in (None, "", ":memory:")
+        engine = create_async_engine(
+            url,
+            echo=profile.DB_ECHO,
+            # aiosqlite would otherwise open (and re-pragma) a connection thread per session
+            **(dict(poolclass=StaticPool) if in_memory else dict(
+                poolclass=AsyncAdaptedQueuePool,
+                pool_size=profile.SQLITE_ASYNC_POOL_SIZE,
+                max_overflow=0,
+                pool_timeout=profile.DB_POOL_TIMEOUT_SECONDS
+            ))
+        )
+        _apply_sqlite_pragmas(engine.sync_engine, profile)
+        return engine
+
+    return create_async_engine(url, echo=profile.DB_ECHO, **_pool_options(profile))
+
 
 # Create database engine
 # Using SQLite but schema is PostgreSQL-ready
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {},
-    echo=True  # Set to False in production
-)
+engine = make_engine(settings.DATABASE_URL)
 
-# Create session factory
+# Create session factory (scripts and sync code paths; the API uses AsyncSessionLocal)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine and sessions for the API routers, so queries never block the event loop.
+# Objects stay loaded after commit: an expired attribute cannot lazy-load under asyncio.
+async_engine = make_async_engine(settings.DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Base class for models
 Base = declarative_base()
 
+def _alembic_config():
+    from alembic.config import Config
+
+    config = Config()
+    config.set_main_option("script_location", str(Path(__file__).parent / "migrations"))
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def _create_or_upgrade(config) -> None:
+    """
+    Bring the database to the latest migration: one from before migrations is adopted
+    (stamped at the original release schema, 0001, unless it already matches the models),
+    then `alembic upgrade head` (which also creates a new database). Raises RuntimeError
+    when the upgraded schema still differs from the models (a model change without a migration).
+    """
+    from alembic import command
+    from alembic.autogenerate import compare_metadata
+    from alembic.runtime.migration import MigrationContext
+    from sqlalchemy import inspect
+
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        if not MigrationContext.configure(connection).get_current_heads():
+            if "exams" in inspect(connection).get_table_names():
+                if compare_metadata(MigrationContext.configure(connection), Base.metadata):
+                    logger.info("Database predates migrations: stamping 0001 before upgrading")
+                    command.stamp(config, "0001")
+                else:
+                    command.stamp(config, "head")
+        command.upgrade(config, "head")
+
+        drift = compare_metadata(MigrationContext.configure(connection), Base.metadata)
+        if drift:
+            raise RuntimeError(f"Models differ from the latest migration (add a migration): {drift}")
+
+
+def prepare_schema() -> None:
+    """
+    Startup schema handling per DB_SCHEMA_MODE: create a new database or upgrade an
+    existing one to the latest migration ("create_all"), or leave the schema to Alembic
+    and warn when the database is not at the latest migration ("migrations").
+    """
+    import backend.models  # noqa: F401  (registers every table on Base.metadata)
+
+    if settings.DB_SCHEMA_MODE not in ("create_all", "migrations"):
+        raise ValueError(f"Unknown DB_SCHEMA_MODE {settings.DB_SCHEMA_MODE!r} (use 'create_all' or 'migrations')")
+
+    config = _alembic_config()
+    if settings.DB_SCHEMA_MODE == "create_all":
+        _create_or_upgrade(config)
+        return
+
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    heads = set(ScriptDirectory.from_config(config).get_heads())
+    with engine.connect() as connection:
+        current = set(MigrationContext.configure(connection).get_current_heads())
+    if current != heads:
+        logger.warning(
+            "Database schema is at %s, latest migration is %s: run `alembic upgrade head`",
+            ", ".join(sorted(current)) or "no revision",
+            ", ".join(sorted(heads)),
+        )
+
+
 def get_db():
-    """Dependency for FastAPI routes to get database session"""
+    """Sync database session (scripts and sync code paths)"""
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """Dependency for FastAPI routes to get an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
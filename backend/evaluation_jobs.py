@@ -0,0 +1,477 @@
+"""
+Persistent evaluation job queue
+Evaluations are stored as jobs and run by an in-process worker pool with retries and backoff
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from backend.config import settings
+from backend.database import AsyncSessionLocal
+from backend.evaluation_runner import EvaluationNotReady, run_evaluation
+from backend.models import EvaluationBatch, EvaluationJob, Exam, ExamStatus
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+
+def active_job(db: Session, exam_id: int) -> Optional[EvaluationJob]:
+    return db.query(EvaluationJob).filter(
+        EvaluationJob.exam_id == exam_id,
+        EvaluationJob.status.in_(ACTIVE_STATUSES)
+    ).first()
+
+
+def latest_job(db: Session, exam_id: int) -> Optional[EvaluationJob]:
+    return db.query(EvaluationJob).filter(
+        EvaluationJob.exam_id == exam_id
+    ).order_by(EvaluationJob.id.desc()).first()
+
+
+def _new_job(exam_id: int, batch_id: Optional[int] = None) -> EvaluationJob:
+    return EvaluationJob(
+        exam_id=exam_id,
+        batch_id=batch_id,
+        status=QUEUED,
+        max_attempts=settings.EVALUATION_JOB_MAX_ATTEMPTS,
+        next_run_at=datetime.utcnow()
+    )
+
+
+def enqueue_evaluation(db: Session, exam_id: int, batch_id: Optional[int] = None) -> EvaluationJob:
+    """
+    Queue an evaluation, or return the job already queued/running for the exam.
+
+    A partial unique index on active jobs makes the dedupe hold across
+    concurrent requests and worker processes.
+    """
+    existing = active_job(db, exam_id)
+    if existing:
+        return existing
+
+    job = _new_job(exam_id, batch_id)
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        existing = active_job(db, exam_id)
+        if existing:
+            return existing
+        raise
+    db.refresh(job)
+    evaluation_worker.wake()
+    logger.info("AI: evaluation job queued job_id=%s exam_id=%s batch_id=%s", job.id, exam_id, batch_id)
+    return job
+
+
+def enqueue_batch(db: Session, exam_ids: List[int], subject: Optional[str] = None) -> EvaluationBatch:
+    """
+    Queue evaluation of several submitted exams as one batch.
+
+    Exams that already have an active job keep it; exams already evaluated
+    are counted as done. Each exam is still its own job, so one failure never
+    affects the rest of the batch.
+    """
+    batch = EvaluationBatch(subject=subject, exam_ids=list(exam_ids))
+    db.add(batch)
+    db.commit()
+    db.refresh(batch)
+
+    evaluated = {
+        row.id for row in db.query(Exam.id).filter(
+            Exam.id.in_(exam_ids), Exam.status == ExamStatus.EVALUATED
+        )
+    }
+    active = {
+        row.exam_id for row in db.query(EvaluationJob.exam_id).filter(
+            EvaluationJob.exam_id.in_(exam_ids), EvaluationJob.status.in_(ACTIVE_STATUSES)
+        )
+    }
+    pending = [exam_id for exam_id in exam_ids if exam_id not in evaluated and exam_id not in active]
+
+    db.add_all([_new_job(exam_id, batch.id) for exam_id in pending])
+    try:
+        db.commit()
+    except IntegrityError:
+        # Raced with single requests for some of these exams; fall back to one-by-one dedupe
+        db.rollback()
+        for exam_id in pending:
+            enqueue_evaluation(db, exam_id, batch_id=batch.id)
+
+    evaluation_worker.wake()
+    logger.info(
+        "AI: evaluation batch queued batch_id=%s exams=%s queued=%s already_active=%s already_evaluated=%s",
+        batch.id,
+        len(exam_ids),
+        len(pending),
+        len(active),
+        len(evaluated),
+    )
+    return batch
+
+
+def batch_progress(db: Session, batch: EvaluationBatch) -> Dict[str, Any]:
+    """Per-exam status and aggregate counts of a batch."""
+    exam_ids = list(batch.exam_ids or [])
+    exams = {
+        exam.id: exam for exam in db.query(Exam).filter(Exam.id.in_(exam_ids))
+    }
+    latest: Dict[int, EvaluationJob] = {}
+    for job in db.query(EvaluationJob).filter(
+        EvaluationJob.exam_id.in_(exam_ids)
+    ).order_by(EvaluationJob.id):
+        latest[job.exam_id] = job
+
+    counts = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+    items = []
+    for exam_id in exam_ids:
+        exam = exams.get(exam_id)
+        job = latest.get(exam_id)
+        if exam is not None and exam.status == ExamStatus.EVALUATED:
+            status = SUCCEEDED
+        elif job is not None:
+            status = job.status
+        else:
+            status = FAILED
+        counts[status] += 1
+        items.append({
+            "exam_id": exam_id,
+            "status": status,
+            "job_id": job.id if job else None,
+            "attempts": job.attempts if job else 0,
+            "last_error": job.last_error if job and status == FAILED else None,
+            "marks_achieved": exam.marks_achieved if exam else None,
+            "percentage": exam.percentage if exam else None,
+        })
+
+    return {
+        "batch_id": batch.id,
+        "subject": batch.subject,
+        "created_at": batch.created_at,
+        "total": len(exam_ids),
+        "queued": counts[QUEUED],
+        "running": counts[RUNNING],
+        "succeeded": counts[SUCCEEDED],
+        "failed": counts[FAILED],
+        "completed": counts[QUEUED] + counts[RUNNING] == 0,
+        "exams": items,
+    }
+
+
+def _next_candidate(db: Session, now: datetime) -> Optional[int]:
+    """
+    Pick the next due job: single requests first (a student is waiting), then
+    the batch with the fewest running jobs, so batches progress side by side
+    instead of the oldest one holding every worker slot.
+    """
+    # Only due and running rows are read (ix_evaluation_jobs_due) and grouped here: a SQL
+    # GROUP BY batch_id lets the planner walk ix_evaluation_jobs_batch_id over every finished job
+    oldest_due: Dict[Optional[int], int] = {}
+    for batch_id, job_id in db.query(EvaluationJob.batch_id, EvaluationJob.id).filter(
+        EvaluationJob.status == QUEUED,
+        EvaluationJob.next_run_at <= now
+    ):
+        oldest_due[batch_id] = min(job_id, oldest_due.get(batch_id, job_id))
+    if not oldest_due:
+        return None
+
+    running: Dict[int, int] = {}
+    for (batch_id,) in db.query(EvaluationJob.batch_id).filter(
+        EvaluationJob.status == RUNNING,
+        EvaluationJob.batch_id.isnot(None)
+    ):
+        running[batch_id] = running.get(batch_id, 0) + 1
+
+    batch_id = min(oldest_due, key=lambda b: (b is not None, running.get(b, 0), oldest_due[b]))
+    return oldest_due[batch_id]
+
+
+def claim_next_job(db: Session, owner: str) -> Optional[int]:
+    """Atomically move the next due job (see _next_candidate) to RUNNING under `owner`'s lease; returns its id."""
+    now = datetime.utcnow()
+    for _ in range(3):
+        candidate_id = _next_candidate(db, now)
+        if candidate_id is None:
+            return None
+
+        claimed = db.query(EvaluationJob).filter(
+            EvaluationJob.id == candidate_id,
+            EvaluationJob.status == QUEUED
+        ).update({
+            "status": RUNNING,
+            "started_at": now,
+            "attempts": EvaluationJob.attempts + 1,
+            "lease_owner": owner,
+            "lease_expires_at": now + timedelta(seconds=settings.EVALUATION_JOB_LEASE_SECONDS)
+        }, synchronize_session=False)
+        db.commit()
+        if claimed:
+            return candidate_id
+    return None
+
+
+def renew_leases(db: Session, owner: str) -> int:
+    """Extend the lease of every job `owner` is running; returns how many."""
+    renewed = db.query(EvaluationJob).filter(
+        EvaluationJob.status == RUNNING,
+        EvaluationJob.lease_owner == owner
+    ).update({
+        "lease_expires_at": datetime.utcnow() + timedelta(seconds=settings.EVALUATION_JOB_LEASE_SECONDS)
+    }, synchronize_session=False)
+    db.commit()
+    return renewed
+
+
+def requeue_expired(db: Session) -> int:
+    """Re-queue RUNNING jobs whose lease expired (their process died); returns how many."""
+    now = datetime.utcnow()
+    requeued = db.query(EvaluationJob).filter(
+        EvaluationJob.status == RUNNING,
+        or_(EvaluationJob.lease_expires_at.is_(None), EvaluationJob.lease_expires_at < now)
+    ).update({
+        "status": QUEUED,
+        "next_run_at": now,
+        "lease_owner": None,
+        "lease_expires_at": None
+    }, synchronize_session=False)
+    db.commit()
+    return requeued
+
+
+def worker_capacity() -> int:
+    """Concurrent evaluations allowed: the global cap, optionally bounded per API key."""
+    capacity = settings.EVALUATION_WORKER_CONCURRENCY
+    if settings.EVALUATION_CONCURRENCY_PER_KEY > 0:
+        capacity = min(capacity, settings.EVALUATION_CONCURRENCY_PER_KEY * max(1, len(settings.all_api_keys)))
+    return max(1, capacity)
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Exponential backoff after the given number of failed attempts."""
+    delay = settings.EVALUATION_JOB_BACKOFF_SECONDS * (2 ** max(0, attempts - 1))
+    return min(delay, settings.EVALUATION_JOB_MAX_BACKOFF_SECONDS)
+
+
+class PartialOutputWriter:
+    """
+    Persists the streamed examiner feedback on the job row, at most every EVALUATION_STREAM_FLUSH_SECONDS
+
+    Called synchronously for every streamed chunk, so writes run as background
+    tasks (one at a time); flush() waits for them and saves whatever is left.
+    """
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self._text = ""
+        self._flushed = None
+        self._flushed_at = 0.0
+        self._pending: Optional[asyncio.Task] = None
+
+    def __call__(self, text: str) -> None:
+        self._text = text
+        if self._pending is not None and not self._pending.done():
+            return
+        # A restarted attempt (shorter text) is written immediately so readers see the reset
+        restarted = len(text) < len(self._flushed or "")
+        if restarted or time.monotonic() - self._flushed_at >= settings.EVALUATION_STREAM_FLUSH_SECONDS:
+            self._pending = asyncio.ensure_future(self._write())
+
+    async def flush(self) -> None:
+        if self._pending is not None:
+            await self._pending
+            self._pending = None
+        await self._write()
+
+    async def _write(self) -> None:
+        text = self._text
+        if text == self._flushed:
+            return
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(EvaluationJob).where(EvaluationJob.id == self.job_id).values(
+                    partial_output=text
+                ).execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        self._flushed = text
+        self._flushed_at = time.monotonic()
+
+
+class EvaluationWorker:
+    """
+    Runs queued evaluation jobs, at most worker_capacity() at a time.
+
+    Jobs are picked up immediately when enqueued (and otherwise every
+    EVALUATION_JOB_POLL_SECONDS). A failed job is re-queued with exponential
+    backoff until EVALUATION_JOB_MAX_ATTEMPTS is reached. Every tick renews the
+    lease of the jobs this process runs and re-queues jobs whose lease expired
+    (left RUNNING by a process that died), never those of live workers.
+    """
+
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        self._wake: Optional[asyncio.Event] = None
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("AI: evaluation worker started concurrency=%s", worker_capacity())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        for task in list(self._running):
+            task.cancel()
+        await asyncio.gather(self._task, *self._running, return_exceptions=True)
+        self._task = None
+        self._running.clear()
+
+    def wake(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    @property
+    def running_count(self) -> int:
+        return len(self._running)
+
+    async def maintain_leases(self) -> None:
+        """Renew this process's leases, then re-queue jobs whose lease expired."""
+        async with AsyncSessionLocal() as db:
+            await db.run_sync(renew_leases, self.owner)
+            requeued = await db.run_sync(requeue_expired)
+        if requeued:
+            logger.info("AI: evaluation worker re-queued %s job(s) with an expired lease", requeued)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.maintain_leases()
+                await self.dispatch_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("AI: evaluation worker tick failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.EVALUATION_JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def dispatch_once(self) -> int:
+        """Start as many due jobs as free worker slots allow; returns how many were started."""
+        started = 0
+        async with AsyncSessionLocal() as db:
+            while len(self._running) < worker_capacity():
+                job_id = await db.run_sync(claim_next_job, self.owner)
+                if job_id is None:
+                    break
+                task = asyncio.create_task(self._execute(job_id))
+                self._running.add(task)
+                task.add_done_callback(self._job_done)
+                started += 1
+        return started
+
+    def _job_done(self, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        self.wake()  # a slot is free (and a retry may be due)
+
+    async def _execute(self, job_id: int) -> None:
+        async with AsyncSessionLocal() as db:
+            job = await db.get(EvaluationJob, job_id)
+            partial_output = PartialOutputWriter(job.id)
+            try:
+                await run_evaluation(db, job.exam_id, on_text=partial_output)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await db.rollback()
+                await partial_output.flush()
+                await db.refresh(job)
+                if self._holds_lease(job):
+                    await db.run_sync(self._record_failure, job, e)
+                return
+
+            await partial_output.flush()
+            await db.refresh(job)
+            if not self._holds_lease(job):
+                return
+
+            job.status = SUCCEEDED
+            job.last_error = None
+            job.finished_at = datetime.utcnow()
+            job.lease_owner = None
+            job.lease_expires_at = None
+            await db.commit()
+            logger.info(
+                "AI: evaluation job succeeded job_id=%s exam_id=%s attempts=%s",
+                job.id,
+                job.exam_id,
+                job.attempts,
+            )
+
+    def _holds_lease(self, job: EvaluationJob) -> bool:
+        """False when the job was re-queued after our lease expired (another worker owns it now)."""
+        if job.status == RUNNING and job.lease_owner == self.owner:
+            return True
+        logger.warning(
+            "AI: evaluation job lease lost job_id=%s exam_id=%s status=%s owner=%s",
+            job.id,
+            job.exam_id,
+            job.status,
+            job.lease_owner,
+        )
+        return False
+
+    def _record_failure(self, db: Session, job: EvaluationJob, error: Exception) -> None:
+        job.last_error = str(error)[:2000]
+        job.lease_owner = None
+        job.lease_expires_at = None
+        permanent = isinstance(error, EvaluationNotReady)
+        if permanent or job.attempts >= job.max_attempts:
+            job.status = FAILED
+            job.finished_at = datetime.utcnow()
+            logger.error(
+                "AI: evaluation job failed job_id=%s exam_id=%s attempts=%s/%s err=%s",
+                job.id,
+                job.exam_id,
+                job.attempts,
+                job.max_attempts,
+                str(error)[:300],
+            )
+        else:
+            delay = backoff_seconds(job.attempts)
+            job.status = QUEUED
+            job.next_run_at = datetime.utcnow() + timedelta(seconds=delay)
+            logger.warning(
+                "AI: evaluation job retry job_id=%s exam_id=%s attempts=%s/%s in=%.0fs err=%s",
+                job.id,
+                job.exam_id,
+                job.attempts,
+                job.max_attempts,
+                delay,
+                str(error)[:300],
+            )
+        db.commit()
+
+
+evaluation_worker = EvaluationWorker()
@@ -0,0 +1,176 @@
+"""
+Evaluation report assembly
+Merges local and AI per-question results, computes totals and renders the Markdown report
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend import model_json
+
+
+def merge_results(
+    questions_with_answers: List[Dict[str, Any]],
+    local_results: List[Dict[str, Any]],
+    ai_evaluation: Optional[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """One result row per question, in paper order, from the local grader and the AI examiner."""
+    by_number: Dict[int, Dict[str, Any]] = {r["sequence_number"]: r for r in local_results}
+    ai_by_number = {r["question_number"]: r for r in (ai_evaluation or {}).get("questions", [])}
+
+    rows = []
+    for item in questions_with_answers:
+        q = item["question"]
+        number = q["sequence_number"]
+        if number in by_number:
+            rows.append(by_number[number])
+            continue
+        ai = ai_by_number.get(number)
+        rows.append({
+            "question_id": q.get("id"),
+            "sequence_number": number,
+            "section": q["section"],
+            "max_marks": q["marks"],
+            "marks_awarded": ai["marks_awarded"] if ai else 0.0,
+            "feedback": ai["feedback"] if ai else "Not evaluated.",
+            "selected_choice": ai.get("selected_choice") if ai else None,
+            "graded_by": "ai",
+        })
+    return rows
+
+
+def totals(results: List[Dict[str, Any]], total_marks: int) -> Tuple[float, float]:
+    """(marks_achieved, percentage) for an exam."""
+    marks = round(sum(r["marks_awarded"] for r in results), 2)
+    percentage = round((marks / total_marks) * 100, 2) if total_marks else 0.0
+    return marks, percentage
+
+
+def _fmt(value: float) -> str:
+    return f"{value:g}"
+
+
+def _question_lines(r: Dict[str, Any]) -> List[str]:
+    heading = f"### Question {r['sequence_number']}: {_fmt(r['marks_awarded'])}/{r['max_marks']}"
+    if r.get("selected_choice") == "alternative":
+        heading += " (alternative attempted)"
+    return [heading, "", (r.get("feedback") or "").strip(), ""]
+
+
+class StreamedFeedback:
+    """
+    Renders the examiner's streamed JSON as the report's per-question Markdown
+
+    Called with the whole output so far; returns the feedback of every question
+    the examiner has finished (the next question or the summary has been read),
+    so the result only grows during an attempt and is empty again after a restart.
+    """
+
+    def __init__(self, questions_with_answers: List[Dict[str, Any]]):
+        self.max_marks = {
+            item["question"]["sequence_number"]: item["question"]["marks"] for item in questions_with_answers
+        }
+        self._markdown = ""
+
+    def __call__(self, text: str) -> str:
+        if not text.strip():
+            self._markdown = ""  # a new attempt
+            return self._markdown
+        stats = model_json.ParseStats()
+        try:
+            data = model_json.loads(text, stats, partial=True)
+        except model_json.ModelJSONError:
+            return self._markdown  # nothing readable yet, or a malformed stretch
+        entries = data.get("questions") if isinstance(data, dict) else None
+        if not isinstance(entries, list):
+            return self._markdown
+
+        if stats.truncated_at is not None and list(data)[-1] == "questions":
+            entries = entries[:-1]  # the last question may still be cut off
+
+        lines: List[str] = []
+        for entry in entries:
+            row = self._row(entry)
+            if row is not None:
+                lines += _question_lines(row)
+        self._markdown = "\n".join(lines)
+        return self._markdown
+
+    def _row(self, entry: Any) -> Optional[Dict[str, Any]]:
+        try:
+            number = int(entry.get("question_number"))
+            marks = float(entry.get("marks_awarded") or 0)
+        except (AttributeError, TypeError, ValueError):
+            return None
+        if number not in self.max_marks:
+            return None
+        return {
+            "sequence_number": number,
+            "max_marks": self.max_marks[number],
+            "marks_awarded": min(max(marks, 0.0), float(self.max_marks[number])),
+            "selected_choice": str(entry.get("selected_choice") or "").lower() or None,
+            "feedback": str(entry.get("feedback") or ""),
+        }
+
+
+def render_markdown(
+    exam_info: Dict[str, Any],
+    student_info: Dict[str, str],
+    results: List[Dict[str, Any]],
+    ai_evaluation: Optional[Dict[str, Any]] = None
+) -> str:
+    """Render the student-facing Markdown report from per-question results."""
+    ai_evaluation = ai_evaluation or {}
+    marks, percentage = totals(results, exam_info["total_marks"])
+
+    lines = [
+        f"# Evaluation Report: {exam_info['board']} Class {exam_info['class']} {exam_info['subject']}",
+        "",
+        f"Dear {student_info.get('name', 'Student')},",
+        "",
+    ]
+    if ai_evaluation.get("summary"):
+        lines += [ai_evaluation["summary"].strip(), ""]
+
+    sections: Dict[str, List[Dict[str, Any]]] = {}
+    for r in results:
+        sections.setdefault(r["section"], []).append(r)
+
+    for section, rows in sections.items():
+        section_marks = sum(r["marks_awarded"] for r in rows)
+        section_max = sum(r["max_marks"] for r in rows)
+        lines += [f"## Section {section} ({_fmt(section_marks)}/{section_max})", ""]
+
+        local_rows = [r for r in rows if r["graded_by"] == "local"]
+        if local_rows:
+            lines += [
+                "| Q. No. | Your Answer | Correct Answer | Marks |",
+                "|---|---|---|---|",
+            ]
+            for r in local_rows:
+                lines.append(
+                    f"| {r['sequence_number']} | {r.get('selected_option') or '—'} | "
+                    f"{r.get('correct_answer') or '—'} | {_fmt(r['marks_awarded'])}/{r['max_marks']} |"
+                )
+            lines.append("")
+
+        for r in rows:
+            if r["graded_by"] != "local":
+                lines += _question_lines(r)
+
+    lines += ["## Marks Summary", "", "| Section | Marks |", "|---|---|"]
+    for section, rows in sections.items():
+        lines.append(
+            f"| {section} | {_fmt(sum(r['marks_awarded'] for r in rows))}/{sum(r['max_marks'] for r in rows)} |"
+        )
+    lines.append("")
+
+    if ai_evaluation.get("strengths"):
+        lines += ["## Strengths", ""] + [f"- {s}" for s in ai_evaluation["strengths"]] + [""]
+    if ai_evaluation.get("improvements"):
+        lines += ["## Areas for Improvement", ""] + [f"- {s}" for s in ai_evaluation["improvements"]] + [""]
+
+    lines += [
+        f"**Total Marks Achieved: {_fmt(marks)}/{exam_info['total_marks']}**",
+        "",
+        f"**Percentage: {_fmt(percentage)}%**",
+    ]
+    return "\n".join(lines)
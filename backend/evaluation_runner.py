@@ -0,0 +1,231 @@
+"""
+Evaluation pipeline
+Gathers an exam's answers, grades objective questions locally, asks Gemini for the rest and stores results
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from backend import evaluation_report as evaluation_report_builder
+from backend import grading
+from backend.gemini_service import gemini_service
+from backend.exam_snapshot import load_exam_snapshot
+from backend.models import Exam, Answer, ExamStatus
+
+logger = logging.getLogger(__name__)
+
+
+class EvaluationNotReady(Exception):
+    """The exam cannot be evaluated in its current state (retrying will not help)"""
+
+
+@dataclass
+class EvaluationInputs:
+    """Everything needed to evaluate an exam, gathered in one pass"""
+    questions_with_answers: List[Dict[str, Any]]
+    pdf_attachments: List[Dict[str, Any]]
+    student_info: Dict[str, str]
+    objective_results: List[Dict[str, Any]]
+    subjective_items: List[Dict[str, Any]]
+    objective_summary: Optional[Dict[str, Any]]
+
+
+def submit_if_needed(db: Session, exam: Exam) -> None:
+    """Auto-submit an exam that is still open so it can be evaluated."""
+    if exam.status in (ExamStatus.IN_PROGRESS, ExamStatus.CREATED):
+        exam.status = ExamStatus.SUBMITTED
+        exam.submitted_at = datetime.utcnow()
+        db.query(Answer).filter(Answer.exam_id == exam.id).update({"is_locked": True})
+        db.commit()
+        db.refresh(exam)
+
+
+async def gather_inputs(db: AsyncSession, exam: Exam) -> EvaluationInputs:
+    """Collect questions, answers, PDFs and local MCQ grades for an exam."""
+    snapshot = await load_exam_snapshot(db, exam.id)
+
+    questions_with_answers = []
+    pdf_attachments = []
+    for question in snapshot.questions:
+        answer = question.answer
+
+        answer_data = None
+        if answer:
+            answer_data = {
+                "typed_answer": answer.typed_answer,
+                "selected_option": answer.selected_option,
+                "selected_choice": answer.selected_choice,
+                "uploaded_files_count": len(answer.files),
+                "uploaded_files": [
+                    {
+                        "filename": f.filename,
+                        "file_path": f.file_path
+                    }
+                    for f in answer.files
+                ]
+            }
+
+            for f in answer.files:
+                pdf_attachments.append({
+                    "question_number": question.sequence_number,
+                    "filename": f.filename,
+                    "file_path": f.file_path
+                })
+
+        questions_with_answers.append({
+            "question": {
+                "id": question.id,
+                "sequence_number": question.sequence_number,
+                "section": question.section,
+                "question_text": question.question_text,
+                "question_type": question.question_type.value,
+                "marks": question.marks,
+                "has_internal_choice": question.has_internal_choice,
+                "alternative_question_text": question.alternative_question_text,
+                "correct_answer": question.correct_answer  # For MCQs
+            },
+            "answer": answer_data
+        })
+
+    student_info = {
+        "name": snapshot.student_name or "Unknown",
+        "email": snapshot.student_email or "Unknown"
+    }
+
+    # Grade questions with an answer key locally; only subjective ones go to Gemini
+    objective_results, subjective_items = grading.grade_objective(questions_with_answers)
+    objective_summary = grading.objective_summary(objective_results)
+    if objective_summary:
+        subjective_numbers = {item["question"]["sequence_number"] for item in subjective_items}
+        pdf_attachments = [p for p in pdf_attachments if p["question_number"] in subjective_numbers]
+        logger.info(
+            "AI: evaluation local grading exam_id=%s objective=%s marks=%s/%s subjective=%s",
+            exam.id,
+            len(objective_results),
+            objective_summary["marks_awarded"],
+            objective_summary["max_marks"],
+            len(subjective_items),
+        )
+
+    return EvaluationInputs(
+        questions_with_answers=questions_with_answers,
+        pdf_attachments=pdf_attachments,
+        student_info=student_info,
+        objective_results=objective_results,
+        subjective_items=subjective_items,
+        objective_summary=objective_summary,
+    )
+
+
+def finalize(
+    db: Session,
+    exam: Exam,
+    inputs: EvaluationInputs,
+    ai_evaluation: Optional[Dict[str, Any]]
+) -> Exam:
+    """Store per-question results, totals and the rendered report; marks the exam EVALUATED."""
+    results = evaluation_report_builder.merge_results(
+        inputs.questions_with_answers, inputs.objective_results, ai_evaluation
+    )
+    marks_achieved, percentage = evaluation_report_builder.totals(results, exam.total_marks)
+    grading.store_results(db, exam.id, results)
+
+    exam.evaluation_report = evaluation_report_builder.render_markdown(
+        {
+            "board": exam.board.value,
+            "class": exam.class_num,
+            "subject": exam.subject,
+            "total_marks": exam.total_marks,
+        },
+        inputs.student_info,
+        results,
+        ai_evaluation
+    )
+    exam.marks_achieved = marks_achieved
+    exam.percentage = percentage
+    exam.evaluated_at = datetime.utcnow()
+    exam.status = ExamStatus.EVALUATED
+    db.commit()
+    db.refresh(exam)
+    return exam
+
+
+def _feedback_stream(
+    inputs: EvaluationInputs,
+    on_text: Optional[Callable[[str], None]]
+) -> Optional[Callable[[str], None]]:
+    """Wrap `on_text` to receive rendered feedback instead of the examiner's raw JSON."""
+    if on_text is None:
+        return None
+    feedback = evaluation_report_builder.StreamedFeedback(inputs.subjective_items)
+    shown = None
+
+    def receive(text: str) -> None:
+        nonlocal shown
+        markdown = feedback(text)
+        if markdown != shown:
+            shown = markdown
+            on_text(markdown)
+
+    return receive
+
+
+async def run_evaluation(
+    db: AsyncSession,
+    exam_id: int,
+    on_text: Optional[Callable[[str], None]] = None
+) -> Exam:
+    """
+    Evaluate a submitted exam end to end.
+
+    `on_text` receives the examiner's feedback as it streams, rendered as the
+    report's per-question Markdown (the whole text so far, on every change).
+
+    The reads are async queries and finalize runs on the async session with run_sync;
+    no connection is held while Gemini evaluates.
+    Raises EvaluationNotReady for exams that cannot be evaluated; any other
+    exception is a (possibly transient) evaluation failure.
+    """
+    exam = await db.get(Exam, exam_id)
+    if not exam:
+        raise EvaluationNotReady(f"Exam {exam_id} not found")
+
+    # Idempotent: a finished evaluation is never redone
+    if exam.status == ExamStatus.EVALUATED and exam.evaluation_report:
+        return exam
+
+    if exam.status != ExamStatus.SUBMITTED:
+        raise EvaluationNotReady("Exam must be submitted before evaluation")
+
+    inputs = await gather_inputs(db, exam)
+
+    ai_evaluation = None
+    if inputs.subjective_items:
+        # End the read transaction so its pooled connection is free while the examiner runs
+        await db.commit()
+        ai_evaluation = await gemini_service.evaluate_exam_async(
+            board=exam.board.value,
+            class_num=exam.class_num,
+            subject=exam.subject,
+            student_info=inputs.student_info,
+            questions_with_answers=inputs.subjective_items,
+            paper_json=exam.paper_json,
+            pdf_attachments=inputs.pdf_attachments,
+            objective_summary=inputs.objective_summary,
+            on_text=_feedback_stream(inputs, on_text)
+        )
+        ai_attempt = gemini_service.current_attempt()
+
+        logger.info(
+            "AI: evaluation completed exam_id=%s model=%s api_key=%s/%s",
+            exam_id,
+            (ai_attempt.model if ai_attempt else None),
+            (ai_attempt.key_index + 1) if ai_attempt else None,
+            len(gemini_service.api_keys),
+        )
+
+    return await db.run_sync(finalize, exam, inputs, ai_evaluation)
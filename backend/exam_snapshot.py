@@ -0,0 +1,192 @@
+"""
+Read-only exam snapshots
+Loads an exam with its questions, answers and uploaded files in a fixed number of
+queries (eager loading instead of one lazy load per row) and returns plain DTOs
+for the routers and the evaluation pipeline to build their views from
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+
+from backend.models import Answer, BoardEnum, Exam, ExamStatus, Question, QuestionType, UploadedFile
+
+
+@dataclass(frozen=True)
+class FileView:
+    id: int
+    filename: str
+    file_path: str
+    file_size: int
+    uploaded_at: Optional[datetime]
+
+
+@dataclass(frozen=True)
+class AnswerView:
+    id: int
+    question_id: int
+    typed_answer: Optional[str]
+    selected_option: Optional[str]
+    selected_choice: Optional[str]
+    first_saved_at: Optional[datetime]
+    last_edited_at: Optional[datetime]
+    is_locked: bool
+    files: Tuple[FileView, ...]
+
+    @property
+    def has_uploaded_files(self) -> bool:
+        return len(self.files) > 0
+
+    @property
+    def is_answered(self) -> bool:
+        """Typed text, an MCQ option or an uploaded PDF"""
+        has_typed_answer = self.typed_answer is not None and self.typed_answer.strip() != ""
+        return has_typed_answer or self.selected_option is not None or self.has_uploaded_files
+
+
+@dataclass(frozen=True)
+class QuestionView:
+    id: int
+    section: str
+    sequence_number: int
+    question_text: str
+    question_type: QuestionType
+    marks: int
+    has_internal_choice: bool
+    alternative_question_text: Optional[str]
+    options_json: Optional[Dict[str, str]]
+    correct_answer: Optional[str]
+    answer: Optional[AnswerView]
+
+
+@dataclass(frozen=True)
+class ExamSnapshot:
+    id: int
+    user_id: int
+    board: BoardEnum
+    class_num: int
+    subject: str
+    chapter_focus: Optional[str]
+    duration_minutes: int
+    total_marks: int
+    status: ExamStatus
+    started_at: Optional[datetime]
+    submitted_at: Optional[datetime]
+    current_question_index: int
+    paper_json: Optional[Dict[str, Any]]
+    student_name: Optional[str]
+    student_email: Optional[str]
+    questions: Tuple[QuestionView, ...]
+
+    @property
+    def answers(self) -> List[AnswerView]:
+        return [q.answer for q in self.questions if q.answer is not None]
+
+
+def _file_view(f: UploadedFile) -> FileView:
+    return FileView(
+        id=f.id,
+        filename=f.filename,
+        file_path=f.file_path,
+        file_size=f.file_size,
+        uploaded_at=f.uploaded_at
+    )
+
+
+def _answer_view(answer: Answer) -> AnswerView:
+    return AnswerView(
+        id=answer.id,
+        question_id=answer.question_id,
+        typed_answer=answer.typed_answer,
+        selected_option=answer.selected_option,
+        selected_choice=answer.selected_choice,
+        first_saved_at=answer.first_saved_at,
+        last_edited_at=answer.last_edited_at,
+        is_locked=bool(answer.is_locked),
+        files=tuple(_file_view(f) for f in answer.uploaded_files)
+    )
+
+
+def _question_view(question: Question, answers: bool = True) -> QuestionView:
+    return QuestionView(
+        id=question.id,
+        section=question.section,
+        sequence_number=question.sequence_number,
+        question_text=question.question_text,
+        question_type=question.question_type,
+        marks=question.marks,
+        has_internal_choice=bool(question.has_internal_choice),
+        alternative_question_text=question.alternative_question_text,
+        options_json=question.options_json,
+        correct_answer=question.correct_answer,
+        answer=_answer_view(question.answer) if answers and question.answer is not None else None
+    )
+
+
+async def load_exam_snapshot(db: AsyncSession, exam_id: int, answers: bool = True) -> Optional[ExamSnapshot]:
+    """
+    The exam, its student and its questions in sequence order, or None if it does not exist.
+
+    Three queries whatever the exam size: exam + user, questions joined to their
+    answers, then all uploaded files (answers=False skips answers and files).
+    """
+    questions_loader = selectinload(Exam.questions)
+    if answers:
+        questions_loader = questions_loader.joinedload(Question.answer).selectinload(Answer.uploaded_files)
+    exam = await db.scalar(select(Exam).options(
+        joinedload(Exam.user),
+        questions_loader
+    ).where(Exam.id == exam_id))
+    if exam is None:
+        return None
+
+    return ExamSnapshot(
+        id=exam.id,
+        user_id=exam.user_id,
+        board=exam.board,
+        class_num=exam.class_num,
+        subject=exam.subject,
+        chapter_focus=exam.chapter_focus,
+        duration_minutes=exam.duration_minutes,
+        total_marks=exam.total_marks,
+        status=exam.status,
+        started_at=exam.started_at,
+        submitted_at=exam.submitted_at,
+        current_question_index=exam.current_question_index or 0,
+        paper_json=exam.paper_json,
+        student_name=exam.user.name if exam.user else None,
+        student_email=exam.user.email if exam.user else None,
+        questions=tuple(_question_view(q, answers) for q in exam.questions)
+    )
+
+
+async def _load_question(db: AsyncSession, *criteria) -> Optional[QuestionView]:
+    # A single row, so its answer and files are joined into the same query
+    result = await db.execute(select(Question).options(
+        joinedload(Question.answer).joinedload(Answer.uploaded_files)
+    ).where(*criteria))
+    question = result.unique().scalars().first()
+    return _question_view(question) if question is not None else None
+
+
+async def load_question_view(db: AsyncSession, exam_id: int, question_id: int) -> Optional[QuestionView]:
+    """One question of an exam with its answer and files (one query), or None."""
+    return await _load_question(db, Question.id == question_id, Question.exam_id == exam_id)
+
+
+async def load_question_at(db: AsyncSession, exam_id: int, sequence_number: int) -> Optional[QuestionView]:
+    """
+    Question number `sequence_number` (1-based, as numbered at creation) with its answer
+    and files: one lookup on ix_questions_exam_sequence, or None.
+    """
+    return await _load_question(db, Question.exam_id == exam_id, Question.sequence_number == sequence_number)
+
+
+async def question_count(db: AsyncSession, exam: Exam) -> int:
+    """Questions in the exam: cached on the row, counted for exams created before the cache."""
+    if exam.total_questions is not None:
+        return exam.total_questions
+    return await db.scalar(select(func.count(Question.id)).where(Question.exam_id == exam.id))
@@ -0,0 +1,453 @@
+"""
+Offline stand-in for the google-genai client
+Answers paper, section, replacement-question and evaluation prompts for any BOARD_PATTERNS entry with simulated latency, errors and token usage
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+
+from backend.config import settings, get_board_pattern
+
+CHARS_PER_TOKEN = 4
+TOKENS_PER_FILE_PART = 258
+STREAM_CHUNK_CHARS = 256
+
+_BOARD_CLASS_RE = re.compile(r"- Board: (\w+)\s*\n- Class: (\d+)\s*\n- Subject: ([^\n]+)")
+_SECTION_PAPER_RE = re.compile(r"ONE SECTION of a (\w+) Class (\d+) ([^\n]+) question paper")
+_THIS_SECTION_RE = re.compile(r"THIS SECTION:\n- Section (\w+): (\d+) questions × (\d+) marks each \(([^)]+)\)")
+_FIRST_NUMBER_RE = re.compile(r"Number the questions (\d+) to (\d+)")
+_CHOICE_COUNT_RE = re.compile(r"Exactly (\d+) question\(s\) in this section must have an internal choice")
+_EVAL_QUESTION_RE = re.compile(r"^Question (\d+) \(Section (\w+)\) - (\d+) marks$", re.MULTILINE)
+_REPLACEMENT_RE = re.compile(r"REPLACEMENT QUESTIONS for Section (\w+) of a (\w+) Class (\d+) ([^\n]+) question paper")
+_REPLACEMENT_SPEC_RE = re.compile(r"SECTION SPEC: ([^,\n]+), (\d+) marks each")
+_REPLACEMENT_SLOT_RE = re.compile(r"^- Question (\d+): (with|no) internal choice", re.MULTILINE)
+
+
+class FakeAPIError(Exception):
+    """Error raised by the fake client; the message mimics the real API so error handling is exercised"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+class FakeUsage:
+    def __init__(self, prompt_tokens: int, output_tokens: int):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class FakeResponse:
+    def __init__(self, text: str, usage_metadata: Optional[FakeUsage] = None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class FakeModel:
+    def __init__(self, name: str):
+        self.name = name
+        self.supported_generation_methods = ["generateContent"]
+
+
+class FakeFile:
+    def __init__(self, uri: str, name: str):
+        self.uri = uri
+        self.name = name
+        self.mime_type = "application/pdf"
+        self.expiration_time = datetime.now(timezone.utc) + timedelta(hours=48)
+
+
+class FakeGeminiStats:
+    """Counters shared by every fake client (exposed on /api/ai/info)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.calls: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.uploads = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+
+    def record_call(self, kind: str, usage: Optional[FakeUsage] = None) -> None:
+        with self._lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+            if usage is not None:
+                self.prompt_tokens += usage.prompt_token_count
+                self.output_tokens += usage.candidates_token_count
+
+    def record_error(self, code: int) -> None:
+        with self._lock:
+            self.errors[str(code)] = self.errors.get(str(code), 0) + 1
+
+    def record_upload(self) -> None:
+        with self._lock:
+            self.uploads += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": dict(self.calls),
+                "errors": dict(self.errors),
+                "uploads": self.uploads,
+                "prompt_tokens": self.prompt_tokens,
+                "output_tokens": self.output_tokens,
+            }
+
+
+stats = FakeGeminiStats()
+_rng = random.Random(settings.FAKE_GEMINI_SEED)
+_rng_lock = threading.Lock()
+
+
+def _random() -> float:
+    with _rng_lock:
+        return _rng.random()
+
+
+def sample_latency(scale: float = 1.0) -> float:
+    """Seconds for one call, drawn from FAKE_GEMINI_LATENCY (fixed, uniform or lognormal)."""
+    median = settings.FAKE_GEMINI_LATENCY_SECONDS * scale
+    spread = settings.FAKE_GEMINI_LATENCY_SPREAD
+    distribution = settings.FAKE_GEMINI_LATENCY.lower()
+    if median <= 0:
+        return 0.0
+    if distribution == "uniform":
+        return max(0.0, median * (1 + spread * (2 * _random() - 1)))
+    if distribution == "lognormal":
+        with _rng_lock:
+            return median * math.exp(_rng.gauss(0.0, spread))
+    return median
+
+
+def _injected_error(model: str) -> Optional[FakeAPIError]:
+    if model not in settings.FAKE_GEMINI_MODELS or _random() < settings.FAKE_GEMINI_NOT_FOUND_RATE:
+        return FakeAPIError(404, f"404 NOT_FOUND. models/{model} is not found for API version v1beta")
+    if _random() < settings.FAKE_GEMINI_RATE_LIMIT_RATE:
+        retry = 5 + int(_random() * 25)
+        return FakeAPIError(
+            429,
+            "429 RESOURCE_EXHAUSTED. You exceeded your current quota "
+            f"(generate_content_free_tier_requests, model: {model}). Please retry in {retry}s."
+        )
+    return None
+
+
+def _prompt_text(contents: Any) -> str:
+    items = contents if isinstance(contents, list) else [contents]
+    return "\n".join(item for item in items if isinstance(item, str))
+
+
+def _prompt_tokens(contents: Any) -> int:
+    items = contents if isinstance(contents, list) else [contents]
+    tokens = len(_prompt_text(contents)) // CHARS_PER_TOKEN
+    return tokens + TOKENS_PER_FILE_PART * sum(1 for item in items if not isinstance(item, str))
+
+
+def _fenced(data: Dict[str, Any]) -> str:
+    return "```json\n" + json.dumps(data, indent=2, ensure_ascii=False) + "\n```"
+
+
+def _fake_question(subject: str, number: int, section: str, q_type: str, marks: int, with_choice: bool) -> Dict[str, Any]:
+    is_mcq = q_type.upper() == "MCQ"
+    question = {
+        "question_number": number,
+        "question_text": (
+            f"[{subject}] Q{number} (Section {section}): Evaluate $\\frac{{{number}}}{{2}} + \\sqrt{{{number * number}}}$ "
+            f"and justify each step."
+        ),
+        "question_type": q_type,
+        "marks": 1 if is_mcq else marks,
+        "has_internal_choice": with_choice,
+        "alternative_question_text": (
+            f"[{subject}] Q{number} (alternative): Prove that $x^{{2}} - {number}x \\geq -\\frac{{{number * number}}}{{4}}$."
+            if with_choice else None
+        ),
+        "options": None,
+        "correct_answer": None,
+    }
+    if is_mcq:
+        answer = "ABCD"[number % 4]
+        question["options"] = {letter: f"${number} + {i}$" for i, letter in enumerate("ABCD")}
+        question["correct_answer"] = answer
+    return question
+
+
+def _fake_section(subject: str, section: str, details: Dict[str, Any], first_number: int, choice_count: int) -> Dict[str, Any]:
+    count = details["questions"]
+    return {
+        "section": section,
+        "title": f"Section {section}: {details['type']}",
+        "questions": [
+            _fake_question(
+                subject,
+                first_number + i,
+                section,
+                details["type"],
+                details["marks_each"],
+                # Choices go on the last questions of the section, as papers usually place them
+                with_choice=i >= count - choice_count,
+            )
+            for i in range(count)
+        ],
+    }
+
+
+def _fake_paper(board: str, class_num: int, subject: str) -> Dict[str, Any]:
+    from backend.gemini_service import GeminiService
+
+    pattern = get_board_pattern(board, class_num)
+    allocation = GeminiService._allocate_internal_choices(pattern)
+    sections = []
+    number = 1
+    for section, details in pattern["sections"].items():
+        sections.append(_fake_section(subject, section, details, number, allocation.get(section, 0)))
+        number += details["questions"]
+    return {
+        "duration_minutes": pattern["duration_minutes"],
+        "total_marks": pattern["total_marks"],
+        "instructions": GeminiService._default_instructions(pattern, allocation),
+        "sections": sections,
+    }
+
+
+def paper_request(prompt: str) -> Optional[Dict[str, Any]]:
+    """Board, class and subject of a whole-paper prompt."""
+    match = _BOARD_CLASS_RE.search(prompt)
+    if "COMPLETE question paper" not in prompt or not match:
+        return None
+    return {"board": match.group(1), "class_num": int(match.group(2)), "subject": match.group(3).strip()}
+
+
+def section_request(prompt: str) -> Optional[Dict[str, Any]]:
+    """Section, its pattern details, first question number and choice count of a section prompt."""
+    paper = _SECTION_PAPER_RE.search(prompt)
+    this = _THIS_SECTION_RE.search(prompt)
+    numbers = _FIRST_NUMBER_RE.search(prompt)
+    if "ONE SECTION" not in prompt or not (paper and this and numbers):
+        return None
+    choice = _CHOICE_COUNT_RE.search(prompt)
+    return {
+        "board": paper.group(1),
+        "class_num": int(paper.group(2)),
+        "subject": paper.group(3).strip(),
+        "section": this.group(1),
+        "details": {"type": this.group(4), "questions": int(this.group(2)), "marks_each": int(this.group(3))},
+        "first_number": int(numbers.group(1)),
+        "choice_count": int(choice.group(1)) if choice else 0,
+    }
+
+
+def replacement_request(prompt: str) -> Optional[Dict[str, Any]]:
+    """Section, its spec and the (number, with choice) slots of a replacement-questions prompt."""
+    match = _REPLACEMENT_RE.search(prompt)
+    spec = _REPLACEMENT_SPEC_RE.search(prompt)
+    if not (match and spec):
+        return None
+    return {
+        "section": match.group(1),
+        "board": match.group(2),
+        "class_num": int(match.group(3)),
+        "subject": match.group(4).strip(),
+        "details": {"type": spec.group(1).strip(), "marks_each": int(spec.group(2))},
+        "slots": [(int(m.group(1)), m.group(2) == "with") for m in _REPLACEMENT_SLOT_RE.finditer(prompt)],
+    }
+
+
+def evaluation_request(prompt: str) -> Optional[Dict[str, Any]]:
+    """Student name and the listed questions (number, section, marks, attempted, has choice) of an evaluation prompt."""
+    if 'exactly one entry in "questions"' not in prompt:
+        return None
+    matches = list(_EVAL_QUESTION_RE.finditer(prompt))
+    questions = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(prompt)
+        block = prompt[match.end():end]
+        questions.append({
+            "sequence_number": int(match.group(1)),
+            "section": match.group(2),
+            "marks": int(match.group(3)),
+            "attempted": "**NOT ATTEMPTED**" not in block,
+            "has_internal_choice": "OR (Alternative Option)" in block,
+        })
+    return {
+        "questions": questions,
+    }
+
+
+def _fake_evaluation(request: Dict[str, Any]) -> Dict[str, Any]:
+    questions = []
+    for q in request["questions"]:
+        number, marks = q["sequence_number"], q["marks"]
+        if not q["attempted"]:
+            awarded, feedback = 0.0, "Not attempted."
+        else:
+            # Halves between 40% and 100% of the marks
+            awarded = round(marks * (0.4 + 0.6 * _random()) * 2) / 2
+            feedback = (
+                f"Correct method for Question {number}; **Step 2 is missing** the justification of "
+                f"$\\frac{{a}}{{b}}$ simplification."
+            )
+        questions.append({
+            "question_number": number,
+            "marks_awarded": awarded,
+            "selected_choice": "main" if q["has_internal_choice"] else None,
+            "feedback": feedback,
+        })
+
+    return {
+        "questions": questions,
+        "summary": "Your answers show a good grasp of the fundamentals; present each step explicitly.",
+        "strengths": ["Clear use of notation", "Correct formulae in most answers"],
+        "improvements": ["Show intermediate steps", "Check units and final answers"],
+    }
+
+
+def respond(contents: Any) -> Tuple[str, str]:
+    """(kind, response text) for a prompt sent by GeminiService."""
+    prompt = _prompt_text(contents)
+
+    evaluation = evaluation_request(prompt)
+    if evaluation is not None:
+        return "evaluation", _fenced(_fake_evaluation(evaluation))
+
+    replacement = replacement_request(prompt)
+    if replacement is not None:
+        details = replacement["details"]
+        return "question", _fenced({"questions": [
+            _fake_question(
+                replacement["subject"], number, replacement["section"],
+                details["type"], details["marks_each"], with_choice
+            )
+            for number, with_choice in replacement["slots"]
+        ]})
+
+    section = section_request(prompt)
+    if section is not None:
+        return "section", _fenced(_fake_section(
+            section["subject"], section["section"], section["details"],
+            section["first_number"], section["choice_count"]
+        ))
+
+    paper = paper_request(prompt)
+    if paper is not None:
+        return "paper", _fenced(_fake_paper(paper["board"], paper["class_num"], paper["subject"]))
+
+    return "other", "OK"
+
+
+class _Call:
+    """One simulated generate_content call: fault injection, latency and usage"""
+
+    def __init__(self, model: str, contents: Any):
+        self.error = _injected_error(model)
+        self.latency = sample_latency()
+        if self.error is not None:
+            stats.record_error(self.error.code)
+            self.latency *= 0.05  # errors come back fast
+            return
+        self.kind, self.text = respond(contents)
+        self.usage = FakeUsage(_prompt_tokens(contents), max(1, len(self.text) // CHARS_PER_TOKEN))
+        stats.record_call(self.kind, self.usage)
+
+    def response(self) -> FakeResponse:
+        if self.error is not None:
+            raise self.error
+        return FakeResponse(self.text, self.usage)
+
+    def chunks(self) -> List[FakeResponse]:
+        if self.error is not None:
+            raise self.error
+        pieces = [self.text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(self.text), STREAM_CHUNK_CHARS)] or [""]
+        return [
+            FakeResponse(piece, self.usage if i == len(pieces) - 1 else None)
+            for i, piece in enumerate(pieces)
+        ]
+
+
+def _upload(file: Any) -> FakeFile:
+    stats.record_upload()
+    digest = hashlib.sha1(str(file).encode()).hexdigest()[:16]
+    return FakeFile(uri=f"https://generativelanguage.googleapis.com/v1beta/files/{digest}", name=f"files/{digest}")
+
+
+class _Models:
+    def generate_content(self, model: str, contents: Any, config: Any = None) -> FakeResponse:
+        call = _Call(model, contents)
+        time.sleep(call.latency)
+        return call.response()
+
+    def generate_content_stream(self, model: str, contents: Any, config: Any = None) -> Iterator[FakeResponse]:
+        call = _Call(model, contents)
+        time.sleep(call.latency * 0.3)  # time to first token
+        chunks = call.chunks()
+        for chunk in chunks:
+            time.sleep(call.latency * 0.7 / len(chunks))
+            yield chunk
+
+    def list(self) -> List[FakeModel]:
+        return [FakeModel(name) for name in settings.FAKE_GEMINI_MODELS]
+
+
+class _AsyncModels:
+    async def generate_content(self, model: str, contents: Any, config: Any = None) -> FakeResponse:
+        call = _Call(model, contents)
+        await asyncio.sleep(call.latency)
+        return call.response()
+
+    async def generate_content_stream(self, model: str, contents: Any, config: Any = None):
+        call = _Call(model, contents)
+        await asyncio.sleep(call.latency * 0.3)
+        chunks = call.chunks()
+
+        async def stream():
+            for chunk in chunks:
+                await asyncio.sleep(call.latency * 0.7 / len(chunks))
+                yield chunk
+
+        return stream()
+
+    async def list(self):
+        async def models():
+            for name in settings.FAKE_GEMINI_MODELS:
+                yield FakeModel(name)
+
+        return models()
+
+
+class _Files:
+    def upload(self, file: Any, **kwargs: Any) -> FakeFile:
+        time.sleep(settings.FAKE_GEMINI_UPLOAD_SECONDS)
+        return _upload(file)
+
+
+class _AsyncFiles:
+    async def upload(self, file: Any, **kwargs: Any) -> FakeFile:
+        await asyncio.sleep(settings.FAKE_GEMINI_UPLOAD_SECONDS)
+        return _upload(file)
+
+
+class _Aio:
+    def __init__(self):
+        self.models = _AsyncModels()
+        self.files = _AsyncFiles()
+
+
+class FakeGeminiClient:
+    """Drop-in for genai.Client(api_key=...) used when GEMINI_BACKEND=fake"""
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.models = _Models()
+        self.files = _Files()
+        self.aio = _Aio()
@@ -3,16 +3,29 @@ Google Gemini Integration Service
 Handles question paper generation and AI-based evaluation
 """
 from google import genai
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional, Tuple
+import asyncio
+import contextvars
 import json
+import os
 import time
 import logging
 
+from backend import cassettes, model_json, paper_validation
 from backend.config import settings, get_board_pattern
+from backend.key_scheduler import AttemptContext, KeyScheduler
+from backend.rate_limiter import RateLimiter, estimate_tokens, is_daily_quota_error, seconds_until_quota_day_reset
+from backend.circuit_breaker import BreakerRegistry, retry_after_seconds
+from backend.upload_cache import is_file_reference_error, upload_cache
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Attempt that served the latest Gemini call in the current request/task
+_current_attempt: contextvars.ContextVar[Optional[AttemptContext]] = contextvars.ContextVar(
+    "gemini_current_attempt", default=None
+)
+
 
 class GeminiService:
     """Service for interacting with Google Gemini API"""
@@ -20,14 +33,22 @@ class GeminiService:
     def __init__(self):
         """Initialize Gemini service with API key"""
         all_keys = settings.all_api_keys
+        fake_backend = settings.GEMINI_BACKEND == "fake"
+        if not all_keys and fake_backend:
+            all_keys = ["fake-key"]
         if not all_keys:
             raise ValueError("GEMINI_API_KEY not configured")
         
         self.api_keys = all_keys
-        self.current_key_index = 0
-        self.client = genai.Client(api_key=self.api_keys[0])
-        self.last_model_used: Optional[str] = None
-        self.last_key_index_used: Optional[int] = None
+        if fake_backend:
+            from backend.fake_gemini import FakeGeminiClient
+            logger.warning("AI: using the offline fake Gemini backend (GEMINI_BACKEND=fake)")
+            self.scheduler = KeyScheduler(self.api_keys, FakeGeminiClient)
+        else:
+            self.scheduler = KeyScheduler(self.api_keys, lambda key: genai.Client(api_key=key))
+        self.rate_limiter = RateLimiter()
+        self.breakers = BreakerRegistry()
+        self.last_attempt: Optional[AttemptContext] = None
         self.model_name = settings.GEMINI_MODEL
         # Updated fallback models based on ListModels API (Jan 2026)
         # Priority: Gemini 3.x > Gemini 2.5.x > Gemini 2.0.x > Gemma 3.x
@@ -58,50 +79,46 @@ class GeminiService:
         ]
         self._available_models_cache: Optional[List[str]] = None
 
-    def _use_api_key(self, index: int) -> None:
-        """Switch to a specific configured API key by index."""
-        if index < 0 or index >= len(self.api_keys):
-            raise IndexError("API key index out of range")
-        self.current_key_index = index
-        self.client = genai.Client(api_key=self.api_keys[self.current_key_index])
-    
-    def _switch_to_next_api_key(self) -> bool:
-        """Switch to the next available API key. Returns True if switched, False if no more keys."""
-        if self.current_key_index + 1 < len(self.api_keys):
-            self._use_api_key(self.current_key_index + 1)
-            logger.info(f"Switched to backup API key #{self.current_key_index + 1}")
-            return True
-        return False
-    
-    def _reset_to_primary_key(self):
-        """Reset to primary API key"""
-        self._use_api_key(0)
+    @property
+    def client(self) -> Any:
+        """Pooled client for the primary key (used for model discovery)."""
+        return self.scheduler.client(0)
+
+    @property
+    def last_model_used(self) -> Optional[str]:
+        return self.last_attempt.model if self.last_attempt else None
 
-    def generate_question_paper(
+    @property
+    def last_key_index_used(self) -> Optional[int]:
+        return self.last_attempt.key_index if self.last_attempt else None
+
+    def current_attempt(self) -> Optional[AttemptContext]:
+        """Successful attempt of the latest call made from the current request/task."""
+        return _current_attempt.get()
+
+    def _record_success(self, ctx: AttemptContext) -> None:
+        self.last_attempt = ctx
+        _current_attempt.set(ctx)
+
+    async def generate_question_paper_async(
         self,
         board: str,
         class_num: int,
         subject: str,
         chapter_focus: str = None,
         difficulty_level: str = "medium",
-        syllabus_content: str = None
+        syllabus_content: str = None,
+        mode: str = None
     ) -> Dict[str, Any]:
         """
         Generate a complete question paper using Gemini.
-        
-        Args:
-            board: Education board (CBSE/ICSE/WBBSE)
-            class_num: Class number (6-12)
-            subject: Subject name
-            chapter_focus: Optional chapter-wise focus
-            difficulty_level: easy, medium, hard, extreme, ultra_extreme
-            syllabus_content: Extracted syllabus text from uploaded PDF
-        
-        Returns:
-            Dictionary with question paper structure and metadata
+
+        Uses the genai async client so the event loop stays free while the
+        model is generating (typically 30-120 seconds). `mode` ("single" or
+        "sectioned") overrides PAPER_GENERATION_MODE.
         """
         logger.info(
-            "AI: generate_question_paper board=%s class=%s subject=%s difficulty=%s syllabus_chars=%s",
+            "AI: generate_question_paper_async board=%s class=%s subject=%s difficulty=%s syllabus_chars=%s",
             board,
             class_num,
             subject,
@@ -109,7 +126,18 @@ class GeminiService:
             (len(syllabus_content) if syllabus_content else 0),
         )
         pattern = get_board_pattern(board, class_num)
-        
+
+        if (mode or settings.PAPER_GENERATION_MODE) == "sectioned":
+            return await self._generate_sectioned_paper_async(
+                board=board,
+                class_num=class_num,
+                subject=subject,
+                pattern=pattern,
+                chapter_focus=chapter_focus,
+                difficulty_level=difficulty_level,
+                syllabus_content=syllabus_content
+            )
+
         prompt = self._create_question_generation_prompt(
             board=board,
             class_num=class_num,
@@ -119,11 +147,284 @@ class GeminiService:
             difficulty_level=difficulty_level,
             syllabus_content=syllabus_content
         )
-        
-        response = self._generate_with_fallback(prompt)
-        
-        # Parse the response and structure it
-        return self._parse_question_paper_response(response.text, pattern)
+
+        response = await self._generate_with_fallback_async(prompt)
+
+        paper = self._parse_question_paper_response(response.text, pattern)
+        return await self._repair_paper_async(
+            paper,
+            pattern,
+            board=board,
+            class_num=class_num,
+            subject=subject,
+            chapter_focus=chapter_focus,
+            difficulty_level=difficulty_level,
+            syllabus_content=syllabus_content
+        )
+
+    async def _generate_sectioned_paper_async(
+        self,
+        board: str,
+        class_num: int,
+        subject: str,
+        pattern: Dict[str, Any],
+        chapter_focus: str = None,
+        difficulty_level: str = "medium",
+        syllabus_content: str = None
+    ) -> Dict[str, Any]:
+        """
+        Generate one section per concurrent model call and merge them into the usual paper_json shape.
+
+        Wall-clock time tracks the slowest section. A section whose output does
+        not parse is regenerated on its own (up to PAPER_SECTION_MAX_ATTEMPTS);
+        the other sections are kept.
+        """
+        choice_allocation = self._allocate_internal_choices(pattern)
+
+        specs = []
+        start_number = 1
+        for section, details in pattern['sections'].items():
+            specs.append((section, details, start_number))
+            start_number += details['questions']
+
+        async def build_section(section: str, details: Dict[str, Any], first_number: int):
+            prompt = self._create_section_generation_prompt(
+                board=board,
+                class_num=class_num,
+                subject=subject,
+                pattern=pattern,
+                section=section,
+                first_number=first_number,
+                choice_count=choice_allocation.get(section, 0),
+                chapter_focus=chapter_focus,
+                difficulty_level=difficulty_level,
+                syllabus_content=syllabus_content
+            )
+            last_error: Optional[Exception] = None
+            max_attempts = settings.PAPER_SECTION_MAX_ATTEMPTS
+            for attempt in range(1, max_attempts + 1):
+                response = await self._generate_with_fallback_async(prompt)
+                try:
+                    parsed = self._parse_section_response(response.text, section, details, first_number)
+                    return parsed, self.current_attempt()
+                except ValueError as e:
+                    last_error = e
+                    logger.warning(
+                        "AI: section parse failed section=%s attempt=%s/%s err=%s",
+                        section,
+                        attempt,
+                        max_attempts,
+                        str(e)[:160],
+                    )
+            raise ValueError(f"Section {section} failed after {max_attempts} attempts: {last_error}")
+
+        started = time.monotonic()
+        results = await asyncio.gather(
+            *(build_section(*spec) for spec in specs),
+            return_exceptions=True
+        )
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            raise errors[0]
+
+        # Child tasks ran in copied contexts; surface the last section's attempt to the caller
+        _current_attempt.set(results[-1][1])
+        logger.info(
+            "AI: sectioned paper generated sections=%s elapsed=%.1fs",
+            len(results),
+            time.monotonic() - started,
+        )
+
+        paper = {
+            "duration_minutes": pattern["duration_minutes"],
+            "total_marks": pattern["total_marks"],
+            "instructions": self._default_instructions(pattern, choice_allocation),
+            "sections": [section_data for section_data, _ in results],
+        }
+        return await self._repair_paper_async(
+            paper,
+            pattern,
+            board=board,
+            class_num=class_num,
+            subject=subject,
+            chapter_focus=chapter_focus,
+            difficulty_level=difficulty_level,
+            syllabus_content=syllabus_content
+        )
+
+    async def _repair_paper_async(
+        self,
+        paper: Dict[str, Any],
+        pattern: Dict[str, Any],
+        board: str,
+        class_num: int,
+        subject: str,
+        chapter_focus: str = None,
+        difficulty_level: str = "medium",
+        syllabus_content: str = None
+    ) -> Dict[str, Any]:
+        """
+        Check a generated paper against its board pattern and regenerate only what is wrong.
+
+        Each round (up to PAPER_REPAIR_MAX_ROUNDS) makes one concurrent call per offending
+        section: the section prompt when it is missing or mostly broken, otherwise a short
+        replacement prompt for just the bad questions. Raises ValueError if the paper still
+        cannot be turned into questions afterwards.
+        """
+        report = paper_validation.normalize_paper(paper, pattern)
+        if report.fixes:
+            logger.info("AI: paper normalized fixes=%s first=%s", len(report.fixes), report.fixes[:3])
+
+        for round_number in range(1, settings.PAPER_REPAIR_MAX_ROUNDS + 1):
+            if not report.issues:
+                break
+            plan = paper_validation.repair_plan(paper, pattern, report, settings.PAPER_REPAIR_SECTION_RATIO)
+            logger.warning(
+                "AI: paper repair round=%s issues=%s plan=%s",
+                round_number,
+                report.summary(),
+                {label: (slots if slots is not None else "section") for label, slots in plan.items()},
+            )
+            results = await asyncio.gather(
+                *(
+                    self._repair_section_async(
+                        paper, pattern, label, slots,
+                        board=board,
+                        class_num=class_num,
+                        subject=subject,
+                        chapter_focus=chapter_focus,
+                        difficulty_level=difficulty_level,
+                        syllabus_content=syllabus_content
+                    )
+                    for label, slots in plan.items()
+                ),
+                return_exceptions=True
+            )
+            for label, result in zip(plan, results):
+                if isinstance(result, BaseException):
+                    logger.warning("AI: paper repair failed section=%s err=%s", label, str(result)[:160])
+            report = paper_validation.normalize_paper(paper, pattern)
+
+        if report.issues:
+            logger.warning("AI: paper accepted with issues=%s", report.summary())
+        report.raise_if_fatal()
+        return paper
+
+    async def _repair_section_async(
+        self,
+        paper: Dict[str, Any],
+        pattern: Dict[str, Any],
+        section: str,
+        slots: Optional[List[paper_validation.RepairSlot]],
+        board: str,
+        class_num: int,
+        subject: str,
+        chapter_focus: str = None,
+        difficulty_level: str = "medium",
+        syllabus_content: str = None
+    ) -> None:
+        """Regenerate a whole section (slots=None) or the given question slots, in place in `paper`."""
+        details = pattern['sections'][section]
+        section_data = next(s for s in paper['sections'] if s['section'] == section)
+        first_number = paper_validation.first_numbers(pattern)[section]
+
+        if slots is None:
+            prompt = self._create_section_generation_prompt(
+                board=board,
+                class_num=class_num,
+                subject=subject,
+                pattern=pattern,
+                section=section,
+                first_number=first_number,
+                choice_count=paper_validation.choices_wanted(paper, pattern, section),
+                chapter_focus=chapter_focus,
+                difficulty_level=difficulty_level,
+                syllabus_content=syllabus_content
+            )
+            response = await self._generate_with_fallback_async(prompt)
+            parsed = self._parse_section_response(response.text, section, details, first_number)
+            section_data['title'] = parsed['title']
+            section_data['questions'] = parsed['questions']
+            return
+
+        questions = section_data['questions']
+        replacing = {slot.index for slot in slots}
+        neighbours = [
+            (first_number + index, q['question_text'])
+            for index, q in enumerate(questions)
+            if index not in replacing and isinstance(q, dict) and q.get('question_text')
+        ]
+        prompt = self._create_question_replacement_prompt(
+            board=board,
+            class_num=class_num,
+            subject=subject,
+            pattern=pattern,
+            section=section,
+            slots=slots,
+            neighbours=neighbours,
+            chapter_focus=chapter_focus,
+            difficulty_level=difficulty_level
+        )
+        response = await self._generate_with_fallback_async(prompt)
+        replacements = self._parse_replacement_response(response.text, section, details, slots)
+        for slot, question in zip(slots, replacements):
+            if slot.index < len(questions):
+                questions[slot.index] = question
+            else:
+                questions.append(question)
+
+    async def regenerate_question_async(
+        self,
+        board: str,
+        class_num: int,
+        subject: str,
+        pattern: Dict[str, Any],
+        section: str,
+        details: Dict[str, Any],
+        question_number: int,
+        with_choice: bool,
+        neighbours: List[Tuple[int, str]],
+        chapter_focus: str = None,
+        difficulty_level: str = "medium",
+        reason: str = None
+    ) -> Dict[str, Any]:
+        """
+        One replacement question for an existing exam: a single short call using the
+        section spec `details` and the (number, text) `neighbours` to avoid duplicates.
+        Retried up to PAPER_SECTION_MAX_ATTEMPTS; raises ValueError if none is usable.
+        """
+        pattern = {**pattern, 'sections': {**pattern['sections'], section: details}}
+        slot = paper_validation.RepairSlot(index=0, question_number=question_number, with_choice=with_choice)
+        prompt = self._create_question_replacement_prompt(
+            board=board,
+            class_num=class_num,
+            subject=subject,
+            pattern=pattern,
+            section=section,
+            slots=[slot],
+            neighbours=neighbours,
+            chapter_focus=chapter_focus,
+            difficulty_level=difficulty_level,
+            reason=reason
+        )
+
+        last_error: Optional[Exception] = None
+        max_attempts = settings.PAPER_SECTION_MAX_ATTEMPTS
+        for attempt in range(1, max_attempts + 1):
+            response = await self._generate_with_fallback_async(prompt)
+            try:
+                return self._parse_replacement_response(response.text, section, details, [slot])[0]
+            except ValueError as e:
+                last_error = e
+                logger.warning(
+                    "AI: question regeneration parse failed section=%s question=%s attempt=%s/%s err=%s",
+                    section,
+                    question_number,
+                    attempt,
+                    max_attempts,
+                    str(e)[:200],
+                )
+        raise ValueError(f"Question {question_number} could not be regenerated: {last_error}")
     
     def _create_question_generation_prompt(
         self,
@@ -147,31 +448,7 @@ class GeminiService:
             ic = pattern['internal_choice']
             internal_choice_info = f"\n- Internal Choice: {ic['questions_with_choice']} questions in sections {', '.join(ic['sections'])}"
         
-        chapter_instruction = ""
-        if chapter_focus:
-            chapter_instruction = f"\n- Focus on these chapters/topics: {chapter_focus}"
-        
-        # Difficulty level descriptions
-        difficulty_descriptions = {
-            "easy": "EASY - Basic questions for beginners. Focus on fundamental concepts, direct application questions, and straightforward problems.",
-            "medium": "MEDIUM - Standard practice level. Balanced mix of basic and moderate difficulty questions for regular practice.",
-            "board": "BOARD LEVEL - Actual board exam standard. Questions exactly like real CBSE/ICSE/WBBSE board exams with proper marking scheme, common question patterns, and expected difficulty.",
-            "hard": "HARD - Challenging questions for advanced students. Include complex multi-step problems, application-based questions, and HOTS (Higher Order Thinking Skills).",
-            "extreme": "EXTREME - Competition level difficulty. Include questions similar to JEE Mains, NEET, and state-level competitive exams.",
-            "ultra_extreme": "ULTRA EXTREME - Olympiad/JEE Advanced level. Include highly challenging questions requiring deep conceptual understanding, creative problem-solving, and advanced mathematical/scientific reasoning."
-        }
-        
-        difficulty_instruction = f"\n- DIFFICULTY LEVEL: {difficulty_descriptions.get(difficulty_level, difficulty_descriptions['medium'])}"
-        
-        syllabus_instruction = ""
-        if syllabus_content:
-            syllabus_instruction = f"""\n\n**SYLLABUS REFERENCE (USE ONLY YEARLY/ANNUAL/FINAL EXAM CONTENT):**
-The following is the student's syllabus. Generate questions ONLY from the YEARLY/ANNUAL/FINAL examination syllabus sections.
-If other exams (like mid-term, unit tests) are referenced in the yearly syllabus, you may include those topics too.
----
-{syllabus_content[:3000]}  
----
-"""
+        shared_context = self._generation_context(chapter_focus, difficulty_level, syllabus_content)
         
         prompt = f"""You are an expert Indian education board examiner for {board}.
 
@@ -180,7 +457,7 @@ Generate a COMPLETE question paper for:
 - Class: {class_num}
 - Subject: {subject}
 - Total Marks: {pattern['total_marks']}
-- Duration: {pattern['duration_minutes']} minutes{chapter_instruction}{difficulty_instruction}{syllabus_instruction}
+- Duration: {pattern['duration_minutes']} minutes{shared_context}
 
 STRICT REQUIREMENTS:
 1. Follow the EXACT {board} Class {class_num} pattern:
@@ -239,89 +516,355 @@ Generate the complete paper now. Output ONLY valid JSON, no additional text."""
         
         return prompt
     
-    def _parse_question_paper_response(
+    def _generation_context(
+        self,
+        chapter_focus: str = None,
+        difficulty_level: str = "medium",
+        syllabus_content: str = None
+    ) -> str:
+        """Chapter focus, difficulty and syllabus instructions shared by full-paper and section prompts"""
+        
+        chapter_instruction = ""
+        if chapter_focus:
+            chapter_instruction = f"\n- Focus on these chapters/topics: {chapter_focus}"
+        
+        # Difficulty level descriptions
+        difficulty_descriptions = {
+            "easy": "EASY - Basic questions for beginners. Focus on fundamental concepts, direct application questions, and straightforward problems.",
+            "medium": "MEDIUM - Standard practice level. Balanced mix of basic and moderate difficulty questions for regular practice.",
+            "board": "BOARD LEVEL - Actual board exam standard. Questions exactly like real CBSE/ICSE/WBBSE board exams with proper marking scheme, common question patterns, and expected difficulty.",
+            "hard": "HARD - Challenging questions for advanced students. Include complex multi-step problems, application-based questions, and HOTS (Higher Order Thinking Skills).",
+            "extreme": "EXTREME - Competition level difficulty. Include questions similar to JEE Mains, NEET, and state-level competitive exams.",
+            "ultra_extreme": "ULTRA EXTREME - Olympiad/JEE Advanced level. Include highly challenging questions requiring deep conceptual understanding, creative problem-solving, and advanced mathematical/scientific reasoning."
+        }
+        
+        difficulty_instruction = f"\n- DIFFICULTY LEVEL: {difficulty_descriptions.get(difficulty_level, difficulty_descriptions['medium'])}"
+        
+        syllabus_instruction = ""
+        if syllabus_content:
+            syllabus_instruction = f"""\n\n**SYLLABUS REFERENCE (USE ONLY YEARLY/ANNUAL/FINAL EXAM CONTENT):**
+The following is the student's syllabus. Generate questions ONLY from the YEARLY/ANNUAL/FINAL examination syllabus sections.
+If other exams (like mid-term, unit tests) are referenced in the yearly syllabus, you may include those topics too.
+---
+{syllabus_content[:3000]}  
+---
+"""
+        
+        return f"{chapter_instruction}{difficulty_instruction}{syllabus_instruction}"
+    
+    @staticmethod
+    def _allocate_internal_choices(pattern: Dict[str, Any]) -> Dict[str, int]:
+        """Spread the pattern's internal-choice count over its sections, round-robin from the last one."""
+        return paper_validation.choice_allocation(pattern)
+
+    @staticmethod
+    def _default_instructions(pattern: Dict[str, Any], choice_allocation: Dict[str, int]) -> List[str]:
+        """General instructions for a merged paper (built locally instead of by a model call)."""
+        instructions = [
+            "All questions are compulsory unless an internal choice is given.",
+            f"This question paper has {len(pattern['sections'])} sections: "
+            + ", ".join(pattern['sections'].keys()) + ".",
+        ]
+        for section, details in pattern['sections'].items():
+            instructions.append(
+                f"Section {section} has {details['questions']} {details['type']} questions "
+                f"of {details['marks_each']} mark{'s' if details['marks_each'] != 1 else ''} each."
+            )
+        choice_sections = [sec for sec, count in choice_allocation.items() if count]
+        if choice_sections:
+            instructions.append(
+                "Internal choice is provided in some questions of Section(s) "
+                + ", ".join(choice_sections) + ". Attempt only one of the alternatives."
+            )
+        instructions.append(f"Time allowed: {pattern['duration_minutes']} minutes. Maximum marks: {pattern['total_marks']}.")
+        return instructions
+
+    def _create_section_generation_prompt(
+        self,
+        board: str,
+        class_num: int,
+        subject: str,
+        pattern: Dict[str, Any],
+        section: str,
+        first_number: int,
+        choice_count: int = 0,
+        chapter_focus: str = None,
+        difficulty_level: str = "medium",
+        syllabus_content: str = None
+    ) -> str:
+        """Create the prompt for a single section of a question paper"""
+        details = pattern['sections'][section]
+        last_number = first_number + details['questions'] - 1
+        shared_context = self._generation_context(chapter_focus, difficulty_level, syllabus_content)
+
+        other_sections = "\n".join([
+            f"  - Section {sec}: {d['questions']} × {d['marks_each']} marks ({d['type']})"
+            for sec, d in pattern['sections'].items()
+            if sec != section
+        ])
+
+        choice_rule = "Do NOT add internal choice to any question in this section."
+        if choice_count:
+            choice_rule = (
+                f"Exactly {choice_count} question(s) in this section must have an internal choice: "
+                "set has_internal_choice to true and give an equally difficult alternative_question_text "
+                "worth the same marks. All other questions have has_internal_choice false."
+            )
+
+        is_mcq = details['type'].upper() == "MCQ"
+        mcq_rule = (
+            "Each question is an MCQ worth exactly 1 mark with 4 options (A, B, C, D) and a correct_answer key."
+            if is_mcq else
+            "These are not MCQs: set options and correct_answer to null."
+        )
+
+        prompt = f"""You are an expert Indian education board examiner for {board}.
+
+You are writing ONE SECTION of a {board} Class {class_num} {subject} question paper
+(Total Marks: {pattern['total_marks']}, Duration: {pattern['duration_minutes']} minutes).{shared_context}
+
+THIS SECTION:
+- Section {section}: {details['questions']} questions × {details['marks_each']} marks each ({details['type']})
+- Number the questions {first_number} to {last_number}
+
+Other sections are written separately (do not repeat their content):
+{other_sections or "  - none"}
+
+STRICT REQUIREMENTS:
+1. Exactly {details['questions']} questions, each worth {details['marks_each']} marks.
+2. {mcq_rule}
+3. Internal Choice: {choice_rule}
+4. For Mathematics and Science subjects:
+   - Use proper LaTeX notation for all mathematical expressions
+   - Use standard LaTeX commands: \\frac{{}}{{}}, \\sqrt{{}}, ^{{}}, _{{}}, \\int, \\sum, \\lim, etc.
+   - Enclose inline math in $ and display math in $$
+5. Use proper board-specific terminology and style
+6. **DIFFICULTY CALIBRATION:** Strictly follow the specified difficulty level.
+
+OUTPUT FORMAT (STRICT JSON):
+{{
+  "section": "{section}",
+  "title": "Section {section} Title",
+  "questions": [
+    {{
+      "question_number": {first_number},
+      "question_text": "Question with LaTeX if needed: $x^2$",
+      "question_type": "{details['type']}",
+      "marks": {details['marks_each']},
+      "has_internal_choice": false,
+      "alternative_question_text": null,
+      "options": {'{{"A": "Option A", "B": "Option B", "C": "Option C", "D": "Option D"}}' if is_mcq else 'null'},
+      "correct_answer": {'"B"' if is_mcq else 'null'}
+    }}
+  ]
+}}
+
+Generate the section now. Output ONLY valid JSON, no additional text."""
+
+        return prompt
+
+    def _create_question_replacement_prompt(
+        self,
+        board: str,
+        class_num: int,
+        subject: str,
+        pattern: Dict[str, Any],
+        section: str,
+        slots: List[paper_validation.RepairSlot],
+        neighbours: List[Tuple[int, str]],
+        chapter_focus: str = None,
+        difficulty_level: str = "medium",
+        reason: str = None
+    ) -> str:
+        """Short prompt for replacing individual questions of a section; `neighbours` are (number, text) to avoid repeating"""
+        details = pattern['sections'][section]
+        shared_context = self._generation_context(chapter_focus, difficulty_level)
+        is_mcq = paper_validation.is_mcq_section(details)
+        mcq_rule = (
+            "Each question is an MCQ worth exactly 1 mark with 4 options (A, B, C, D) and a correct_answer key."
+            if is_mcq else
+            "These are not MCQs: set options and correct_answer to null."
+        )
+
+        wanted = "\n".join(
+            f"- Question {slot.question_number}: "
+            + ("with internal choice (has_internal_choice true and an equally difficult alternative_question_text)"
+               if slot.with_choice else "no internal choice")
+            for slot in slots
+        )
+        existing = "\n".join(f"- Q{number}: {text[:200]}" for number, text in neighbours) or "- none"
+        reason_instruction = f"\nThe previous version was rejected: {reason.strip()[:300]}\n" if reason and reason.strip() else ""
+
+        prompt = f"""You are an expert Indian education board examiner for {board}.
+
+Write REPLACEMENT QUESTIONS for Section {section} of a {board} Class {class_num} {subject} question paper
+(Total Marks: {pattern['total_marks']}, Duration: {pattern['duration_minutes']} minutes).{shared_context}
+
+SECTION SPEC: {details['type']}, {details['marks_each']} marks each.
+{mcq_rule}
+Use LaTeX for mathematical expressions ($...$ inline).
+
+Write exactly {len(slots)} question(s):
+{wanted}
+{reason_instruction}
+Questions already in this section (do not repeat or closely paraphrase them):
+{existing}
+
+OUTPUT FORMAT (STRICT JSON):
+{{
+  "questions": [
+    {{
+      "question_number": {slots[0].question_number},
+      "question_text": "Question with LaTeX if needed: $x^2$",
+      "question_type": "{details['type']}",
+      "marks": {details['marks_each']},
+      "has_internal_choice": false,
+      "alternative_question_text": null,
+      "options": {'{{"A": "Option A", "B": "Option B", "C": "Option C", "D": "Option D"}}' if is_mcq else 'null'},
+      "correct_answer": {'"B"' if is_mcq else 'null'}
+    }}
+  ]
+}}
+
+Output ONLY valid JSON, no additional text."""
+
+        return prompt
+
+    def _parse_replacement_response(
         self,
         response_text: str,
-        pattern: Dict[str, Any]
+        section: str,
+        details: Dict[str, Any],
+        slots: List[paper_validation.RepairSlot]
+    ) -> List[Dict[str, Any]]:
+        """Replacement questions in slot order; raises ValueError unless every one is usable."""
+        try:
+            data = self._load_model_json(response_text)
+        except Exception as e:
+            raise ValueError(f"Failed to parse replacement questions for section {section}: {str(e)}")
+
+        questions = data.get("questions") if isinstance(data, dict) else data
+        if not isinstance(questions, list) or len(questions) != len(slots):
+            raise ValueError(
+                f"Section {section} replacement returned "
+                f"{len(questions) if isinstance(questions, list) else 'no'} questions, expected {len(slots)}"
+            )
+
+        for slot, q in zip(slots, questions):
+            problems = paper_validation.question_problems(q, details)
+            if slot.with_choice and not (isinstance(q, dict) and q.get("has_internal_choice")):
+                problems.append(paper_validation.CHOICE_COUNT)
+            if problems:
+                raise ValueError(f"Section {section} replacement Q{slot.question_number}: {', '.join(problems)}")
+            q["question_number"] = slot.question_number
+        return questions
+
+    def _parse_section_response(
+        self,
+        response_text: str,
+        section: str,
+        details: Dict[str, Any],
+        first_number: int
     ) -> Dict[str, Any]:
-        """Parse Gemini's response into structured format"""
+        """Parse one section's response; raises ValueError if it does not match the section spec."""
         try:
-            def _restore_latex_control_escapes(obj: Any) -> Any:
-                """Restore common LaTeX commands that may have been eaten by JSON escapes.
-
-                Example: '\\frac' can become a form-feed control char ('\f') + 'rac' if the model outputs
-                single backslashes in JSON. This normalizes those cases back to literal backslash sequences.
-                """
-                if isinstance(obj, str):
-                    # Only restore control chars that are unlikely to be intended in question text.
-                    return (
-                        obj.replace("\f", r"\\f")
-                        .replace("\t", r"\\t")
-                        .replace("\b", r"\\b")
-                        .replace("\r", r"\\r")
-                    )
-                if isinstance(obj, list):
-                    return [_restore_latex_control_escapes(v) for v in obj]
-                if isinstance(obj, dict):
-                    return {k: _restore_latex_control_escapes(v) for k, v in obj.items()}
-                return obj
-
-            # Extract JSON from response (Gemini might wrap it in markdown)
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                response_text = response_text.split("```")[1].split("```")[0].strip()
-
-            # First attempt: parse as-is
-            try:
-                paper_data = json.loads(response_text)
-            except json.JSONDecodeError:
-                import re
-
-                # Try to isolate JSON if extra text exists
-                start = response_text.find("{")
-                end = response_text.rfind("}")
-                if start != -1 and end != -1 and end > start:
-                    response_text = response_text[start:end + 1]
-
-                # Normalize smart quotes
-                response_text = response_text.replace("“", '"').replace("”", '"')
-                response_text = response_text.replace("‘", "'").replace("’", "'")
-
-                # Remove trailing commas before } or ]
-                response_text = re.sub(r",\s*([}\]])", r"\1", response_text)
-
-                # IMPORTANT: Preserve LaTeX backslashes.
-                # If the model outputs single backslashes inside JSON strings (e.g., "\frac"), JSON will
-                # interpret sequences like \f, \t, \b, \r as control escapes. We proactively double any
-                # *single* backslash that isn't already escaped, excluding unicode escapes (\uXXXX).
-                response_text = re.sub(
-                    r"(?<!\\)\\(?!\\)(?!u[0-9a-fA-F]{4})",
-                    r"\\\\",
-                    response_text,
-                )
+            data = self._load_model_json(response_text)
+        except Exception as e:
+            raise ValueError(f"Failed to parse section {section}: {str(e)}")
+
+        # Accept a bare section object or a paper-shaped wrapper around it
+        if isinstance(data, dict) and "sections" in data and isinstance(data["sections"], list) and data["sections"]:
+            data = data["sections"][0]
+        if not isinstance(data, dict) or not isinstance(data.get("questions"), list):
+            raise ValueError(f"Section {section} response has no questions list")
+
+        questions = data["questions"]
+        if len(questions) != details['questions']:
+            raise ValueError(
+                f"Section {section} returned {len(questions)} questions, expected {details['questions']}"
+            )
+
+        for offset, q in enumerate(questions):
+            if not isinstance(q, dict) or not q.get("question_text"):
+                raise ValueError(f"Section {section} question {offset + 1} is missing question_text")
+            q["question_number"] = first_number + offset
+            q["marks"] = details['marks_each']
+            q.setdefault("question_type", details['type'])
+
+        return {
+            "section": section,
+            "title": data.get("title") or f"Section {section}",
+            "questions": questions,
+        }
+    
+    def _load_model_json(self, response_text: str, trace: Optional[Callable[[str, float], None]] = None) -> Any:
+        """
+        Extract and decode the JSON object in a model response, tolerating common model mistakes.
 
-                try:
-                    paper_data = json.loads(response_text)
-                except json.JSONDecodeError:
-                    try:
-                        from json_repair import repair_json
+        Decoding is a single pass of backend.model_json (fences/prose, LaTeX backslashes,
+        trailing commas, smart quotes, truncated output); json_repair is only tried on text
+        it cannot read. `trace(stage, seconds)` is called after each stage that runs (used by
+        the benchmarks); the last stage reported is the one that parsed.
+        """
+        stage_started = time.perf_counter()
+
+        def mark(stage: str) -> None:
+            nonlocal stage_started
+            if trace is not None:
+                now = time.perf_counter()
+                trace(stage, now - stage_started)
+                stage_started = now
 
-                        repaired = repair_json(response_text)
-                        paper_data = json.loads(repaired)
-                    except Exception as repair_error:
-                        raise repair_error
+        stats = model_json.ParseStats()
+        try:
+            data = model_json.loads(response_text, stats, partial=True)
+            mark(stats.decoder)
+        except model_json.ModelJSONError as e:
+            mark("tokenize_failed")
+            parse_error = e
+        else:
+            if stats.truncated_at is not None:
+                logger.warning(
+                    "AI: model JSON truncated at char %s of %s; kept the complete part",
+                    stats.truncated_at, len(response_text)
+                )
+            return data
 
-            # Restore LaTeX commands that may have been converted to control characters during JSON parsing
-            paper_data = _restore_latex_control_escapes(paper_data)
+        logger.warning("AI: model JSON unreadable (%s); trying json_repair", parse_error)
+        try:
+            from json_repair import repair_json
+
+            data = json.loads(repair_json(model_json.repair_text(response_text)))
+            mark("json_repair")
+        except Exception:
+            mark("json_repair_failed")
+            raise parse_error
+        if not isinstance(data, (dict, list)) or not data:
+            raise parse_error
+        return data
+    
+    def _parse_question_paper_response(
+        self,
+        response_text: str,
+        pattern: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Parse Gemini's response into structured format, normalized against the board pattern"""
+        try:
+            paper_data = self._load_model_json(response_text)
 
             # Validate structure
-            if "sections" not in paper_data or "duration_minutes" not in paper_data:
+            if not isinstance(paper_data, dict) or not isinstance(paper_data.get("sections"), list):
                 raise ValueError("Invalid paper structure from Gemini")
 
-            # Enforce board pattern totals (e.g., CBSE must be 80)
-            paper_data["total_marks"] = pattern["total_marks"]
-            paper_data["duration_minutes"] = pattern["duration_minutes"]
+            # Enforce board pattern totals (e.g., CBSE must be 80), marks, counts and numbering;
+            # what is left in the report is repaired by _repair_paper_async
+            report = paper_validation.normalize_paper(paper_data, pattern)
+            if report.issues:
+                logger.warning("AI: paper does not match pattern issues=%s", report.summary())
+            if not isinstance(paper_data.get("instructions"), list):
+                paper_data["instructions"] = self._default_instructions(
+                    pattern, paper_validation.choice_allocation(pattern)
+                )
 
             return paper_data
         
@@ -329,7 +872,7 @@ Generate the complete paper now. Output ONLY valid JSON, no additional text."""
             # Fallback: Return error structure
             raise ValueError(f"Failed to parse Gemini response: {str(e)}\n\nResponse: {response_text}")
     
-    def evaluate_exam(
+    async def evaluate_exam_async(
         self,
         board: str,
         class_num: int,
@@ -337,24 +880,32 @@ Generate the complete paper now. Output ONLY valid JSON, no additional text."""
         student_info: Dict[str, str],
         questions_with_answers: List[Dict[str, Any]],
         paper_json: Dict[str, Any],
-        pdf_attachments: List[Dict[str, Any]] | None = None
-    ) -> str:
+        pdf_attachments: List[Dict[str, Any]] | None = None,
+        objective_summary: Dict[str, Any] | None = None,
+        mode: str = None,
+        on_text: Optional[Callable[[str], None]] = None
+    ) -> Dict[str, Any]:
         """
-        Evaluate student's exam using Gemini as an examiner
-        
-        Args:
-            board: Education board
-            class_num: Class number
-            subject: Subject name
-            student_info: Student details (name, email)
-            questions_with_answers: List of questions with student answers
-            paper_json: Original question paper JSON
-        
-        Returns:
-            Detailed evaluation report as formatted Markdown text
+        Evaluate the student's answers with Gemini as the examiner (non-blocking uploads and generation).
+
+        `mode` ("single" or "sharded") overrides EVALUATION_MODE. `on_text`
+        streams the examiner's raw output as it is generated (single mode only;
+        sharded calls run in parallel and are not streamed).
         """
+        if (mode or settings.EVALUATION_MODE) == "sharded":
+            return await self._evaluate_sharded_async(
+                board=board,
+                class_num=class_num,
+                subject=subject,
+                student_info=student_info,
+                questions_with_answers=questions_with_answers,
+                paper_json=paper_json,
+                pdf_attachments=pdf_attachments,
+                objective_summary=objective_summary
+            )
+
         logger.info(
-            "AI: evaluate_exam board=%s class=%s subject=%s questions=%s pdf_attachments=%s",
+            "AI: evaluate_exam_async board=%s class=%s subject=%s questions=%s pdf_attachments=%s",
             board,
             class_num,
             subject,
@@ -367,15 +918,189 @@ Generate the complete paper now. Output ONLY valid JSON, no additional text."""
             subject=subject,
             student_info=student_info,
             questions_with_answers=questions_with_answers,
-            paper_json=paper_json
+            paper_json=paper_json,
+            objective_summary=objective_summary
         )
-        
-        contents = [prompt]
-        if pdf_attachments:
-            contents.extend(self._build_pdf_parts(pdf_attachments))
 
-        response = self._generate_with_fallback(contents)
-        return response.text
+        response = await self._generate_with_fallback_async(
+            [prompt], pdf_attachments=pdf_attachments, on_text=on_text
+        )
+        return self._parse_evaluation_response(response.text, questions_with_answers)
+
+    @staticmethod
+    def _shard_evaluation_items(
+        questions_with_answers: List[Dict[str, Any]],
+        shard_size: int = 0
+    ) -> List[Dict[str, Any]]:
+        """Split evaluation items by section, or into groups of `shard_size` questions when set."""
+        shards: List[Dict[str, Any]] = []
+        if shard_size > 0:
+            for start in range(0, len(questions_with_answers), shard_size):
+                items = questions_with_answers[start:start + shard_size]
+                first = items[0]['question']['sequence_number']
+                last = items[-1]['question']['sequence_number']
+                shards.append({"label": f"Questions {first}-{last}", "items": items})
+        else:
+            by_section: Dict[str, List[Dict[str, Any]]] = {}
+            for item in questions_with_answers:
+                by_section.setdefault(item['question']['section'], []).append(item)
+            for section, items in by_section.items():
+                shards.append({"label": f"Section {section}", "items": items})
+
+        for shard in shards:
+            shard["max_marks"] = sum(item['question']['marks'] for item in shard["items"])
+            shard["question_numbers"] = {item['question']['sequence_number'] for item in shard["items"]}
+        return shards
+
+    async def _evaluate_sharded_async(
+        self,
+        board: str,
+        class_num: int,
+        subject: str,
+        student_info: Dict[str, str],
+        questions_with_answers: List[Dict[str, Any]],
+        paper_json: Dict[str, Any],
+        pdf_attachments: List[Dict[str, Any]] | None = None,
+        objective_summary: Dict[str, Any] | None = None
+    ) -> Dict[str, Any]:
+        """
+        Evaluate each section (or group of EVALUATION_SHARD_SIZE questions) in its own concurrent call.
+
+        Each shard only carries its own PDFs. A shard whose call fails or whose
+        output does not parse is retried on its own (EVALUATION_SHARD_MAX_ATTEMPTS);
+        the shard results are merged into one structured evaluation.
+        """
+        merged: Dict[str, Any] = {"questions": [], "summary": "", "strengths": [], "improvements": []}
+        shards = self._shard_evaluation_items(questions_with_answers, settings.EVALUATION_SHARD_SIZE)
+        if not shards:
+            # Nothing for the examiner (e.g. every answer was an MCQ graded locally)
+            return merged
+        logger.info(
+            "AI: evaluate_exam sharded board=%s class=%s subject=%s questions=%s shards=%s",
+            board,
+            class_num,
+            subject,
+            len(questions_with_answers),
+            len(shards),
+        )
+
+        async def evaluate_shard(shard: Dict[str, Any]):
+            prompt = self._create_evaluation_prompt(
+                board=board,
+                class_num=class_num,
+                subject=subject,
+                student_info=student_info,
+                questions_with_answers=shard["items"],
+                paper_json=paper_json,
+                shard=shard
+            )
+            shard_pdfs = [
+                item for item in pdf_attachments or []
+                if item.get("question_number") in shard["question_numbers"]
+            ]
+            last_error: Optional[Exception] = None
+            max_attempts = settings.EVALUATION_SHARD_MAX_ATTEMPTS
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    response = await self._generate_with_fallback_async([prompt], pdf_attachments=shard_pdfs)
+                    return self._parse_evaluation_response(response.text, shard["items"]), self.current_attempt()
+                except Exception as e:
+                    last_error = e
+                    logger.warning(
+                        "AI: evaluation shard failed shard=%s attempt=%s/%s err=%s",
+                        shard["label"],
+                        attempt,
+                        max_attempts,
+                        str(e)[:160],
+                    )
+            raise ValueError(f"{shard['label']} failed after {max_attempts} attempts: {last_error}")
+
+        started = time.monotonic()
+        results = await asyncio.gather(*(evaluate_shard(shard) for shard in shards), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            raise errors[0]
+
+        _current_attempt.set(results[-1][1])
+        logger.info(
+            "AI: sharded evaluation done shards=%s elapsed=%.1fs",
+            len(shards),
+            time.monotonic() - started,
+        )
+
+        summaries = []
+        for shard, (evaluation, _) in zip(shards, results):
+            merged["questions"].extend(evaluation["questions"])
+            merged["strengths"].extend(evaluation["strengths"])
+            merged["improvements"].extend(evaluation["improvements"])
+            if evaluation["summary"]:
+                summaries.append(f"**{shard['label']}:** {evaluation['summary']}")
+        merged["summary"] = "\n\n".join(summaries)
+        return merged
+
+    def _parse_evaluation_response(
+        self,
+        response_text: str,
+        questions_with_answers: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Parse the examiner's JSON into per-question results for the questions that were sent.
+
+        Marks are clamped to each question's maximum. Unattempted questions the
+        examiner skipped get 0; a missing attempted question raises ValueError.
+        """
+        try:
+            data = self._load_model_json(response_text)
+        except Exception as e:
+            raise ValueError(f"Failed to parse evaluation response: {str(e)}")
+        if not isinstance(data, dict) or not isinstance(data.get("questions"), list):
+            raise ValueError("Evaluation response has no questions list")
+
+        reported: Dict[int, Dict[str, Any]] = {}
+        for entry in data["questions"]:
+            try:
+                reported[int(entry.get("question_number"))] = entry
+            except (AttributeError, TypeError, ValueError):
+                continue
+
+        questions = []
+        missing = []
+        for item in questions_with_answers:
+            q = item['question']
+            number = q['sequence_number']
+            entry = reported.get(number)
+            if entry is None:
+                if _has_answer(item.get('answer')):
+                    missing.append(number)
+                    continue
+                entry = {"marks_awarded": 0, "feedback": "Not attempted."}
+            try:
+                marks = float(entry.get("marks_awarded") or 0)
+            except (TypeError, ValueError):
+                raise ValueError(f"Question {number} has non-numeric marks_awarded")
+            choice = str(entry.get("selected_choice") or "").lower() or None
+            questions.append({
+                "question_number": number,
+                "marks_awarded": min(max(marks, 0.0), float(q['marks'])),
+                "max_marks": q['marks'],
+                "feedback": str(entry.get("feedback") or ""),
+                "selected_choice": choice if choice in ("main", "alternative") else None,
+            })
+
+        if missing:
+            raise ValueError(f"Evaluation response is missing questions {missing}")
+
+        def _string_list(value: Any) -> List[str]:
+            if isinstance(value, str):
+                return [value] if value.strip() else []
+            return [str(v) for v in value or [] if str(v).strip()]
+
+        return {
+            "questions": questions,
+            "summary": str(data.get("summary") or ""),
+            "strengths": _string_list(data.get("strengths")),
+            "improvements": _string_list(data.get("improvements")),
+        }
     
     def _create_evaluation_prompt(
         self,
@@ -384,9 +1109,26 @@ Generate the complete paper now. Output ONLY valid JSON, no additional text."""
         subject: str,
         student_info: Dict[str, str],
         questions_with_answers: List[Dict[str, Any]],
-        paper_json: Dict[str, Any]
+        paper_json: Dict[str, Any],
+        objective_summary: Dict[str, Any] | None = None,
+        shard: Dict[str, Any] | None = None
     ) -> str:
-        """Create the prompt for exam evaluation"""
+        """Create the prompt for exam evaluation (or for one shard of it)"""
+        # Marks available for the listed questions (totals are computed locally from per-question marks)
+        available_marks = sum(item['question']['marks'] for item in questions_with_answers)
+        objective_note = ""
+        if shard:
+            objective_note = (
+                f"\n- This request covers only {shard['label']} of the paper ({shard['max_marks']} marks). "
+                f"Other questions are evaluated separately; do not mention them."
+            )
+        elif objective_summary:
+            numbers = objective_summary['question_numbers']
+            objective_note = (
+                f"\n- Objective questions ({len(numbers)} MCQs, {objective_summary['max_marks']} marks) were graded "
+                f"separately against the answer key and are NOT listed below. Do not evaluate or mention their marks."
+                f"\n- Marks available for the questions below: {available_marks}"
+            )
         
         # Format questions and answers
         qa_formatted = []
@@ -426,6 +1168,7 @@ Type: {q['question_type']}
             qa_formatted.append(qa_text)
         
         qa_section = "\n".join(qa_formatted)
+        numbers_listed = ", ".join(str(item['question']['sequence_number']) for item in questions_with_answers)
         
         prompt = f"""You are a highly experienced examiner for the {board} board, evaluating a Class {class_num} {subject} examination.
 
@@ -441,9 +1184,8 @@ CRITICAL EXAMINER RULES:
    - If a step is missing, explicitly state "Step X is missing"
 
 2. **MARKS CALCULATION**:
-   - Evaluate each answer and assign marks based on correctness
-   - Provide TOTAL MARKS at the end in format: "Total Marks Achieved: X/{paper_json.get('total_marks', 'N/A')}"
-   - Show section-wise marks breakdown
+   - Evaluate each answer and assign marks_awarded between 0 and that question's marks (halves allowed)
+   - Do NOT compute section or overall totals - they are calculated from your per-question marks
    - Award partial marks generously for correct methodology
 
 3. **LaTeX HANDLING**:
@@ -470,7 +1212,7 @@ CRITICAL EXAMINER RULES:
         - "OR" written or circled in the answer sheet
         - The option that has a complete, detailed answer
         - If student wrote "Attempting alternative" or similar note
-     c) Once identified, evaluate ONLY that option for marks
+     c) Once identified, evaluate ONLY that option for marks and report it as selected_choice
      d) If student attempted BOTH options (which is wrong):
         - Mention this is incorrect in feedback
         - Evaluate the better/more complete attempt
@@ -491,16 +1233,25 @@ CRITICAL EXAMINER RULES:
 6. **FEEDBACK STYLE**:
    - Formal, academic, board examination tone
    - Indian educational standards
-   - Use Markdown formatting (headers, bold, lists, tables)
+   - Markdown (bold, lists) and LaTeX are allowed inside feedback strings
    - Constructive and specific
-   - Address the student by name when providing feedback
+   - Write the summary to the student directly, without a greeting (the report already opens with one)
 
-7. **OUTPUT FORMAT (MARKDOWN)**:
-   - Use # for main headers, ## for sections, ### for subsections
-   - Use **bold** for emphasis
-   - Use bullet points and numbered lists
-   - Create a marks table at the end
-   - Format: "Total Marks Achieved: X/{paper_json.get('total_marks', 'N/A')}"
+7. **OUTPUT FORMAT (STRICT JSON)**:
+{{
+  "questions": [
+    {{
+      "question_number": 21,
+      "marks_awarded": 1.5,
+      "selected_choice": "main",
+      "feedback": "Specific feedback for this answer, noting missing steps"
+    }}
+  ],
+  "summary": "Overall feedback addressed to the student",
+  "strengths": ["..."],
+  "improvements": ["..."]
+}}
+   - selected_choice is "main" or "alternative" for OR questions, otherwise null
 
 ---
 
@@ -509,7 +1260,7 @@ EXAM DETAILS:
 - Class: {class_num}
 - Subject: {subject}
 - Total Marks: {paper_json.get('total_marks', 'N/A')}
-- Duration: {paper_json.get('duration_minutes', 'N/A')} minutes
+- Duration: {paper_json.get('duration_minutes', 'N/A')} minutes{objective_note}
 
 ---
 
@@ -519,185 +1270,451 @@ QUESTIONS AND STUDENT ANSWERS:
 
 ---
 
-Provide a comprehensive evaluation report in Markdown format following the rules above. Include:
-1. Student greeting with name
-2. Section-wise evaluation with marks
-3. Detailed feedback for each section
-4. Overall strengths and weaknesses
-5. **MUST END WITH: "Total Marks Achieved: X/{paper_json.get('total_marks', 'N/A')}"**
-6. Percentage and grade recommendation"""
+Return ONE JSON object following the rules above, with exactly one entry in "questions" for EVERY question listed
+(question numbers: {numbers_listed}). Output ONLY valid JSON, no additional text."""
+
+        if shard:
+            prompt = prompt.replace(
+                '"summary": "Overall feedback addressed to the student"',
+                '"summary": "Short feedback on this part only (no greeting, no grade)"'
+            )
         
         return prompt
 
-    def _build_pdf_parts(self, pdf_attachments: List[Dict[str, Any]]) -> List[Any]:
-        """Build Gemini content parts for PDF attachments."""
-        parts: List[Any] = []
-        if not pdf_attachments:
-            return parts
+    async def _build_pdf_parts_async(
+        self,
+        pdf_attachments: List[Dict[str, Any]],
+        client: Any = None,
+        key_index: int = 0
+    ) -> List[Any]:
+        """
+        Build Gemini content parts for PDF attachments (uploaded with the given client/key).
 
+        Files are prepared concurrently (at most GEMINI_UPLOAD_CONCURRENCY at a time) with
+        the async Files API; the "Question N PDF" labels keep the attachment order.
+        """
+        client = client or self.client
+        items = [item for item in pdf_attachments or [] if item.get("file_path")]
+        if not items:
+            return []
+
+        types = _genai_types()
+        semaphore = asyncio.Semaphore(max(1, settings.GEMINI_UPLOAD_CONCURRENCY))
+
+        async def prepare(item: Dict[str, Any]):
+            async with semaphore:
+                started = time.monotonic()
+                file_path = item["file_path"]
+                try:
+                    digest = await asyncio.to_thread(upload_cache.digest, file_path)
+                    uploaded = upload_cache.get(digest, key_index)
+                    mode = "cached"
+                    if uploaded is None:
+                        uploaded = upload_cache.put(digest, key_index, await client.aio.files.upload(file=file_path))
+                        mode = "uploaded"
+                    return _uploaded_part(uploaded, types), _attachment_report(item, mode, started)
+                except Exception as upload_error:
+                    try:
+                        part = await asyncio.to_thread(_inline_pdf_part, file_path, types)
+                        return part, _attachment_report(item, "inline", started, upload_error)
+                    except Exception as e:
+                        return None, _attachment_report(item, "failed", started, e)
+
+        results = await asyncio.gather(*(prepare(item) for item in items))
+
+        return self._assemble_pdf_parts(items, results, key_index)
+
+    @staticmethod
+    def _assemble_pdf_parts(
+        items: List[Dict[str, Any]],
+        results: List[Any],
+        key_index: int
+    ) -> List[Any]:
+        """Interleave labels and prepared parts in attachment order and log per-file timings."""
         # Add a mapping header
-        parts.append("PDF attachments (use these to evaluate handwritten answers):")
+        parts: List[Any] = ["PDF attachments (use these to evaluate handwritten answers):"]
+        reports = []
+        for item, (part, report) in zip(items, results):
+            parts.append(f"Question {item.get('question_number')} PDF: {item.get('filename')}")
+            if part is not None:
+                parts.append(part)
+            reports.append(report)
+            if report["error"]:
+                logger.warning(
+                    "AI: pdf attachment q=%s mode=%s elapsed=%.2fs err=%s",
+                    report["question_number"],
+                    report["mode"],
+                    report["seconds"],
+                    report["error"],
+                )
 
-        try:
-            from google.genai import types  # type: ignore
-        except Exception:
-            types = None
+        counts: Dict[str, int] = {}
+        for report in reports:
+            counts[report["mode"]] = counts.get(report["mode"], 0) + 1
+        logger.info(
+            "AI: pdf attachments prepared key=%s files=%s modes=%s slowest=%.2fs",
+            key_index + 1,
+            len(reports),
+            counts,
+            max(report["seconds"] for report in reports),
+        )
+        return parts
 
-        for item in pdf_attachments:
-            q_num = item.get("question_number")
-            filename = item.get("filename")
-            file_path = item.get("file_path")
-            if not file_path:
-                continue
+    @staticmethod
+    def _classify_error(message: str) -> str:
+        """Classify a Gemini error message as quota / invalid_key / not_found / transient / fatal."""
+        if ("RESOURCE_EXHAUSTED" in message) or ("429" in message):
+            return "quota"
+        if ("INVALID_API_KEY" in message) or ("API_KEY_INVALID" in message) or ("401" in message):
+            return "invalid_key"
+        if ("NOT_FOUND" in message) or ("404" in message):
+            return "not_found"
+        if any(marker in message for marker in ("UNAVAILABLE", "INTERNAL", "DEADLINE_EXCEEDED", "500", "503", "504")):
+            return "transient"
+        return "fatal"
+
+    async def _generate_with_fallback_async(
+        self,
+        contents: Any,
+        pdf_attachments: List[Dict[str, Any]] | None = None,
+        on_text: Optional[Callable[[str], None]] = None
+    ) -> Any:
+        """
+        Generate content with fallback models and backup API keys on quota errors.
+
+        With `on_text`, the response is streamed and `on_text` receives the text
+        generated so far after every chunk (restarting from "" on a new attempt).
+        """
+        replayed = cassettes.replay(contents)
+        if replayed is not None:
+            if on_text is not None:
+                on_text(replayed.text)
+            return replayed
+
+        models = await self._resolve_model_candidates_async()
+        # Page counts of attachments are parsed (once per file) off the event loop
+        state = _FallbackState(await asyncio.to_thread(estimate_tokens, contents, pdf_attachments))
+        logger.info(
+            "AI: _generate_with_fallback_async models=%s keys=%s est_tokens=%s",
+            len(models),
+            len(self.api_keys),
+            state.est_tokens,
+        )
+
+        for _ in range(2):
+            for model_idx, model in enumerate(models):
+                for ctx in self._plan_attempts(model, model_idx, len(models), state):
+                    if not self._reserve(ctx, state):
+                        continue
+                    try:
+                        with self.scheduler.lease(ctx.key_index):
+                            response = await self._attempt_async(ctx, contents, pdf_attachments, state, on_text)
+                    except asyncio.CancelledError:
+                        # The caller went away mid-attempt; don't leave a probe claimed or budget debited
+                        self.breakers.release(ctx.model, ctx.key_index)
+                        self.rate_limiter.refund(ctx.key_index, ctx.model, state.est_tokens)
+                        raise
+                    except Exception as e:
+                        action = self._handle_attempt_error(ctx, e, state)
+                        if action == "next_key":
+                            continue
+                        if action == "next_model":
+                            break
+                        raise
+                    self._finish_attempt(ctx, state, response)
+                    await cassettes.record_async(contents, response, ctx.model, time.perf_counter() - state.started)
+                    return response
 
-            parts.append(f"Question {q_num} PDF: {filename}")
+            wait = self._deferred_wait(state)
+            if wait is None:
+                break
+            await asyncio.sleep(wait)
 
+        raise self._exhausted_error(state)
+
+    async def _attempt_async(
+        self,
+        ctx: AttemptContext,
+        contents: Any,
+        pdf_attachments: List[Dict[str, Any]] | None,
+        state: "_FallbackState",
+        on_text: Optional[Callable[[str], None]] = None
+    ) -> Any:
+        """
+        One generate_content call on ctx's pair, re-uploading once if an uploaded file
+        is gone; streams to `on_text` when given.
+        """
+        for reupload in (False, True):
+            attempt_contents = contents
+            if pdf_attachments:
+                if ctx.key_index not in state.pdf_parts_by_key:
+                    state.pdf_parts_by_key[ctx.key_index] = await self._build_pdf_parts_async(
+                        pdf_attachments, client=ctx.client, key_index=ctx.key_index
+                    )
+                attempt_contents = list(contents) + state.pdf_parts_by_key[ctx.key_index]
             try:
-                uploaded = self.client.files.upload(file=file_path)
-                if types and hasattr(types, "Part"):
-                    parts.append(types.Part.from_uri(uploaded.uri, mime_type=uploaded.mime_type))
-                else:
-                    parts.append(uploaded)
-            except Exception:
-                # Fallback: attach raw bytes if supported
-                try:
-                    with open(file_path, "rb") as f:
-                        data = f.read()
-                    if types and hasattr(types, "Part"):
-                        parts.append(types.Part.from_bytes(data=data, mime_type="application/pdf"))
-                except Exception:
-                    # If attachment fails, continue without stopping evaluation
-                    continue
+                if on_text is None:
+                    return await ctx.client.aio.models.generate_content(model=ctx.model, contents=attempt_contents)
+                return await self._stream_attempt(ctx, attempt_contents, on_text)
+            except Exception as e:
+                if reupload or not self._forget_uploads(ctx, e, pdf_attachments, state):
+                    raise
 
-        return parts
+    @staticmethod
+    def _forget_uploads(
+        ctx: AttemptContext,
+        error: Exception,
+        pdf_attachments: List[Dict[str, Any]] | None,
+        state: "_FallbackState"
+    ) -> bool:
+        """
+        If `error` says an uploaded file expired early or was deleted, drop this key's
+        uploads so the retry re-uploads them. True if the attempt should be retried.
+        """
+        if not pdf_attachments or not is_file_reference_error(str(error)):
+            return False
+        dropped = upload_cache.invalidate_key(ctx.key_index)
+        state.pdf_parts_by_key.pop(ctx.key_index, None)
+        state.reuploaded_keys.add(ctx.key_index)
+        logger.warning(
+            "AI: uploaded_file_gone model=%s api_key=%s/%s dropped=%s; re-uploading",
+            ctx.model,
+            ctx.key_index + 1,
+            ctx.key_count,
+            dropped,
+        )
+        return True
+
+    @staticmethod
+    async def _stream_attempt(ctx: AttemptContext, contents: Any, on_text: Callable[[str], None]) -> Any:
+        """Stream one attempt, reporting progress; returns a response-like object with the full text."""
+        on_text("")
+        text = ""
+        usage_metadata = None
+        stream = await ctx.client.aio.models.generate_content_stream(model=ctx.model, contents=contents)
+        async for chunk in stream:
+            usage_metadata = getattr(chunk, "usage_metadata", None) or usage_metadata
+            if getattr(chunk, "text", None):
+                text += chunk.text
+                on_text(text)
+        return _StreamedResponse(text, usage_metadata)
+
+    def _plan_attempts(self, model: str, model_idx: int, model_count: int, state: "_FallbackState") -> List[AttemptContext]:
+        """Attempt contexts for one model, keys with local budget headroom first."""
+        if model in state.missing_models or self.breakers.is_open(model=model):
+            return []
+        plan = self.scheduler.plan(
+            model,
+            model_idx + 1,
+            model_count,
+            prefer=lambda key_index: self.rate_limiter.has_headroom(key_index, model, state.est_tokens),
+        )
+        return [ctx for ctx in plan if (ctx.model, ctx.key_index) not in state.failed]
 
-    def _generate_with_fallback(self, contents: Any) -> Any:
-        """Generate content with fallback models and backup API keys on quota errors."""
-        tried: List[str] = []
-        # Always start with primary key for deterministic key ordering
-        self._reset_to_primary_key()
+    def _reserve(self, ctx: AttemptContext, state: "_FallbackState") -> bool:
+        """
+        Check the circuit breakers and debit the local rate-limit budget.
 
-        models = self._resolve_model_candidates()
+        Pairs with an open breaker or no budget are skipped without a round-trip.
+        """
+        if not self.breakers.allow(ctx.model, ctx.key_index):
+            state.skipped.append(f"{ctx.model}@key{ctx.key_index + 1}")
+            logger.info(
+                "AI: skip model=%s api_key=%s/%s; circuit open",
+                ctx.model,
+                ctx.key_index + 1,
+                ctx.key_count,
+            )
+            return False
+        if self.rate_limiter.try_acquire(ctx.key_index, ctx.model, state.est_tokens):
+            self._log_attempt(ctx)
+            return True
+        self.breakers.release(ctx.model, ctx.key_index)
+        state.deferred.append(ctx)
         logger.info(
-            "AI: _generate_with_fallback models=%s keys=%s",
-            len(models),
-            len(self.api_keys),
+            "AI: skip model=%s api_key=%s/%s; no local rate-limit headroom",
+            ctx.model,
+            ctx.key_index + 1,
+            ctx.key_count,
         )
+        return False
 
-        last_error: Optional[Exception] = None
+    def _finish_attempt(self, ctx: AttemptContext, state: "_FallbackState", response: Any) -> None:
+        self.rate_limiter.reconcile(ctx.key_index, ctx.model, state.est_tokens, response)
+        self.breakers.record_success(ctx.model, ctx.key_index)
+        self._record_success(ctx)
+        logger.info(
+            "AI: success model=%s api_key=%s/%s",
+            ctx.model,
+            ctx.key_index + 1,
+            ctx.key_count,
+        )
 
-        # REQUIRED ORDER: for each model, try key1 -> key2 -> key3, then move to next model.
-        for model_idx, model in enumerate(models):
-            for key_idx in range(len(self.api_keys)):
-                try:
-                    if self.current_key_index != key_idx:
-                        self._use_api_key(key_idx)
-                        # Key can affect model visibility; drop cache.
-                        self._available_models_cache = None
-
-                    logger.info(
-                        "AI: attempt model=%s model_try=%s/%s api_key=%s/%s",
-                        model,
-                        model_idx + 1,
-                        len(models),
-                        key_idx + 1,
-                        len(self.api_keys),
-                    )
+    def _deferred_wait(self, state: "_FallbackState") -> Optional[float]:
+        """
+        Seconds to wait before a second pass, or None if there is nothing worth waiting for.
 
-                    response = self.client.models.generate_content(model=model, contents=contents)
+        Only used when pairs were skipped for local budget and the earliest one
+        frees up within GEMINI_RATE_LIMIT_MAX_WAIT_SECONDS.
+        """
+        if not state.deferred:
+            return None
+        wait = min(
+            self.rate_limiter.wait_seconds(ctx.key_index, ctx.model, state.est_tokens)
+            for ctx in state.deferred
+        )
+        state.deferred = []
+        if wait > settings.GEMINI_RATE_LIMIT_MAX_WAIT_SECONDS:
+            return None
+        logger.info("AI: all pairs over local budget; waiting %.1fs for headroom", wait)
+        return wait
+
+    def _exhausted_error(self, state: "_FallbackState") -> ValueError:
+        logger.error("AI: exhausted tried=%s skipped=%s", ", ".join(state.tried), len(state.skipped))
+        if not state.tried:
+            return ValueError(
+                "All Gemini models and API keys are cooling down (circuit open or over local rate limits). "
+                "Try again shortly."
+            )
+        return ValueError(
+            f"All Gemini models and API keys exhausted. Tried: {', '.join(state.tried)}. Last error: {state.last_error}"
+        )
 
-                    self.last_model_used = model
-                    self.last_key_index_used = key_idx
-                    logger.info(
-                        "AI: success model=%s api_key=%s/%s",
-                        model,
-                        key_idx + 1,
-                        len(self.api_keys),
-                    )
+    def _log_attempt(self, ctx: AttemptContext) -> None:
+        logger.info(
+            "AI: attempt model=%s model_try=%s/%s api_key=%s/%s",
+            ctx.model,
+            ctx.model_try,
+            ctx.model_count,
+            ctx.key_index + 1,
+            ctx.key_count,
+        )
 
-                    # Reset for next request, but keep last_* fields for observability.
-                    self._reset_to_primary_key()
-                    return response
+    def _handle_attempt_error(self, ctx: AttemptContext, error: Exception, state: "_FallbackState") -> str:
+        """
+        Record a failed attempt and decide what to do next.
 
-                except Exception as e:
-                    last_error = e
-                    tried.append(f"{model}@key{key_idx + 1}")
-                    message = str(e)
-
-                    is_quota = ("RESOURCE_EXHAUSTED" in message) or ("429" in message)
-                    is_not_found = ("NOT_FOUND" in message) or ("404" in message)
-                    is_invalid_key = (
-                        ("INVALID_API_KEY" in message)
-                        or ("API_KEY_INVALID" in message)
-                        or ("401" in message)
+        Returns "next_key", "next_model" or "raise".
+        """
+        state.last_error = error
+        state.tried.append(f"{ctx.model}@key{ctx.key_index + 1}")
+        state.failed.add((ctx.model, ctx.key_index))
+        message = str(error)
+        kind = self._classify_error(message)
+
+        try:
+            if ctx.key_index in state.reuploaded_keys and is_file_reference_error(message):
+                # Fresh uploads were refused too: a problem with this key's files, not with
+                # the model, so no breaker and no missing model
+                logger.warning(
+                    "AI: uploaded_file_refused model=%s api_key=%s/%s; trying next key",
+                    ctx.model,
+                    ctx.key_index + 1,
+                    ctx.key_count,
+                )
+                return "next_key"
+
+            if kind == "quota":
+                # Drain the local buckets and cut the pair out until the quota resets
+                self.rate_limiter.record_quota_error(ctx.key_index, ctx.model, message)
+                cooldown = retry_after_seconds(error)
+                if cooldown is None:
+                    cooldown = (
+                        seconds_until_quota_day_reset()
+                        if is_daily_quota_error(message)
+                        else settings.GEMINI_QUOTA_COOLDOWN_SECONDS
                     )
+                self.breakers.record_failure((ctx.model, ctx.key_index), "quota", cooldown)
+                logger.warning(
+                    "AI: quota_exhausted model=%s api_key=%s/%s cooldown=%.0fs; trying next key",
+                    ctx.model,
+                    ctx.key_index + 1,
+                    ctx.key_count,
+                    cooldown,
+                )
+                return "next_key"
 
-                    if is_quota:
-                        logger.warning(
-                            "AI: quota_exhausted model=%s api_key=%s/%s; trying next key",
-                            model,
-                            key_idx + 1,
-                            len(self.api_keys),
-                        )
-                        time.sleep(0.25 * (key_idx + 1))
-                        continue
+            if kind == "invalid_key":
+                logger.warning(
+                    "AI: invalid_api_key api_key=%s/%s; trying next key",
+                    ctx.key_index + 1,
+                    ctx.key_count,
+                )
+                self.breakers.record_failure(
+                    (None, ctx.key_index), "invalid_key", settings.GEMINI_INVALID_KEY_COOLDOWN_SECONDS
+                )
+                self.scheduler.cool_down(ctx.key_index, settings.GEMINI_INVALID_KEY_COOLDOWN_SECONDS)
+                return "next_key"
 
-                    if is_invalid_key:
-                        logger.warning(
-                            "AI: invalid_api_key api_key=%s/%s; trying next key",
-                            key_idx + 1,
-                            len(self.api_keys),
-                        )
-                        continue
+            if kind == "not_found":
+                logger.warning(
+                    "AI: model_not_found model=%s; moving to next model",
+                    ctx.model,
+                )
+                state.missing_models.add(ctx.model)
+                self.breakers.record_failure(
+                    (ctx.model, None), "not_found", settings.GEMINI_NOT_FOUND_COOLDOWN_SECONDS
+                )
+                # Refresh available models on the next call; likely a stale alias.
+                # This call keeps iterating its own local model list.
+                self._available_models_cache = None
+                return "next_model"
+
+            if kind == "transient":
+                self.breakers.record_failure(
+                    (ctx.model, ctx.key_index),
+                    "transient",
+                    retry_after_seconds(error) or settings.GEMINI_TRANSIENT_COOLDOWN_SECONDS,
+                    threshold=settings.GEMINI_BREAKER_FAILURE_THRESHOLD,
+                )
 
-                    if is_not_found:
-                        logger.warning(
-                            "AI: model_not_found model=%s; moving to next model",
-                            model,
-                        )
-                        # Refresh available models cache; likely a stale alias.
-                        self._available_models_cache = None
-                        break
-
-                    logger.error("AI: failure model=%s api_key=%s/%s err=%s", model, key_idx + 1, len(self.api_keys), message[:160])
-                    # Non-retryable errors should surface immediately
-                    raise
+            logger.error("AI: failure model=%s api_key=%s/%s err=%s", ctx.model, ctx.key_index + 1, ctx.key_count, message[:160])
+            return "raise"
+        finally:
+            # Free any half-open probe this attempt claimed on scopes that were not just re-opened
+            self.breakers.release(ctx.model, ctx.key_index)
+
+    @staticmethod
+    def _filter_generation_models(listed_models: List[Any]) -> List[str]:
+        """Keep only text models that support generateContent."""
+        models = []
+        for m in listed_models:
+            name = getattr(m, "name", None)
+            supported = getattr(m, "supported_generation_methods", None)
+            if not name:
+                continue
+            if supported and "generateContent" not in supported:
+                continue
+            # Exclude non-text models (tts/embedding/robotics)
+            lowered = name.lower()
+            if "tts" in lowered or "embedding" in lowered or "robotics" in lowered:
+                continue
+            models.append(name)
+        return models
 
-        # Reset to primary key for next request
-        self._reset_to_primary_key()
-        logger.error("AI: exhausted tried=%s", ", ".join(tried))
-        raise ValueError(
-            f"All Gemini models and API keys exhausted. Tried: {', '.join(tried)}. Last error: {last_error}"
-        )
+    def _store_discovered_models(self, models: List[str]) -> None:
+        if models:
+            self._available_models_cache = models
+            logger.info(f"✅ Discovered {len(models)} generation-capable models")
+        else:
+            self._available_models_cache = []
+            logger.warning("⚠️  No models discovered, using fallback list")
 
-    def _resolve_model_candidates(self) -> List[str]:
-        """Resolve a list of available models that support generateContent."""
+    async def _resolve_model_candidates_async(self) -> List[str]:
+        """Models to try, best first (discovered from the API once, then cached)."""
         if self._available_models_cache is None:
             try:
                 logger.info("🔍 Discovering available models from API...")
-                models = []
-                for m in self.client.models.list():
-                    name = getattr(m, "name", None)
-                    supported = getattr(m, "supported_generation_methods", None)
-                    if not name:
-                        continue
-                    if supported and "generateContent" not in supported:
-                        continue
-                    # Exclude non-text models (tts/embedding/robotics)
-                    lowered = name.lower()
-                    if "tts" in lowered or "embedding" in lowered or "robotics" in lowered:
-                        continue
-                    models.append(name)
-                if models:
-                    self._available_models_cache = models
-                    logger.info(f"✅ Discovered {len(models)} generation-capable models")
-                else:
-                    self._available_models_cache = []
-                    logger.warning("⚠️  No models discovered, using fallback list")
+                listed = [m async for m in await self.client.aio.models.list()]
+                self._store_discovered_models(self._filter_generation_models(listed))
             except Exception as e:
                 logger.error(f"❌ Model discovery failed: {str(e)}")
                 self._available_models_cache = []
 
+        return self._rank_model_candidates()
+
+    def _rank_model_candidates(self) -> List[str]:
+        """Order discovered models: configured model, then fallbacks, then the rest."""
         # Prefer configured model if available, otherwise fall back
         candidates: List[str] = []
         if self._available_models_cache:
@@ -718,5 +1735,75 @@ Provide a comprehensive evaluation report in Markdown format following the rules
         return candidates
 
 
+class _StreamedResponse:
+    """Stands in for a GenerateContentResponse assembled from streamed chunks"""
+
+    def __init__(self, text: str, usage_metadata: Any = None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class _FallbackState:
+    """Per-call bookkeeping for _generate_with_fallback_async (never shared between calls)"""
+
+    def __init__(self, est_tokens: int):
+        self.est_tokens = est_tokens
+        self.started = time.perf_counter()
+        self.tried: List[str] = []
+        self.last_error: Optional[Exception] = None
+        self.failed: set = set()  # (model, key_index) pairs that errored in this call
+        self.missing_models: set = set()
+        self.deferred: List[AttemptContext] = []  # skipped for local budget
+        self.skipped: List[str] = []  # skipped because a circuit breaker is open
+        self.pdf_parts_by_key: Dict[int, List[Any]] = {}
+        self.reuploaded_keys: set = set()  # keys whose uploads were refused once and re-uploaded
+
+
+def _has_answer(answer: Optional[Dict[str, Any]]) -> bool:
+    return bool(answer) and bool(
+        answer.get("typed_answer") or answer.get("selected_option") or answer.get("uploaded_files_count")
+    )
+
+
+def _genai_types() -> Any:
+    try:
+        from google.genai import types  # type: ignore
+    except Exception:
+        types = None
+    return types
+
+
+def _uploaded_part(uploaded: Any, types: Any) -> Any:
+    if types and hasattr(types, "Part"):
+        return types.Part.from_uri(file_uri=uploaded.uri, mime_type=uploaded.mime_type)
+    return uploaded
+
+
+def _inline_pdf_part(file_path: str, types: Any) -> Any:
+    """Inline PDF bytes, refusing files above GEMINI_INLINE_PDF_MAX_BYTES instead of buffering them."""
+    if not (types and hasattr(types, "Part")):
+        raise ValueError("inline parts are not supported by this google-genai version")
+    size = os.path.getsize(file_path)
+    if size > settings.GEMINI_INLINE_PDF_MAX_BYTES:
+        raise ValueError(f"{size} bytes exceeds the inline limit of {settings.GEMINI_INLINE_PDF_MAX_BYTES}")
+    with open(file_path, "rb") as f:
+        return types.Part.from_bytes(data=f.read(), mime_type="application/pdf")
+
+
+def _attachment_report(
+    item: Dict[str, Any],
+    mode: str,
+    started: float,
+    error: Optional[Exception] = None
+) -> Dict[str, Any]:
+    return {
+        "question_number": item.get("question_number"),
+        "filename": item.get("filename"),
+        "mode": mode,  # cached / uploaded / inline / failed
+        "seconds": time.monotonic() - started,
+        "error": str(error)[:160] if error else None,
+    }
+
+
 # Singleton instance
 gemini_service = GeminiService()
@@ -0,0 +1,108 @@
+"""
+Local grading stage for evaluations
+Scores questions with a deterministic key (MCQs) in-process so only subjective answers go to Gemini
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import re
+
+from sqlalchemy.orm import Session
+
+from backend.models import QuestionResult
+
+_OPTION_RE = re.compile(r"^\(?\s*(?:option\s*)?([A-Za-z])(?![A-Za-z])", re.IGNORECASE)
+
+_LOCAL_FEEDBACK = {
+    "correct": "Correct.",
+    "incorrect": "Incorrect. The correct answer is {correct}.",
+    "not_attempted": "Not attempted. The correct answer is {correct}.",
+}
+
+
+def normalize_option(value: Optional[str]) -> Optional[str]:
+    """Reduce "b", "(B)", "B)", "Option B" to "B"; None if no option letter is present."""
+    if not value:
+        return None
+    match = _OPTION_RE.match(value.strip())
+    return match.group(1).upper() if match else None
+
+
+def is_locally_gradable(question: Dict[str, Any]) -> bool:
+    """A question can be graded without the LLM when it has an option key to compare against."""
+    return (
+        question.get("question_type") == "MCQ"
+        and normalize_option(question.get("correct_answer")) is not None
+    )
+
+
+def grade_objective(
+    questions_with_answers: List[Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Split evaluation items into locally graded results and items left for the LLM.
+
+    Returns (results, subjective_items). Each result carries the question
+    number, section, awarded and maximum marks and the compared options.
+    """
+    results: List[Dict[str, Any]] = []
+    subjective: List[Dict[str, Any]] = []
+
+    for item in questions_with_answers:
+        q = item["question"]
+        if not is_locally_gradable(q):
+            subjective.append(item)
+            continue
+
+        answer = item.get("answer") or {}
+        selected = normalize_option(answer.get("selected_option"))
+        correct = normalize_option(q.get("correct_answer"))
+        if selected is None:
+            outcome = "not_attempted"
+        elif selected == correct:
+            outcome = "correct"
+        else:
+            outcome = "incorrect"
+
+        results.append({
+            "question_id": q.get("id"),
+            "sequence_number": q["sequence_number"],
+            "section": q["section"],
+            "max_marks": q["marks"],
+            "marks_awarded": float(q["marks"]) if outcome == "correct" else 0.0,
+            "selected_option": selected,
+            "correct_answer": correct,
+            "outcome": outcome,
+            "feedback": _LOCAL_FEEDBACK[outcome].format(correct=correct),
+            "selected_choice": None,
+            "graded_by": "local",
+        })
+
+    return results, subjective
+
+
+def objective_summary(results: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Subtotal of the locally graded questions (None when nothing was graded locally)."""
+    if not results:
+        return None
+    return {
+        "question_numbers": [r["sequence_number"] for r in results],
+        "marks_awarded": sum(r["marks_awarded"] for r in results),
+        "max_marks": sum(r["max_marks"] for r in results),
+        "correct": sum(1 for r in results if r["outcome"] == "correct"),
+        "incorrect": sum(1 for r in results if r["outcome"] == "incorrect"),
+        "not_attempted": sum(1 for r in results if r["outcome"] == "not_attempted"),
+    }
+
+
+def store_results(db: Session, exam_id: int, results: List[Dict[str, Any]]) -> None:
+    """Replace an exam's stored per-question results (caller commits)."""
+    db.query(QuestionResult).filter(QuestionResult.exam_id == exam_id).delete(synchronize_session=False)
+    for r in results:
+        db.add(QuestionResult(
+            exam_id=exam_id,
+            question_id=r["question_id"],
+            marks_awarded=r["marks_awarded"],
+            max_marks=r["max_marks"],
+            feedback=r.get("feedback"),
+            selected_choice=r.get("selected_choice"),
+            graded_by=r["graded_by"],
+        ))
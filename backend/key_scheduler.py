@@ -0,0 +1,130 @@
+"""
+API key scheduler for Gemini calls
+Keeps one pooled client per key and hands out immutable per-attempt contexts
+"""
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import itertools
+import threading
+import time
+
+
+@dataclass(frozen=True)
+class AttemptContext:
+    """Everything a single generate_content attempt needs (never mutated)"""
+    model: str
+    key_index: int  # 0-based
+    client: Any
+    model_try: int  # 1-based position in the model list
+    model_count: int
+    key_count: int
+
+
+class KeyScheduler:
+    """
+    Spreads concurrent requests across the configured API keys.
+
+    Keys are ordered per request: keys that are not cooling down come first,
+    least in-flight requests first, ties broken round-robin. Keys that recently
+    failed (e.g. invalid key) are moved to the back instead of being tried first.
+    Safe to use from both the event loop and worker threads.
+    """
+
+    def __init__(self, api_keys: List[str], client_factory: Callable[[str], Any]):
+        self._api_keys = list(api_keys)
+        self._client_factory = client_factory
+        self._clients: Dict[int, Any] = {}
+        self._in_flight = [0] * len(self._api_keys)
+        self._cooldown_until = [0.0] * len(self._api_keys)
+        self._cursor = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def key_count(self) -> int:
+        return len(self._api_keys)
+
+    def client(self, key_index: int) -> Any:
+        """Return the pooled client for a key, creating it on first use."""
+        if key_index < 0 or key_index >= len(self._api_keys):
+            raise IndexError("API key index out of range")
+        with self._lock:
+            client = self._clients.get(key_index)
+            if client is None:
+                client = self._client_factory(self._api_keys[key_index])
+                self._clients[key_index] = client
+            return client
+
+    def key_order(self, prefer: Optional[Callable[[int], bool]] = None) -> List[int]:
+        """
+        Return key indexes in the order this request should try them.
+
+        `prefer` (e.g. "has rate-limit headroom") moves matching healthy keys
+        ahead of the others.
+        """
+        n = len(self._api_keys)
+        now = time.monotonic()
+        with self._lock:
+            start = next(self._cursor) % n
+            rotated = [(start + i) % n for i in range(n)]
+            healthy = [k for k in rotated if self._cooldown_until[k] <= now]
+            cooling = [k for k in rotated if self._cooldown_until[k] > now]
+            # sort() is stable, so equal in-flight counts keep the rotated order
+            healthy.sort(key=lambda k: self._in_flight[k])
+            cooling.sort(key=lambda k: self._cooldown_until[k])
+        if prefer is not None:
+            healthy.sort(key=lambda k: not prefer(k))
+        return healthy + cooling
+
+    def plan(
+        self,
+        model: str,
+        model_try: int,
+        model_count: int,
+        prefer: Optional[Callable[[int], bool]] = None,
+    ) -> List[AttemptContext]:
+        """Build the attempt contexts for one model across all keys."""
+        return [
+            AttemptContext(
+                model=model,
+                key_index=key_index,
+                client=self.client(key_index),
+                model_try=model_try,
+                model_count=model_count,
+                key_count=len(self._api_keys),
+            )
+            for key_index in self.key_order(prefer)
+        ]
+
+    @contextmanager
+    def lease(self, key_index: int) -> Iterator[None]:
+        """Count a request as in flight on a key for the duration of the block."""
+        with self._lock:
+            self._in_flight[key_index] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight[key_index] -= 1
+
+    def cool_down(self, key_index: int, seconds: float) -> None:
+        """Move a key to the back of the order for the given number of seconds."""
+        with self._lock:
+            self._cooldown_until[key_index] = max(
+                self._cooldown_until[key_index],
+                time.monotonic() + seconds,
+            )
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Non-secret per-key state for observability."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "api_key_index": k + 1,
+                    "in_flight": self._in_flight[k],
+                    "cooldown_seconds_remaining": round(max(0.0, self._cooldown_until[k] - now), 1),
+                    "client_pooled": k in self._clients,
+                }
+                for k in range(len(self._api_keys))
+            ]
@@ -12,11 +12,13 @@ from pathlib import Path
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from backend.database import engine, Base
+from backend.database import async_engine, prepare_schema
 from backend.routers import exam, answer, evaluation, ai
+from backend.paper_pool import paper_pool_worker
+from backend.evaluation_jobs import evaluation_worker
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Create database tables (or check migrations, see DB_SCHEMA_MODE)
+prepare_schema()
 
 app = FastAPI(
     title="AI Grader - Indian Board Exam System",
@@ -43,6 +45,20 @@ app.include_router(ai.router, prefix="/api/ai", tags=["AI"])
 frontend_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "frontend")
 app.mount("/", StaticFiles(directory=frontend_path, html=True), name="frontend")
 
+@app.on_event("startup")
+async def start_background_workers():
+    """Start in-process background workers (the paper pool is a no-op unless enabled in settings)"""
+    paper_pool_worker.start()
+    evaluation_worker.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    await paper_pool_worker.stop()
+    await evaluation_worker.stop()
+    await async_engine.dispose()
+
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
@@ -0,0 +1,116 @@
+"""baseline schema
+
+The five tables of the original release (users, exams, questions, answers,
+uploaded_files), as Base.metadata.create_all produced them before migrations were
+introduced. A database created that way already has it: run `alembic stamp 0001`
+once, then `alembic upgrade head`.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 03:40:23.331081
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=200), nullable=False),
+    sa.Column('email', sa.String(length=200), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+
+    op.create_table('exams',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('board', sa.Enum('CBSE', 'ICSE', 'WBBSE', name='boardenum'), nullable=False),
+    sa.Column('class_num', sa.Integer(), nullable=False),
+    sa.Column('subject', sa.String(length=100), nullable=False),
+    sa.Column('chapter_focus', sa.Text(), nullable=True),
+    sa.Column('duration_minutes', sa.Integer(), nullable=False),
+    sa.Column('total_marks', sa.Integer(), nullable=False),
+    sa.Column('status', sa.Enum('CREATED', 'IN_PROGRESS', 'SUBMITTED', 'EVALUATED', name='examstatus'), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('submitted_at', sa.DateTime(), nullable=True),
+    sa.Column('time_remaining_seconds', sa.Integer(), nullable=True),
+    sa.Column('current_question_index', sa.Integer(), nullable=True),
+    sa.Column('paper_json', sa.JSON(), nullable=True),
+    sa.Column('evaluation_report', sa.Text(), nullable=True),
+    sa.Column('evaluated_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_exams_id'), 'exams', ['id'], unique=False)
+
+    op.create_table('questions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('exam_id', sa.Integer(), nullable=False),
+    sa.Column('section', sa.String(length=10), nullable=False),
+    sa.Column('sequence_number', sa.Integer(), nullable=False),
+    sa.Column('question_text', sa.Text(), nullable=False),
+    sa.Column('question_type', sa.Enum('MCQ', 'SHORT_ANSWER', 'LONG_ANSWER', 'CASE_STUDY', 'NUMERICAL', name='questiontype'), nullable=False),
+    sa.Column('marks', sa.Integer(), nullable=False),
+    sa.Column('has_internal_choice', sa.Boolean(), nullable=True),
+    sa.Column('alternative_question_text', sa.Text(), nullable=True),
+    sa.Column('options_json', sa.JSON(), nullable=True),
+    sa.Column('correct_answer', sa.String(length=10), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['exam_id'], ['exams.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_questions_id'), 'questions', ['id'], unique=False)
+
+    op.create_table('answers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('exam_id', sa.Integer(), nullable=False),
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.Column('typed_answer', sa.Text(), nullable=True),
+    sa.Column('selected_choice', sa.String(length=50), nullable=True),
+    sa.Column('selected_option', sa.String(length=10), nullable=True),
+    sa.Column('first_saved_at', sa.DateTime(), nullable=True),
+    sa.Column('last_edited_at', sa.DateTime(), nullable=True),
+    sa.Column('is_locked', sa.Boolean(), nullable=True),
+    sa.ForeignKeyConstraint(['exam_id'], ['exams.id'], ),
+    sa.ForeignKeyConstraint(['question_id'], ['questions.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('question_id')
+    )
+    op.create_index(op.f('ix_answers_id'), 'answers', ['id'], unique=False)
+
+    op.create_table('uploaded_files',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('answer_id', sa.Integer(), nullable=False),
+    sa.Column('filename', sa.String(length=500), nullable=False),
+    sa.Column('file_path', sa.String(length=1000), nullable=False),
+    sa.Column('file_size', sa.Integer(), nullable=False),
+    sa.Column('uploaded_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['answer_id'], ['answers.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_uploaded_files_id'), 'uploaded_files', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ('uploaded_files', 'answers', 'questions', 'exams', 'users'):
+        op.drop_table(table)
+    if op.get_bind().dialect.name == 'postgresql':
+        for enum_name in ('questiontype', 'examstatus', 'boardenum'):
+            sa.Enum(name=enum_name).drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,67 @@
+"""hot query indexes
+
+Foreign-key and composite indexes for the per-exam reads and writes:
+- questions(exam_id, sequence_number): current/next lookup and ordered question lists
+- answers(exam_id): summary counts, the submit lock update, file joins
+- uploaded_files(answer_id): eager loading of an exam's uploads
+- exams(user_id), exams(subject, status): user joins, batch selection by subject
+and exams.total_questions, backfilled from the existing questions.
+
+On PostgreSQL the indexes on the large tables are built CONCURRENTLY so a live
+database keeps accepting writes while they build.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 03:40:41.291011
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (name, table, columns) on tables that grow with every exam
+LARGE_TABLE_INDEXES = (
+    ('ix_questions_exam_sequence', 'questions', ['exam_id', 'sequence_number']),
+    ('ix_answers_exam_id', 'answers', ['exam_id']),
+    ('ix_uploaded_files_answer_id', 'uploaded_files', ['answer_id']),
+)
+
+
+def _create_large_table_indexes(indexes: Sequence[tuple]) -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table, columns in indexes:
+                op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+    else:
+        for name, table, columns in indexes:
+            op.create_index(name, table, columns, unique=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('exams', sa.Column('total_questions', sa.Integer(), nullable=True))
+    op.execute(
+        "UPDATE exams SET total_questions = "
+        "(SELECT count(*) FROM questions WHERE questions.exam_id = exams.id)"
+    )
+    op.create_index(op.f('ix_exams_user_id'), 'exams', ['user_id'], unique=False)
+    op.create_index('ix_exams_subject_status', 'exams', ['subject', 'status'], unique=False)
+    _create_large_table_indexes(LARGE_TABLE_INDEXES)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, _ in reversed(LARGE_TABLE_INDEXES):
+        op.drop_index(name, table_name=table)
+    op.drop_index('ix_exams_subject_status', table_name='exams')
+    op.drop_index(op.f('ix_exams_user_id'), table_name='exams')
+    with op.batch_alter_table('exams', schema=None) as batch_op:
+        batch_op.drop_column('total_questions')
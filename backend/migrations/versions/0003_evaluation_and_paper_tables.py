@@ -0,0 +1,119 @@
+"""evaluation and paper tables
+
+The tables added after the original release: paper_cache (generated papers by input
+hash), pooled_papers (pre-generated papers waiting to be claimed), question_results
+(per-question marks and feedback), evaluation_batches and evaluation_jobs (the
+persistent evaluation queue; at most one queued/running job per exam).
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 09:12:05.418233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('paper_cache',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('cache_key', sa.String(length=64), nullable=False),
+    sa.Column('board', sa.String(length=20), nullable=False),
+    sa.Column('class_num', sa.Integer(), nullable=False),
+    sa.Column('subject', sa.String(length=100), nullable=False),
+    sa.Column('difficulty_level', sa.String(length=50), nullable=False),
+    sa.Column('chapter_focus', sa.Text(), nullable=True),
+    sa.Column('syllabus_hash', sa.String(length=64), nullable=True),
+    sa.Column('paper_json', sa.JSON(), nullable=False),
+    sa.Column('hit_count', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('last_used_at', sa.DateTime(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_paper_cache_cache_key'), 'paper_cache', ['cache_key'], unique=True)
+    op.create_index(op.f('ix_paper_cache_expires_at'), 'paper_cache', ['expires_at'], unique=False)
+    op.create_index(op.f('ix_paper_cache_id'), 'paper_cache', ['id'], unique=False)
+    op.create_index(op.f('ix_paper_cache_last_used_at'), 'paper_cache', ['last_used_at'], unique=False)
+
+    op.create_table('pooled_papers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('board', sa.String(length=20), nullable=False),
+    sa.Column('class_num', sa.Integer(), nullable=False),
+    sa.Column('subject', sa.String(length=100), nullable=False),
+    sa.Column('difficulty_level', sa.String(length=50), nullable=False),
+    sa.Column('paper_json', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('claimed_at', sa.DateTime(), nullable=True),
+    sa.Column('claimed_exam_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['claimed_exam_id'], ['exams.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_pooled_papers_id'), 'pooled_papers', ['id'], unique=False)
+    op.create_index('ix_pooled_papers_target', 'pooled_papers', ['board', 'class_num', 'subject', 'difficulty_level', 'claimed_at'], unique=False)
+
+    op.create_table('question_results',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('exam_id', sa.Integer(), nullable=False),
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.Column('marks_awarded', sa.Float(), nullable=False),
+    sa.Column('max_marks', sa.Integer(), nullable=False),
+    sa.Column('feedback', sa.Text(), nullable=True),
+    sa.Column('selected_choice', sa.String(length=50), nullable=True),
+    sa.Column('graded_by', sa.String(length=20), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['exam_id'], ['exams.id'], ),
+    sa.ForeignKeyConstraint(['question_id'], ['questions.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('question_id')
+    )
+    op.create_index(op.f('ix_question_results_exam_id'), 'question_results', ['exam_id'], unique=False)
+    op.create_index(op.f('ix_question_results_id'), 'question_results', ['id'], unique=False)
+
+    op.create_table('evaluation_batches',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('subject', sa.String(length=100), nullable=True),
+    sa.Column('exam_ids', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_evaluation_batches_id'), 'evaluation_batches', ['id'], unique=False)
+
+    op.create_table('evaluation_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('exam_id', sa.Integer(), nullable=False),
+    sa.Column('batch_id', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('next_run_at', sa.DateTime(), nullable=True),
+    sa.Column('partial_output', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['batch_id'], ['evaluation_batches.id'], ),
+    sa.ForeignKeyConstraint(['exam_id'], ['exams.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_evaluation_jobs_batch_id'), 'evaluation_jobs', ['batch_id'], unique=False)
+    op.create_index('ix_evaluation_jobs_due', 'evaluation_jobs', ['status', 'next_run_at'], unique=False)
+    op.create_index(op.f('ix_evaluation_jobs_exam_id'), 'evaluation_jobs', ['exam_id'], unique=False)
+    op.create_index(op.f('ix_evaluation_jobs_id'), 'evaluation_jobs', ['id'], unique=False)
+    op.create_index('ux_evaluation_jobs_active_exam', 'evaluation_jobs', ['exam_id'], unique=True, sqlite_where=sa.text("status IN ('queued', 'running')"), postgresql_where=sa.text("status IN ('queued', 'running')"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ('evaluation_jobs', 'evaluation_batches', 'question_results', 'pooled_papers', 'paper_cache'):
+        op.drop_table(table)
@@ -0,0 +1,79 @@
+"""exam marks
+
+exams.marks_achieved and exams.percentage, stored when an exam is evaluated. Evaluated
+exams are backfilled from their question_results or, for exams evaluated before those
+existed, from the "Total Marks Achieved: x / y" line the examiner wrote in the report
+(what the summary endpoint used to parse on every request). Exams with neither stay NULL.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 09:40:51.607342
+
+"""
+from typing import Sequence, Union
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+REPORT_MARKS = re.compile(
+    r'(?:Total\s*Marks\s*Achieved|Marks\s*Obtained|Score)\s*:?\s*(\d+(?:\.\d+)?)\s*(?:/|out\s*of)\s*(\d+)',
+    re.IGNORECASE
+)
+
+exams = sa.table(
+    'exams',
+    sa.column('id', sa.Integer),
+    sa.column('status', sa.String),
+    sa.column('total_marks', sa.Integer),
+    sa.column('evaluation_report', sa.Text),
+    sa.column('marks_achieved', sa.Float),
+    sa.column('percentage', sa.Float),
+)
+question_results = sa.table(
+    'question_results',
+    sa.column('exam_id', sa.Integer),
+    sa.column('marks_awarded', sa.Float),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('exams', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('marks_achieved', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('percentage', sa.Float(), nullable=True))
+
+    connection = op.get_bind()
+    awarded = dict(connection.execute(
+        sa.select(question_results.c.exam_id, sa.func.sum(question_results.c.marks_awarded))
+        .group_by(question_results.c.exam_id)
+    ).all())
+    evaluated = connection.execute(
+        sa.select(exams.c.id, exams.c.total_marks, exams.c.evaluation_report).where(exams.c.status == 'EVALUATED')
+    ).all()
+    for exam_id, total_marks, report in evaluated:
+        marks = awarded.get(exam_id)
+        if marks is None and report:
+            match = REPORT_MARKS.search(report)
+            marks = float(match.group(1)) if match else None
+        if marks is None:
+            continue
+        marks = round(marks, 2)
+        percentage = round((marks / total_marks) * 100, 2) if total_marks else 0.0
+        connection.execute(
+            exams.update().where(exams.c.id == exam_id).values(marks_achieved=marks, percentage=percentage)
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('exams', schema=None) as batch_op:
+        batch_op.drop_column('percentage')
+        batch_op.drop_column('marks_achieved')
@@ -0,0 +1,37 @@
+"""evaluation job leases
+
+evaluation_jobs.lease_owner / lease_expires_at: the process running a job renews its
+lease while it runs, and only jobs whose lease expired are re-queued, so a process
+starting next to live workers no longer re-queues their jobs. Jobs already RUNNING
+have no lease and are re-queued by the first worker that starts, as before.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 10:25:13.880154
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('evaluation_jobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('lease_owner', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('evaluation_jobs', schema=None) as batch_op:
+        batch_op.drop_column('lease_expires_at')
+        batch_op.drop_column('lease_owner')
@@ -0,0 +1,264 @@
+"""
+Tolerant single-pass JSON reader for model output
+Finds the JSON object inside fenced or prose-wrapped text and decodes it in one scan,
+keeping LaTeX backslashes, accepting trailing commas and smart-quoted strings, and
+reporting the exact position (in the original text) of anything it cannot read
+"""
+from bisect import bisect_left
+from json.decoder import scanstring
+from json.scanner import make_scanner
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import re
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_COLON = re.compile(r"[ \t\n\r]*:[ \t\n\r]*")
+_SEPARATOR = re.compile(r"[ \t\n\r]*(?:(,)[ \t\n\r]*)?")
+
+# A backslash run ending in something that is not a JSON escape (\alpha, \sqrt, \(, \%),
+# or in a JSON escape the model meant as LaTeX: \b \f \r \t before a letter (\frac,
+# \theta) and \n before one of _LATEX_N_COMMANDS (\neq). Odd runs only; see _literal_backslashes.
+_BACKSLASH_RUN = re.compile(r'(\\(?:\\\\)*)([bfrt][A-Za-z]|n[A-Za-z]+|u(?![0-9a-fA-F]{4})|[^"\\/bfnrtu])')
+
+# \n followed by letters is usually a real newline ("...\nThe"), so only these keep the backslash
+_LATEX_N_COMMANDS = frozenset({
+    "nabla", "natural", "ne", "nearrow", "neg", "neq", "newline", "nexists", "ngeq", "ngtr",
+    "ni", "nleq", "nless", "nmid", "not", "notin", "nparallel", "nsubseteq", "nsupseteq", "nu",
+    "nwarrow",
+})
+
+# Body of a string opened with a smart quote: closed by ” or "
+_SMART_STRING_BODY = re.compile(r'(?:[^"”\\]|\\.)*', re.DOTALL)
+
+# A backslash that is neither escaped nor escaping another one (for repair_text)
+_LONE_BACKSLASH = re.compile(r"(?<!\\)\\(?!\\)(?!u[0-9a-fA-F]{4})")
+
+_LITERALS = ("true", "false", "null")
+
+_DECODER = json.JSONDecoder(strict=False)
+_scan_once = make_scanner(_DECODER)
+
+
+class ModelJSONError(ValueError):
+    """Model output could not be read as JSON; `pos` is the offset in the original text"""
+
+    def __init__(self, msg: str, doc: str, pos: int, truncated: bool = False):
+        self.msg = msg
+        self.doc = doc
+        self.pos = pos
+        self.truncated = truncated
+        self.lineno = doc.count("\n", 0, pos) + 1
+        self.colno = pos - doc.rfind("\n", 0, pos)
+        super().__init__(f"{msg}: line {self.lineno} column {self.colno} (char {pos}) near {self.context()!r}")
+
+    def context(self, width: int = 30) -> str:
+        return self.doc[max(0, self.pos - width):self.pos + width]
+
+
+class ParseStats:
+    """How one document was read and what had to be tolerated"""
+
+    __slots__ = ("decoder", "start", "end", "trailing_commas", "smart_quotes", "latex_escapes", "truncated_at")
+
+    def __init__(self):
+        self.decoder = None
+        self.start = 0
+        self.end = 0
+        self.trailing_commas = 0
+        self.smart_quotes = 0
+        self.latex_escapes = 0
+        self.truncated_at: Optional[int] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def find_start(text: str) -> int:
+    """Offset of the first '{' (after a ``` fence when there is one), else the first '['."""
+    fence = text.find("```")
+    begin = fence + 3 if fence != -1 else 0
+    for opener in "{[":
+        start = text.find(opener, begin)
+        if start == -1 and begin:
+            start = text.find(opener)
+        if start != -1:
+            return start
+    raise ModelJSONError("No JSON object found", text, len(text))
+
+
+def _literal_backslashes(text: str, start: int) -> List[int]:
+    """Offsets of the backslashes that must stay literal characters (LaTeX), in order."""
+    found = []
+    for match in _BACKSLASH_RUN.finditer(text, start):
+        at = match.start()
+        if at and text[at - 1] == "\\":
+            continue  # tail of a longer run, which was matched (or rejected) from its start
+        escape = match.group(2)
+        if escape[0] == "n" and len(escape) > 1 and escape not in _LATEX_N_COMMANDS:
+            continue
+        found.append(match.end(1) - 1)
+    return found
+
+
+class _Reader:
+    """
+    Reads the value at an offset. Every value is first handed to the C scanner; only
+    objects and arrays it rejects are walked here, member by member, so a trailing comma
+    or smart quote in one question does not send the whole paper through Python.
+    """
+
+    def __init__(self, source: str, text: str, inserted: List[int], stats: ParseStats, partial: bool):
+        self.source = source
+        self.text = text
+        self.inserted = inserted
+        self.stats = stats
+        self.partial = partial
+        self.used = False
+
+    def original(self, pos: int) -> int:
+        """Offset in the model's text for an offset in the escaped working text."""
+        return pos - bisect_left(self.inserted, pos)
+
+    def error(self, msg: str, pos: int, truncated: bool = False) -> ModelJSONError:
+        if pos >= len(self.text):
+            msg, truncated = f"{msg}, got end of text", True
+        return ModelJSONError(msg, self.source, self.original(pos), truncated)
+
+    def keep_partial(self, error: ModelJSONError) -> bool:
+        """In partial mode, note where the text ran out; the caller keeps what it has."""
+        if not (self.partial and error.truncated):
+            return False
+        if self.stats.truncated_at is None:
+            self.stats.truncated_at = error.pos
+        return True
+
+    def value(self, pos: int) -> Tuple[Any, int]:
+        text = self.text
+        try:
+            return _scan_once(text, pos)
+        except (StopIteration, json.JSONDecodeError):
+            pass
+        self.used = True
+        char = text[pos] if pos < len(text) else ""
+        if char == "{":
+            return self.object(pos + 1)
+        if char == "[":
+            return self.array(pos + 1)
+        if char == '"' or char == "“":
+            return self.string(pos)
+        tail = text[pos:pos + 5]
+        truncated = len(text) - pos < 5 and any(word.startswith(tail) for word in _LITERALS)
+        raise self.error("Expecting value", pos, truncated=truncated)
+
+    def string(self, start: int) -> Tuple[str, int]:
+        text = self.text
+        if text[start] == '"':
+            try:
+                return scanstring(text, start + 1, False)
+            except json.JSONDecodeError as e:
+                raise self.error(e.msg, e.pos, truncated=e.msg.startswith("Unterminated string"))
+        self.stats.smart_quotes += 1
+        end = _SMART_STRING_BODY.match(text, start + 1).end()
+        if end >= len(text):
+            raise self.error("Unterminated string starting at", start, truncated=True)
+        value, _ = scanstring(text[start + 1:end] + '"', 0, False)
+        return value, end + 1
+
+    def object(self, pos: int) -> Tuple[Dict[str, Any], int]:
+        text = self.text
+        result: Dict[str, Any] = {}
+        pos = _WHITESPACE.match(text, pos).end()
+        if text.startswith("}", pos):
+            return result, pos + 1
+        try:
+            while True:
+                if not (text.startswith('"', pos) or text.startswith("“", pos)):
+                    raise self.error("Expecting property name enclosed in double quotes", pos)
+                key, pos = self.string(pos)
+                colon = _COLON.match(text, pos)
+                if colon is None:
+                    raise self.error("Expecting ':' delimiter", _WHITESPACE.match(text, pos).end())
+                result[key], pos = self.value(colon.end())
+                pos, done = self.separator(pos, "}")
+                if done:
+                    return result, pos
+        except ModelJSONError as e:
+            if self.keep_partial(e):
+                return result, len(text)
+            raise
+
+    def array(self, pos: int) -> Tuple[List[Any], int]:
+        text = self.text
+        result: List[Any] = []
+        pos = _WHITESPACE.match(text, pos).end()
+        if text.startswith("]", pos):
+            return result, pos + 1
+        try:
+            while True:
+                value, pos = self.value(pos)
+                result.append(value)
+                pos, done = self.separator(pos, "]")
+                if done:
+                    return result, pos
+        except ModelJSONError as e:
+            if self.keep_partial(e):
+                return result, len(text)
+            raise
+
+    def separator(self, pos: int, closer: str) -> Tuple[int, bool]:
+        """After a member: (offset after the closer, True) or (offset of the next member, False)."""
+        text = self.text
+        match = _SEPARATOR.match(text, pos)
+        end = match.end()
+        if text.startswith(closer, end):
+            if match.group(1):
+                self.stats.trailing_commas += 1
+            return end + 1, True
+        if not match.group(1):
+            raise self.error("Expecting ',' delimiter", end)
+        return end, False
+
+def loads(text: str, stats: Optional[ParseStats] = None, partial: bool = False) -> Any:
+    """
+    Decode the first JSON object in `text`; anything after it is ignored.
+
+    Backslashes the model meant literally (\\frac, \\theta, \\sqrt) are kept. Well-formed
+    parts go through the C decoder (stats.decoder "json" when that was all of it);
+    containers it rejects are read by the tolerant reader ("tokenizer"). With
+    `partial=True` a truncated document yields the complete members read before the
+    cut (stats.truncated_at says where). Raises ModelJSONError (a ValueError) with the
+    offending offset, line and column in `text`.
+    """
+    stats = stats if stats is not None else ParseStats()
+    stats.start = find_start(text)
+    literal = _literal_backslashes(text, stats.start)
+    stats.latex_escapes = len(literal)
+    working, inserted = text, []
+    if literal:
+        # Escape them in one copy; inserted[] holds where the added backslashes landed
+        pieces, last = [], 0
+        for count, at in enumerate(literal):
+            pieces.append(text[last:at])
+            pieces.append("\\")
+            inserted.append(at + count)
+            last = at
+        pieces.append(text[last:])
+        working = "".join(pieces)
+
+    reader = _Reader(text, working, inserted, stats, partial)
+    result, end = reader.value(stats.start)
+    stats.end = reader.original(end)
+    stats.decoder = "tokenizer" if reader.used else "json"
+    return result
+
+
+def repair_text(text: str) -> str:
+    """
+    The JSON part of `text` with every lone backslash doubled, for handing to json_repair
+    (which would otherwise turn \\frac or \\theta into control characters).
+    """
+    start = text.find("{")
+    if start == -1:
+        start = max(text.find("["), 0)
+    end = text.find("```", start)
+    return _LONE_BACKSLASH.sub(r"\\\\", text[start:end if end != -1 else len(text)])
@@ -2,7 +2,7 @@
 SQLAlchemy Models for AI Grader
 PostgreSQL-ready schema using SQLite
 """
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Float, JSON, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Float, JSON, Index, text, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -52,7 +52,7 @@ class Exam(Base):
     __tablename__ = "exams"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     
     # Exam metadata
     board = Column(SQLEnum(BoardEnum), nullable=False)
@@ -72,12 +72,15 @@ class Exam(Base):
     
     # Current progress tracking (critical for sequential answering)
     current_question_index = Column(Integer, default=0)  # 0-based index
+    total_questions = Column(Integer, nullable=True)  # set at creation; NULL for older exams (counted instead)
     
     # Generated paper metadata
     paper_json = Column(JSON, nullable=True)  # Full generated paper structure
     
     # Evaluation results
-    evaluation_report = Column(Text, nullable=True)  # AI-generated feedback
+    evaluation_report = Column(Text, nullable=True)  # Markdown rendered from question_results
+    marks_achieved = Column(Float, nullable=True)
+    percentage = Column(Float, nullable=True)
     evaluated_at = Column(DateTime, nullable=True)
     
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -87,6 +90,12 @@ class Exam(Base):
     user = relationship("User", back_populates="exams")
     questions = relationship("Question", back_populates="exam", cascade="all, delete-orphan", order_by="Question.sequence_number")
     answers = relationship("Answer", back_populates="exam", cascade="all, delete-orphan")
+    question_results = relationship("QuestionResult", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        # Batch evaluation selects a subject's submitted exams
+        Index("ix_exams_subject_status", "subject", "status"),
+    )
 
 
 class Question(Base):
@@ -116,6 +125,12 @@ class Question(Base):
     # Relationships
     exam = relationship("Exam", back_populates="questions")
     answer = relationship("Answer", back_populates="question", uselist=False, cascade="all, delete-orphan")
+    result = relationship("QuestionResult", back_populates="question", uselist=False, cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        # Navigation fetches one question by (exam, number)
+        Index("ix_questions_exam_sequence", "exam_id", "sequence_number"),
+    )
 
 
 class Answer(Base):
@@ -123,7 +138,7 @@ class Answer(Base):
     __tablename__ = "answers"
     
     id = Column(Integer, primary_key=True, index=True)
-    exam_id = Column(Integer, ForeignKey("exams.id"), nullable=False)
+    exam_id = Column(Integer, ForeignKey("exams.id"), nullable=False, index=True)  # summary counts, submit lock
     question_id = Column(Integer, ForeignKey("questions.id"), nullable=False, unique=True)
     
     # Answer content
@@ -153,7 +168,7 @@ class UploadedFile(Base):
     __tablename__ = "uploaded_files"
     
     id = Column(Integer, primary_key=True, index=True)
-    answer_id = Column(Integer, ForeignKey("answers.id"), nullable=False)
+    answer_id = Column(Integer, ForeignKey("answers.id"), nullable=False, index=True)
     
     # File details
     filename = Column(String(500), nullable=False)
@@ -165,3 +180,115 @@ class UploadedFile(Base):
     
     # Relationships
     answer = relationship("Answer", back_populates="uploaded_files")
+
+
+class QuestionResult(Base):
+    """Per-question marks from an evaluation"""
+    __tablename__ = "question_results"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    exam_id = Column(Integer, ForeignKey("exams.id"), nullable=False, index=True)
+    question_id = Column(Integer, ForeignKey("questions.id"), nullable=False, unique=True)
+    
+    marks_awarded = Column(Float, nullable=False)
+    max_marks = Column(Integer, nullable=False)
+    feedback = Column(Text, nullable=True)  # Markdown, may contain LaTeX
+    selected_choice = Column(String(50), nullable=True)  # "main" or "alternative" for OR questions
+    graded_by = Column(String(20), nullable=False)  # "local" (answer key) or "ai"
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    question = relationship("Question", back_populates="result")
+
+
+class EvaluationBatch(Base):
+    """A group of exams queued for evaluation together (e.g. a whole class)"""
+    __tablename__ = "evaluation_batches"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    subject = Column(String(100), nullable=True)  # set when the batch was selected by subject
+    exam_ids = Column(JSON, nullable=False)  # exams in the batch, in request order
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class EvaluationJob(Base):
+    """Queued/background evaluation of one exam"""
+    __tablename__ = "evaluation_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    exam_id = Column(Integer, ForeignKey("exams.id"), nullable=False, index=True)
+    batch_id = Column(Integer, ForeignKey("evaluation_batches.id"), nullable=True, index=True)  # None = single request
+    
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, succeeded, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    last_error = Column(Text, nullable=True)
+    next_run_at = Column(DateTime, default=datetime.utcnow)  # earliest time a queued job may run
+    partial_output = Column(Text, nullable=True)  # Markdown feedback streamed so far (current attempt)
+    
+    # Lease of the process running the job, renewed while it runs
+    lease_owner = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)  # latest attempt
+    finished_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_evaluation_jobs_due", "status", "next_run_at"),
+        # At most one queued/running job per exam
+        Index(
+            "ux_evaluation_jobs_active_exam", "exam_id", unique=True,
+            sqlite_where=text("status IN ('queued', 'running')"),
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+
+class PaperCacheEntry(Base):
+    """Generated question papers, content-addressed by their generation inputs"""
+    __tablename__ = "paper_cache"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(64), nullable=False, unique=True, index=True)  # SHA-256 of inputs
+    
+    # Generation inputs (for inspection; the key is authoritative)
+    board = Column(String(20), nullable=False)
+    class_num = Column(Integer, nullable=False)
+    subject = Column(String(100), nullable=False)
+    difficulty_level = Column(String(50), nullable=False)
+    chapter_focus = Column(Text, nullable=True)
+    syllabus_hash = Column(String(64), nullable=True)
+    
+    # Parsed, validated paper as returned by GeminiService
+    paper_json = Column(JSON, nullable=False)
+    
+    # Reuse bookkeeping
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
+    expires_at = Column(DateTime, nullable=True, index=True)
+
+
+class PooledPaper(Base):
+    """Pre-generated papers waiting to be handed out (each one is used by a single exam)"""
+    __tablename__ = "pooled_papers"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Pool target (subject / difficulty stored normalized)
+    board = Column(String(20), nullable=False)
+    class_num = Column(Integer, nullable=False)
+    subject = Column(String(100), nullable=False)
+    difficulty_level = Column(String(50), nullable=False)
+    
+    paper_json = Column(JSON, nullable=False)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    claimed_at = Column(DateTime, nullable=True)  # NULL = still available
+    claimed_exam_id = Column(Integer, ForeignKey("exams.id"), nullable=True)
+    
+    __table_args__ = (
+        Index("ix_pooled_papers_target", "board", "class_num", "subject", "difficulty_level", "claimed_at"),
+    )
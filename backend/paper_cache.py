@@ -0,0 +1,154 @@
+"""
+Question paper cache
+Content-addressed store of parsed papers, shared across workers through the database
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import logging
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from backend.config import settings
+from backend.models import PaperCacheEntry
+
+logger = logging.getLogger(__name__)
+
+# Bump when the generation prompt or paper shape changes so old entries stop matching
+PAPER_CACHE_VERSION = 1
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """Collapse whitespace and lowercase (so "Maths " and "maths" match)."""
+    return " ".join((value or "").split()).lower()
+
+
+def syllabus_hash(syllabus_content: Optional[str]) -> Optional[str]:
+    if not syllabus_content:
+        return None
+    return hashlib.sha256(syllabus_content.encode("utf-8")).hexdigest()
+
+
+def paper_cache_key(
+    board: str,
+    class_num: int,
+    subject: str,
+    chapter_focus: Optional[str] = None,
+    difficulty_level: str = "medium",
+    syllabus_content: Optional[str] = None,
+    user_id: Optional[int] = None,
+) -> str:
+    """SHA-256 over the normalized generate_question_paper inputs (and the student, if per-student)."""
+    payload = {
+        "v": PAPER_CACHE_VERSION,
+        "board": board,
+        "class_num": int(class_num),
+        "subject": normalize_text(subject),
+        "chapter_focus": normalize_text(chapter_focus),
+        "difficulty_level": normalize_text(difficulty_level) or "medium",
+        "syllabus": syllabus_hash(syllabus_content),
+    }
+    if user_id is not None:
+        payload["user_id"] = user_id  # shared keys stay as they were
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def cache_enabled() -> bool:
+    return settings.PAPER_CACHE_MODE in ("shared", "per_student")
+
+
+def cache_scope_user(user_id: int) -> Optional[int]:
+    """The user a cache key is scoped to: the student in per_student mode, nobody when shared."""
+    return user_id if settings.PAPER_CACHE_MODE == "per_student" else None
+
+
+def get_cached_paper(db: Session, cache_key: str) -> Optional[Dict[str, Any]]:
+    """
+    Return a cached paper for the key, or None.
+
+    Expired entries and entries that reached PAPER_CACHE_MAX_REUSE are
+    deleted instead of served.
+    """
+    entry = db.query(PaperCacheEntry).filter(PaperCacheEntry.cache_key == cache_key).first()
+    if not entry:
+        return None
+
+    now = datetime.utcnow()
+    max_reuse = settings.PAPER_CACHE_MAX_REUSE
+    if (entry.expires_at and entry.expires_at <= now) or (max_reuse and entry.hit_count >= max_reuse):
+        db.delete(entry)
+        db.commit()
+        return None
+
+    entry.hit_count = (entry.hit_count or 0) + 1
+    entry.last_used_at = now
+    db.commit()
+    return entry.paper_json
+
+
+def store_paper(
+    db: Session,
+    cache_key: str,
+    paper_json: Dict[str, Any],
+    board: str,
+    class_num: int,
+    subject: str,
+    chapter_focus: Optional[str] = None,
+    difficulty_level: str = "medium",
+    syllabus_content: Optional[str] = None,
+) -> None:
+    """Insert or replace the entry for a key, then apply TTL/LRU eviction."""
+    now = datetime.utcnow()
+    ttl = settings.PAPER_CACHE_TTL_SECONDS
+    expires_at = now + timedelta(seconds=ttl) if ttl else None
+
+    entry = db.query(PaperCacheEntry).filter(PaperCacheEntry.cache_key == cache_key).first()
+    if entry is None:
+        entry = PaperCacheEntry(cache_key=cache_key)
+        db.add(entry)
+    entry.board = board
+    entry.class_num = class_num
+    entry.subject = subject
+    entry.difficulty_level = difficulty_level or "medium"
+    entry.chapter_focus = chapter_focus
+    entry.syllabus_hash = syllabus_hash(syllabus_content)
+    entry.paper_json = paper_json
+    entry.hit_count = 0
+    entry.created_at = now
+    entry.last_used_at = now
+    entry.expires_at = expires_at
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another worker stored the same key first; keep theirs
+        db.rollback()
+        return
+
+    evict(db)
+
+
+def evict(db: Session) -> int:
+    """Delete expired entries and the least recently used beyond PAPER_CACHE_MAX_ENTRIES."""
+    now = datetime.utcnow()
+    removed = db.query(PaperCacheEntry).filter(
+        PaperCacheEntry.expires_at.isnot(None),
+        PaperCacheEntry.expires_at <= now
+    ).delete(synchronize_session=False)
+
+    max_entries = settings.PAPER_CACHE_MAX_ENTRIES
+    if max_entries:
+        overflow = db.query(PaperCacheEntry.id).order_by(
+            PaperCacheEntry.last_used_at.desc()
+        ).offset(max_entries).all()
+        if overflow:
+            removed += db.query(PaperCacheEntry).filter(
+                PaperCacheEntry.id.in_([row.id for row in overflow])
+            ).delete(synchronize_session=False)
+
+    db.commit()
+    if removed:
+        logger.info("AI: paper_cache evicted=%s", removed)
+    return removed
@@ -0,0 +1,283 @@
+"""
+Pre-generated question paper pool
+Background worker that keeps K unused papers ready for popular board/class/subject/difficulty combos
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import time
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from backend.config import settings, get_board_pattern
+from backend.database import AsyncSessionLocal
+from backend.gemini_service import gemini_service
+from backend.models import PooledPaper
+from backend.paper_cache import normalize_text
+from backend.rate_limiter import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PoolTarget:
+    """One hot (board, class_num, subject, difficulty) combination"""
+    board: str
+    class_num: int
+    subject: str  # display form, used in the generation prompt
+    difficulty_level: str
+
+    @property
+    def subject_key(self) -> str:
+        return normalize_text(self.subject)
+
+    @property
+    def label(self) -> str:
+        return f"{self.board}:{self.class_num}:{self.subject_key}:{self.difficulty_level}"
+
+
+def parse_pool_targets(entries: List[str]) -> List[PoolTarget]:
+    """Parse "BOARD:CLASS:Subject[:difficulty]" entries, skipping ones the board patterns reject."""
+    targets: List[PoolTarget] = []
+    for entry in entries:
+        parts = [p.strip() for p in entry.split(":")]
+        if len(parts) not in (3, 4):
+            logger.warning("AI: paper_pool ignoring malformed target %r", entry)
+            continue
+        try:
+            board, class_num = parts[0].upper(), int(parts[1])
+            get_board_pattern(board, class_num)
+        except ValueError as e:
+            logger.warning("AI: paper_pool ignoring target %r: %s", entry, e)
+            continue
+        difficulty = parts[3].lower() if len(parts) == 4 and parts[3] else "medium"
+        targets.append(PoolTarget(board, class_num, parts[2], difficulty))
+    return targets
+
+
+def _in_refill_window(hour: int, window: str) -> bool:
+    """True if `hour` falls in an "H-H" window (wraps past midnight); empty = always."""
+    if not window:
+        return True
+    start, end = (int(h) for h in window.split("-"))
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+class PoolMetrics:
+    """In-process pool counters (per worker process)"""
+
+    def __init__(self):
+        self.requests = 0  # create_exam calls eligible for the pool
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.refill_failures = 0
+        self.refill_lag_seconds: List[float] = []  # time from dropping below K to back at K
+        self.below_target_since: Dict[str, float] = {}
+        self.misses_by_target: Dict[str, int] = {}
+
+    def snapshot(self) -> Dict[str, Any]:
+        lags = self.refill_lag_seconds[-100:]
+        return {
+            "requests": self.requests,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / self.requests, 3) if self.requests else None,
+            "refills": self.refills,
+            "refill_failures": self.refill_failures,
+            "refill_lag_avg_seconds": round(sum(lags) / len(lags), 1) if lags else None,
+            "refill_lag_max_seconds": round(max(lags), 1) if lags else None,
+            "targets_below_size": sorted(self.below_target_since),
+        }
+
+
+metrics = PoolMetrics()
+
+
+def pool_enabled() -> bool:
+    return settings.PAPER_POOL_ENABLED
+
+
+def available_count(db: Session, target: PoolTarget) -> int:
+    return db.query(func.count(PooledPaper.id)).filter(
+        PooledPaper.board == target.board,
+        PooledPaper.class_num == target.class_num,
+        PooledPaper.subject == target.subject_key,
+        PooledPaper.difficulty_level == target.difficulty_level,
+        PooledPaper.claimed_at.is_(None)
+    ).scalar() or 0
+
+
+def claim_pooled_paper(
+    db: Session,
+    board: str,
+    class_num: int,
+    subject: str,
+    difficulty_level: str = "medium",
+) -> Optional[Tuple[int, Dict[str, Any]]]:
+    """
+    Atomically claim an unused paper for a combination.
+
+    Returns (pooled_paper_id, paper_json) or None. The claim is a conditional
+    UPDATE, so two workers can never hand out the same paper.
+    """
+    target = PoolTarget(board, class_num, subject, (difficulty_level or "medium").lower())
+    metrics.requests += 1
+
+    for _ in range(3):
+        candidate = db.query(PooledPaper.id).filter(
+            PooledPaper.board == target.board,
+            PooledPaper.class_num == target.class_num,
+            PooledPaper.subject == target.subject_key,
+            PooledPaper.difficulty_level == target.difficulty_level,
+            PooledPaper.claimed_at.is_(None)
+        ).order_by(PooledPaper.created_at).first()
+        if candidate is None:
+            break
+
+        claimed = db.query(PooledPaper).filter(
+            PooledPaper.id == candidate.id,
+            PooledPaper.claimed_at.is_(None)
+        ).update({"claimed_at": datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+        if claimed:
+            paper = db.query(PooledPaper).filter(PooledPaper.id == candidate.id).first()
+            metrics.hits += 1
+            metrics.below_target_since.setdefault(target.label, time.monotonic())
+            return paper.id, paper.paper_json
+
+    metrics.misses += 1
+    metrics.misses_by_target[target.label] = metrics.misses_by_target.get(target.label, 0) + 1
+    return None
+
+
+def attach_exam(db: Session, pooled_paper_id: int, exam_id: int) -> None:
+    """Record which exam consumed a pooled paper (committed with the exam by the caller)."""
+    db.query(PooledPaper).filter(PooledPaper.id == pooled_paper_id).update(
+        {"claimed_exam_id": exam_id}, synchronize_session=False
+    )
+
+
+def release_pooled_paper(db: Session, pooled_paper_id: int) -> None:
+    """Return a claimed paper to the pool after the exam that claimed it failed to save."""
+    db.query(PooledPaper).filter(
+        PooledPaper.id == pooled_paper_id,
+        PooledPaper.claimed_exam_id.is_(None)
+    ).update({"claimed_at": None}, synchronize_session=False)
+    db.commit()
+
+
+class PaperPoolWorker:
+    """
+    Refills the pool in the background.
+
+    Each tick (PAPER_POOL_CHECK_INTERVAL_SECONDS), inside the refill window,
+    it tops up the most-missed targets first, one generation per target per
+    tick. Generations are capped per hour (PAPER_POOL_MAX_GENERATIONS_PER_HOUR)
+    and only started while some key has local rate-limit headroom, so the
+    pool never competes with live requests for quota.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._generation_times: List[float] = []
+
+    def start(self) -> None:
+        if not pool_enabled() or self._task is not None:
+            return
+        targets = parse_pool_targets(settings.PAPER_POOL_TARGETS)
+        if not targets:
+            logger.info("AI: paper_pool enabled but no valid targets configured")
+            return
+        self._task = asyncio.create_task(self._run(targets))
+        logger.info("AI: paper_pool started targets=%s size=%s", len(targets), settings.PAPER_POOL_SIZE)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self, targets: List[PoolTarget]) -> None:
+        while True:
+            try:
+                await self.refill_once(targets)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("AI: paper_pool tick failed")
+            await asyncio.sleep(settings.PAPER_POOL_CHECK_INTERVAL_SECONDS)
+
+    def _budget_left(self) -> int:
+        cutoff = time.monotonic() - 3600
+        self._generation_times = [t for t in self._generation_times if t > cutoff]
+        return settings.PAPER_POOL_MAX_GENERATIONS_PER_HOUR - len(self._generation_times)
+
+    def _has_key_headroom(self) -> bool:
+        est = estimate_tokens("")
+        return any(
+            gemini_service.rate_limiter.has_headroom(key_index, gemini_service.model_name, est)
+            for key_index in range(len(gemini_service.api_keys))
+        )
+
+    async def refill_once(self, targets: List[PoolTarget]) -> int:
+        """Run one refill pass; returns the number of papers generated."""
+        async with AsyncSessionLocal() as db:
+            deficits = []
+            for target in targets:
+                have = await db.run_sync(available_count, target)
+                if have < settings.PAPER_POOL_SIZE:
+                    metrics.below_target_since.setdefault(target.label, time.monotonic())
+                    deficits.append(target)
+                elif target.label in metrics.below_target_since:
+                    metrics.refill_lag_seconds.append(time.monotonic() - metrics.below_target_since.pop(target.label))
+
+        if not deficits or not _in_refill_window(datetime.now().hour, settings.PAPER_POOL_REFILL_HOURS):
+            return 0
+
+        # Hottest (most-missed) targets first
+        deficits.sort(key=lambda t: metrics.misses_by_target.get(t.label, 0), reverse=True)
+
+        generated = 0
+        for target in deficits:
+            if self._budget_left() <= 0 or not self._has_key_headroom():
+                break
+            self._generation_times.append(time.monotonic())
+            try:
+                paper_json = await gemini_service.generate_question_paper_async(
+                    board=target.board,
+                    class_num=target.class_num,
+                    subject=target.subject,
+                    difficulty_level=target.difficulty_level
+                )
+            except Exception as e:
+                metrics.refill_failures += 1
+                logger.warning("AI: paper_pool refill failed target=%s err=%s", target.label, str(e)[:160])
+                continue
+
+            async with AsyncSessionLocal() as db:
+                db.add(PooledPaper(
+                    board=target.board,
+                    class_num=target.class_num,
+                    subject=target.subject_key,
+                    difficulty_level=target.difficulty_level,
+                    paper_json=paper_json
+                ))
+                await db.commit()
+            metrics.refills += 1
+            generated += 1
+            logger.info("AI: paper_pool refilled target=%s", target.label)
+
+        return generated
+
+
+paper_pool_worker = PaperPoolWorker()
@@ -0,0 +1,68 @@
+"""
+Question rows from generated paper JSON
+Shared by exam creation, question regeneration and the replay benchmarks
+"""
+from typing import Any, Dict, List
+import copy
+
+from backend.models import Question, QuestionType
+
+
+def question_type_for(q_data: Dict[str, Any]) -> QuestionType:
+    """Map the model's question_type to the enum, inferring it when the model returned something unexpected."""
+    raw_type = (q_data.get('question_type') or "Short Answer").strip()
+    type_key = raw_type.upper().replace(" ", "_")
+    if type_key not in QuestionType.__members__:
+        # Infer type from content if model returned unexpected type
+        if q_data.get('options') or q_data.get('correct_answer'):
+            type_key = "MCQ"
+        else:
+            marks = int(q_data.get('marks') or 0)
+            type_key = "LONG_ANSWER" if marks >= 5 else "SHORT_ANSWER"
+    return QuestionType[type_key]
+
+
+def question_fields(q_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Question column values for one paper question (everything but exam, section and number)."""
+    return dict(
+        question_text=q_data['question_text'],
+        question_type=question_type_for(q_data),
+        marks=q_data['marks'],
+        has_internal_choice=q_data.get('has_internal_choice', False),
+        alternative_question_text=q_data.get('alternative_question_text'),
+        options_json=q_data.get('options'),
+        correct_answer=q_data.get('correct_answer')
+    )
+
+
+def build_questions(exam_id: int, paper_json: Dict[str, Any]) -> List[Question]:
+    """One Question per paper question, numbered 1..N in paper order (caller adds and commits)."""
+    questions = []
+    question_number = 1
+    for section_data in paper_json['sections']:
+        section = section_data['section']
+        for q_data in section_data['questions']:
+            questions.append(Question(
+                exam_id=exam_id,
+                section=section,
+                sequence_number=question_number,
+                **question_fields(q_data)
+            ))
+            question_number += 1
+    return questions
+
+
+def replace_paper_question(paper_json: Dict[str, Any], sequence_number: int, q_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy of `paper_json` with question `sequence_number` (numbered as in build_questions)
+    replaced by `q_data`. A new dict, so assigning it marks the JSON column as changed.
+    """
+    paper = copy.deepcopy(paper_json)
+    question_number = 1
+    for section_data in paper['sections']:
+        questions = section_data['questions']
+        if sequence_number < question_number + len(questions):
+            questions[sequence_number - question_number] = dict(q_data, question_number=sequence_number)
+            return paper
+        question_number += len(questions)
+    raise ValueError(f"Question {sequence_number} is not in the paper")
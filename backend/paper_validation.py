@@ -0,0 +1,394 @@
+"""
+Generated paper checks against the board pattern
+normalize_paper fixes what needs no model call (marks, types, numbering, extra questions or
+choices, option/answer formatting) and reports what does; GeminiService repairs those
+sections or questions with targeted prompts instead of regenerating the whole paper
+"""
+from typing import Any, Dict, List, Optional
+import re
+
+OPTION_KEYS = ("A", "B", "C", "D")
+
+# Issue codes. Section-level issues are repaired by regenerating the section,
+# question-level ones by regenerating just those questions.
+MISSING_SECTION = "missing_section"
+QUESTION_COUNT = "question_count"
+MISSING_TEXT = "missing_text"
+WRONG_TYPE = "wrong_type"
+MCQ_OPTIONS = "mcq_options"
+MCQ_ANSWER = "mcq_answer"
+CHOICE_ALTERNATIVE = "choice_alternative"
+CHOICE_COUNT = "choice_count"
+
+# A paper with any of these left after repair cannot be turned into Question rows
+FATAL_CODES = frozenset({MISSING_SECTION, QUESTION_COUNT, MISSING_TEXT, WRONG_TYPE})
+
+_SECTION_PREFIX_RE = re.compile(r"^\s*section\s+", re.IGNORECASE)
+_ANSWER_RE = re.compile(r"^\W*(?:option\s*)?([A-D])\b", re.IGNORECASE)
+
+
+class PaperIssue:
+    """
+    One problem that needs the model; `index` is the question's position in its section,
+    `expected` the count a count issue asks for (questions required, choices missing)
+    """
+
+    def __init__(
+        self,
+        section: str,
+        code: str,
+        message: str,
+        index: Optional[int] = None,
+        expected: Optional[int] = None
+    ):
+        self.section = section
+        self.code = code
+        self.message = message
+        self.index = index
+        self.expected = expected
+
+    def __repr__(self) -> str:
+        where = f"Section {self.section}" + (f" Q{self.index + 1}" if self.index is not None else "")
+        return f"{where}: {self.message}"
+
+
+class PaperReport:
+    """Result of normalize_paper: local fixes applied and issues left for the model"""
+
+    def __init__(self):
+        self.fixes: List[str] = []
+        self.issues: List[PaperIssue] = []
+
+    @property
+    def fatal(self) -> List[PaperIssue]:
+        return [issue for issue in self.issues if issue.code in FATAL_CODES]
+
+    def codes(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for issue in self.issues:
+            counts[issue.code] = counts.get(issue.code, 0) + 1
+        return counts
+
+    def summary(self, limit: int = 5) -> str:
+        shown = "; ".join(repr(issue) for issue in self.issues[:limit])
+        more = len(self.issues) - limit
+        return shown + (f" (+{more} more)" if more > 0 else "")
+
+    def raise_if_fatal(self) -> None:
+        fatal = self.fatal
+        if fatal:
+            raise ValueError(
+                "Generated paper does not match the board pattern: "
+                + "; ".join(repr(issue) for issue in fatal[:5])
+            )
+
+
+def choice_allocation(pattern: Dict[str, Any]) -> Dict[str, int]:
+    """Internal choices per section, spread round-robin from the last allowed section."""
+    ic = pattern.get('internal_choice') or {}
+    sections = [sec for sec in ic.get('sections', []) if sec in pattern['sections']]
+    remaining = ic.get('questions_with_choice', 0)
+    allocation = {sec: 0 for sec in sections}
+    while remaining > 0 and sections:
+        progressed = False
+        for sec in reversed(sections):
+            if remaining and allocation[sec] < pattern['sections'][sec]['questions']:
+                allocation[sec] += 1
+                remaining -= 1
+                progressed = True
+        if not progressed:
+            break
+    return allocation
+
+
+def is_mcq_section(details: Dict[str, Any]) -> bool:
+    return details['type'].upper() == "MCQ"
+
+
+def _text(value: Any) -> Optional[str]:
+    return value.strip() if isinstance(value, str) and value.strip() else None
+
+
+def _section_label(value: Any) -> str:
+    return _SECTION_PREFIX_RE.sub("", str(value or "")).strip().upper()
+
+
+def _normalize_options(options: Any) -> Optional[Dict[str, str]]:
+    """{"A": .., "D": ..} from a dict with any key case or a list of four; None if unusable."""
+    if isinstance(options, list) and len(options) == len(OPTION_KEYS):
+        options = dict(zip(OPTION_KEYS, options))
+    if not isinstance(options, dict):
+        return None
+    normalized = {}
+    for key, value in options.items():
+        match = _ANSWER_RE.match(str(key))
+        if match and value is not None:
+            normalized[match.group(1).upper()] = _text(str(value))
+    if any(not normalized.get(key) for key in OPTION_KEYS):
+        return None
+    return {key: normalized[key] for key in OPTION_KEYS}
+
+
+def question_problems(q: Any, details: Dict[str, Any], fixes: Optional[List[str]] = None) -> List[str]:
+    """
+    Normalize one question in place for its section and return the codes of what is still wrong.
+
+    Also used to check targeted replacements before they are merged.
+    """
+    fixes = fixes if fixes is not None else []
+    if not isinstance(q, dict):
+        return [MISSING_TEXT]
+    problems = []
+    mcq = is_mcq_section(details)
+
+    if not _text(q.get("question_text")):
+        problems.append(MISSING_TEXT)
+
+    raw_type = _text(q.get("question_type"))
+    if raw_type is None:
+        q["question_type"] = details['type']
+    elif (raw_type.upper() == "MCQ") != mcq:
+        if mcq and q.get("options"):
+            q["question_type"] = details['type']
+            fixes.append(f"question_type {raw_type!r} -> {details['type']!r}")
+        else:
+            problems.append(WRONG_TYPE)
+
+    if q.get("marks") != details['marks_each']:
+        fixes.append(f"marks {q.get('marks')!r} -> {details['marks_each']}")
+        q["marks"] = details['marks_each']
+
+    choice = bool(q.get("has_internal_choice"))
+    q["has_internal_choice"] = choice
+    if choice and not _text(q.get("alternative_question_text")):
+        problems.append(CHOICE_ALTERNATIVE)
+    if not choice and q.get("alternative_question_text") is not None:
+        q["alternative_question_text"] = None
+
+    if mcq:
+        options = _normalize_options(q.get("options"))
+        if options is None:
+            problems.append(MCQ_OPTIONS)
+        elif options != q.get("options"):
+            q["options"] = options
+            fixes.append("options normalized")
+        answer = q.get("correct_answer")
+        match = _ANSWER_RE.match(answer) if isinstance(answer, str) else None
+        if match is None:
+            problems.append(MCQ_ANSWER)
+        elif match.group(1).upper() != answer:
+            q["correct_answer"] = match.group(1).upper()
+            fixes.append(f"correct_answer {answer!r} -> {q['correct_answer']!r}")
+    return problems
+
+
+def _collect_sections(paper: Dict[str, Any], pattern: Dict[str, Any], report: PaperReport) -> Dict[str, Dict[str, Any]]:
+    """The paper's sections keyed by pattern label (labels like "Section a" or positional ones are mapped)."""
+    expected = list(pattern['sections'])
+    raw = [s for s in paper.get("sections") or [] if isinstance(s, dict)] if isinstance(paper.get("sections"), list) else []
+    found: Dict[str, Dict[str, Any]] = {}
+    unmatched = []
+    for data in raw:
+        label = _section_label(data.get("section"))
+        if label in pattern['sections'] and label not in found:
+            found[label] = data
+        else:
+            unmatched.append(data)
+    # Sections the model labelled differently ("I", "Part 1") take the free labels in order
+    free = [label for label in expected if label not in found]
+    for data, label in zip(unmatched, free):
+        report.fixes.append(f"section {data.get('section')!r} -> {label!r}")
+        found[label] = data
+    for data in unmatched[len(free):]:
+        report.fixes.append(f"dropped extra section {data.get('section')!r}")
+    return found
+
+
+def normalize_paper(paper: Dict[str, Any], pattern: Dict[str, Any]) -> PaperReport:
+    """
+    Bring `paper` in line with `pattern` in place and report what only the model can fix.
+
+    Sections come out in pattern order (missing ones as empty placeholders), questions are
+    renumbered 1..N, marks/types follow the section spec, surplus questions and internal
+    choices are dropped, and MCQ options/answers are normalized.
+    """
+    report = PaperReport()
+    paper["total_marks"] = pattern["total_marks"]
+    paper["duration_minutes"] = pattern["duration_minutes"]
+
+    found = _collect_sections(paper, pattern, report)
+    sections = []
+    for label, details in pattern['sections'].items():
+        data = found.get(label)
+        if data is None:
+            report.issues.append(PaperIssue(label, MISSING_SECTION, "section missing"))
+            data = {"questions": []}
+        data["section"] = label
+        data["title"] = _text(data.get("title")) or f"Section {label}"
+        questions = data.get("questions") if isinstance(data.get("questions"), list) else []
+
+        problems = [question_problems(q, details, report.fixes) for q in questions]
+        required = details['questions']
+        if len(questions) > required:
+            # Keep the usable questions first, in their original order
+            keep = sorted(range(len(questions)), key=lambda i: (bool(problems[i]), i))[:required]
+            keep.sort()
+            report.fixes.append(f"section {label}: dropped {len(questions) - required} extra questions")
+            questions = [questions[i] for i in keep]
+            problems = [problems[i] for i in keep]
+        data["questions"] = questions
+        sections.append(data)
+
+        for index, codes in enumerate(problems):
+            for code in codes:
+                report.issues.append(PaperIssue(label, code, code.replace("_", " "), index))
+        if label in found and len(questions) < required:
+            report.issues.append(PaperIssue(
+                label, QUESTION_COUNT, f"{len(questions)} of {required} questions", expected=required
+            ))
+    paper["sections"] = sections
+
+    _balance_choices(paper, pattern, report)
+
+    number = 1
+    for section in sections:
+        for q in section["questions"]:
+            if isinstance(q, dict):
+                q["question_number"] = number
+            number += 1
+    return report
+
+
+def _balance_choices(paper: Dict[str, Any], pattern: Dict[str, Any], report: PaperReport) -> None:
+    """Drop internal choices outside the allowed sections or beyond the pattern's count; report a shortfall."""
+    allocation = choice_allocation(pattern)
+    expected = sum(allocation.values())
+    counted = 0
+    dropped = set()
+    for section in paper["sections"]:
+        questions = section["questions"]
+        for index in range(len(questions) - 1, -1, -1):
+            q = questions[index]
+            if not (isinstance(q, dict) and q.get("has_internal_choice")):
+                continue
+            if section["section"] in allocation and counted < expected:
+                counted += 1
+                continue
+            q["has_internal_choice"] = False
+            q["alternative_question_text"] = None
+            dropped.add((section["section"], index))
+            report.fixes.append(f"section {section['section']}: dropped surplus internal choice")
+    if dropped:
+        report.issues = [
+            issue for issue in report.issues
+            if not (issue.code == CHOICE_ALTERNATIVE and (issue.section, issue.index) in dropped)
+        ]
+
+    short = expected - counted
+    for label in reversed(list(allocation)):
+        if short <= 0:
+            break
+        section = next(s for s in paper["sections"] if s["section"] == label)
+        have = sum(1 for q in section["questions"] if isinstance(q, dict) and q.get("has_internal_choice"))
+        want = min(allocation[label] - have, short)
+        if want > 0:
+            report.issues.append(PaperIssue(
+                label, CHOICE_COUNT, f"needs {want} more internal choice(s)", expected=want
+            ))
+            short -= want
+
+
+def choices_wanted(paper: Dict[str, Any], pattern: Dict[str, Any], section_label: str) -> int:
+    """Internal choices a regenerated `section_label` should carry, given the other sections."""
+    allocation = choice_allocation(pattern)
+    if section_label not in allocation:
+        return 0
+    elsewhere = sum(
+        1
+        for section in paper.get("sections") or []
+        if section.get("section") != section_label
+        for q in section.get("questions") or []
+        if isinstance(q, dict) and q.get("has_internal_choice")
+    )
+    remaining = sum(allocation.values()) - elsewhere
+    return max(0, min(remaining, pattern['sections'][section_label]['questions']))
+
+
+class RepairSlot:
+    """A question position to (re)generate: index in its section, paper-wide number, whether it needs a choice"""
+
+    def __init__(self, index: int, question_number: int, with_choice: bool):
+        self.index = index
+        self.question_number = question_number
+        self.with_choice = with_choice
+
+    def __repr__(self) -> str:
+        return f"Q{self.question_number}" + ("+choice" if self.with_choice else "")
+
+
+def first_numbers(pattern: Dict[str, Any]) -> Dict[str, int]:
+    """Paper-wide number of each section's first question."""
+    numbers, number = {}, 1
+    for label, details in pattern['sections'].items():
+        numbers[label] = number
+        number += details['questions']
+    return numbers
+
+
+def repair_plan(
+    paper: Dict[str, Any],
+    pattern: Dict[str, Any],
+    report: PaperReport,
+    section_ratio: float
+) -> Dict[str, Optional[List[RepairSlot]]]:
+    """
+    What to regenerate for a normalized paper: section label -> None for the whole section,
+    or the question slots to replace (indices past the end are questions to add).
+
+    A section is regenerated whole when it is missing or at least `section_ratio` of its
+    questions need replacing.
+    """
+    numbers = first_numbers(pattern)
+    sections = {s["section"]: s for s in paper["sections"]}
+    bad: Dict[str, Dict[int, bool]] = {}
+    whole = set()
+    for issue in report.issues:
+        if issue.code == MISSING_SECTION:
+            whole.add(issue.section)
+        elif issue.index is not None:
+            q = sections[issue.section]["questions"][issue.index]
+            with_choice = isinstance(q, dict) and bool(q.get("has_internal_choice"))
+            bad.setdefault(issue.section, {})[issue.index] = with_choice
+
+    for issue in report.issues:
+        label = issue.section
+        if label in whole:
+            continue
+        questions = sections[label]["questions"]
+        slots = bad.setdefault(label, {})
+        if issue.code == QUESTION_COUNT:
+            for index in range(len(questions), issue.expected):
+                slots.setdefault(index, False)
+        elif issue.code == CHOICE_COUNT:
+            want = issue.expected
+            # Give the missing choices to the last questions that have none
+            for index in range(len(questions) - 1, -1, -1):
+                if want == 0:
+                    break
+                q = questions[index]
+                if isinstance(q, dict) and not q.get("has_internal_choice") and not slots.get(index):
+                    slots[index] = True
+                    want -= 1
+
+    plan: Dict[str, Optional[List[RepairSlot]]] = {label: None for label in whole}
+    for label, slots in bad.items():
+        if label in whole or not slots:
+            continue
+        if len(slots) >= section_ratio * pattern['sections'][label]['questions']:
+            plan[label] = None
+        else:
+            plan[label] = [
+                RepairSlot(index, numbers[label] + index, with_choice)
+                for index, with_choice in sorted(slots.items())
+            ]
+    return plan
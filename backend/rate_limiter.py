@@ -0,0 +1,257 @@
+"""
+Local Gemini rate limiter
+Token buckets per (API key, model) for requests/minute, tokens/minute and requests/day
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import threading
+import time
+
+from backend.config import settings
+from backend.upload_cache import upload_cache
+
+logger = logging.getLogger(__name__)
+
+# Gemini documents ~258 tokens per rendered PDF page
+TOKENS_PER_PDF_PAGE = 258
+# Rough chars-per-token ratio for English/LaTeX prompts
+CHARS_PER_TOKEN = 4
+
+try:
+    from zoneinfo import ZoneInfo
+
+    _QUOTA_TZ = ZoneInfo("America/Los_Angeles")  # daily quotas reset at midnight Pacific
+except Exception:  # tzdata missing (e.g. some Windows installs)
+    _QUOTA_TZ = None
+
+
+def _quota_day() -> str:
+    now = datetime.now(_QUOTA_TZ) if _QUOTA_TZ else datetime.utcnow()
+    return now.strftime("%Y-%m-%d")
+
+
+def seconds_until_quota_day_reset() -> float:
+    now = datetime.now(_QUOTA_TZ) if _QUOTA_TZ else datetime.utcnow()
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (tomorrow - now).total_seconds()
+
+
+class TokenBucket:
+    """Classic token bucket; capacity 0 means unlimited"""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+
+    def available(self, now: float) -> float:
+        if self.unlimited:
+            return float("inf")
+        self._refill(now)
+        return self.tokens
+
+    def seconds_until(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens are available (0 if already available)."""
+        if self.unlimited:
+            return 0.0
+        amount = min(amount, self.capacity)
+        missing = amount - self.available(now)
+        if missing <= 0:
+            return 0.0
+        return missing / self.refill_per_second if self.refill_per_second > 0 else float("inf")
+
+    def take(self, amount: float, now: float) -> None:
+        if not self.unlimited:
+            self._refill(now)
+            self.tokens -= amount
+
+    def give(self, amount: float, now: float) -> None:
+        if not self.unlimited:
+            self._refill(now)
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    def drain(self, now: float) -> None:
+        if not self.unlimited:
+            self._refill(now)
+            self.tokens = min(self.tokens, 0.0)
+
+
+class _Budget:
+    """RPM/TPM buckets plus a daily request counter for one (key, model)"""
+
+    def __init__(self, limits: Dict[str, int]):
+        self.limits = limits
+        self.rpm = TokenBucket(limits["rpm"], limits["rpm"] / 60.0)
+        self.tpm = TokenBucket(limits["tpm"], limits["tpm"] / 60.0)
+        self.day = _quota_day()
+        self.requests_today = 0
+        self.day_exhausted = False
+        self.tokens_used = 0
+
+    def _roll_day(self) -> None:
+        today = _quota_day()
+        if today != self.day:
+            self.day = today
+            self.requests_today = 0
+            self.day_exhausted = False
+
+    def wait_seconds(self, est_tokens: int, now: float) -> float:
+        self._roll_day()
+        rpd = self.limits["rpd"]
+        if self.day_exhausted or (rpd > 0 and self.requests_today >= rpd):
+            return seconds_until_quota_day_reset()
+        return max(self.rpm.seconds_until(1, now), self.tpm.seconds_until(est_tokens, now))
+
+
+class RateLimiter:
+    """
+    Tracks local RPM/TPM/RPD budgets per (key_index, model).
+
+    Budgets are debited before a request is sent using an estimate, then
+    reconciled with the response's usage_metadata. A 429 from the API drains
+    the matching minute buckets so the pair is skipped until they refill.
+    """
+
+    def __init__(self):
+        self._budgets: Dict[Tuple[int, str], _Budget] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def limits_for(model: str) -> Dict[str, int]:
+        limits = {
+            "rpm": settings.GEMINI_RPM_LIMIT,
+            "tpm": settings.GEMINI_TPM_LIMIT,
+            "rpd": settings.GEMINI_RPD_LIMIT,
+        }
+        limits.update(settings.GEMINI_MODEL_RATE_LIMITS.get(model, {}))
+        return limits
+
+    def _budget(self, key_index: int, model: str) -> _Budget:
+        budget = self._budgets.get((key_index, model))
+        if budget is None:
+            budget = _Budget(self.limits_for(model))
+            self._budgets[(key_index, model)] = budget
+        return budget
+
+    def wait_seconds(self, key_index: int, model: str, est_tokens: int) -> float:
+        """Seconds until this (key, model) has headroom for the request; 0 = send now."""
+        with self._lock:
+            return self._budget(key_index, model).wait_seconds(est_tokens, time.monotonic())
+
+    def has_headroom(self, key_index: int, model: str, est_tokens: int) -> bool:
+        return self.wait_seconds(key_index, model, est_tokens) <= 0
+
+    def try_acquire(self, key_index: int, model: str, est_tokens: int) -> bool:
+        """Reserve one request and `est_tokens` tokens if the budget allows it."""
+        with self._lock:
+            now = time.monotonic()
+            budget = self._budget(key_index, model)
+            if budget.wait_seconds(est_tokens, now) > 0:
+                return False
+            budget.rpm.take(1, now)
+            budget.tpm.take(est_tokens, now)
+            budget.requests_today += 1
+            return True
+
+    def refund(self, key_index: int, model: str, est_tokens: int) -> None:
+        """Give back a reservation from try_acquire whose request never completed."""
+        with self._lock:
+            now = time.monotonic()
+            budget = self._budget(key_index, model)
+            budget.rpm.give(1, now)
+            budget.tpm.give(est_tokens, now)
+            budget.requests_today = max(0, budget.requests_today - 1)
+
+    def reconcile(self, key_index: int, model: str, est_tokens: int, response: Any) -> None:
+        """Replace the token estimate with the actual usage reported by the API."""
+        actual = usage_tokens(response)
+        if actual is None:
+            return
+        with self._lock:
+            budget = self._budget(key_index, model)
+            budget.tpm.take(actual - est_tokens, time.monotonic())
+            budget.tokens_used += actual
+
+    def record_quota_error(self, key_index: int, model: str, message: str = "") -> None:
+        """Drain local buckets after the API reported RESOURCE_EXHAUSTED."""
+        with self._lock:
+            now = time.monotonic()
+            budget = self._budget(key_index, model)
+            if is_daily_quota_error(message):
+                budget.day_exhausted = True
+            budget.rpm.drain(now)
+            budget.tpm.drain(now)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Non-secret bucket state for /api/ai/info."""
+        with self._lock:
+            now = time.monotonic()
+            rows = []
+            for (key_index, model), budget in sorted(self._budgets.items()):
+                budget._roll_day()
+                rows.append({
+                    "api_key_index": key_index + 1,
+                    "model": model,
+                    "limits": budget.limits,
+                    "rpm_available": None if budget.rpm.unlimited else round(budget.rpm.available(now), 2),
+                    "tpm_available": None if budget.tpm.unlimited else int(budget.tpm.available(now)),
+                    "requests_today": budget.requests_today,
+                    "day_exhausted": budget.day_exhausted,
+                    "tokens_used": budget.tokens_used,
+                })
+            return rows
+
+
+def is_daily_quota_error(message: str) -> bool:
+    """True if a RESOURCE_EXHAUSTED message refers to a per-day quota."""
+    return "PerDay" in message or "per_day" in message.lower()
+
+
+def usage_tokens(response: Any) -> Optional[int]:
+    """Total tokens from a response's usage_metadata, if present."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return None
+    total = getattr(usage, "total_token_count", None)
+    if total:
+        return int(total)
+    prompt = getattr(usage, "prompt_token_count", None) or 0
+    output = getattr(usage, "candidates_token_count", None) or 0
+    return int(prompt + output) or None
+
+
+def estimate_tokens(contents: Any, pdf_attachments: Optional[List[Dict[str, Any]]] = None) -> int:
+    """
+    Estimate prompt + output tokens for a request.
+
+    Text is counted at ~4 chars/token, PDFs at ~258 tokens/page, plus the
+    configured expected output size.
+    """
+    items = contents if isinstance(contents, list) else [contents]
+    chars = sum(len(item) for item in items if isinstance(item, str))
+    tokens = chars // CHARS_PER_TOKEN
+
+    for item in pdf_attachments or []:
+        tokens += _pdf_pages(item.get("file_path")) * TOKENS_PER_PDF_PAGE
+
+    return tokens + settings.GEMINI_EXPECTED_OUTPUT_TOKENS
+
+
+def _pdf_pages(file_path: Optional[str]) -> int:
+    if not file_path:
+        return 0
+    try:
+        return upload_cache.page_count(file_path)
+    except OSError:
+        return 1
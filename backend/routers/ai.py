@@ -4,6 +4,8 @@ from fastapi import APIRouter
 
 from backend.config import settings
 from backend.gemini_service import gemini_service
+from backend.paper_pool import metrics as paper_pool_metrics, pool_enabled
+from backend.upload_cache import upload_cache
 
 router = APIRouter()
 
@@ -15,10 +17,20 @@ async def get_ai_info():
     if gemini_service.last_key_index_used is not None:
         last_key_1_based = gemini_service.last_key_index_used + 1
 
-    return {
+    info = {
+        "backend": settings.GEMINI_BACKEND,
         "configured_model": settings.GEMINI_MODEL,
         "fallback_models": gemini_service.fallback_models,
         "api_keys_configured": len(gemini_service.api_keys),
         "last_model_used": gemini_service.last_model_used,
         "last_api_key_index": last_key_1_based,
+        "api_keys": gemini_service.scheduler.snapshot(),
+        "rate_limits": gemini_service.rate_limiter.snapshot(),
+        "circuit_breakers": gemini_service.breakers.snapshot(),
+        "paper_pool": {"enabled": pool_enabled(), **paper_pool_metrics.snapshot()},
+        "file_uploads": upload_cache.snapshot(),
     }
+    if settings.GEMINI_BACKEND == "fake":
+        from backend.fake_gemini import stats as fake_stats
+        info["fake_backend"] = fake_stats.snapshot()
+    return info
@@ -2,13 +2,17 @@
 Answer Router - Handles answer submission and PDF uploads
 """
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import Optional
 import os
 import uuid
 from datetime import datetime
 
-from backend.database import get_db
+from backend.database import get_async_db
+from backend.exam_snapshot import load_question_view
 from backend.models import Answer, Question, Exam, UploadedFile, ExamStatus
 from backend.schemas import AnswerSaveRequest, AnswerResponse, FileUploadResponse
 from backend.config import settings
@@ -17,25 +21,22 @@ router = APIRouter()
 
 
 @router.get("/get/{exam_id}/{question_id}", response_model=Optional[AnswerResponse])
-async def get_answer(exam_id: int, question_id: int, db: Session = Depends(get_db)):
+async def get_answer(exam_id: int, question_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Get an existing answer for a question (returns null if no answer exists)
     """
     # Verify exam exists
-    exam = db.query(Exam).filter(Exam.id == exam_id).first()
+    exam = await db.get(Exam, exam_id)
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
     
-    # Verify question exists and belongs to exam
-    question = db.query(Question).filter(
-        Question.id == question_id,
-        Question.exam_id == exam_id
-    ).first()
+    # Verify question exists and belongs to exam (loaded with its answer and uploads)
+    question = await load_question_view(db, exam_id, question_id)
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
     
     # Get answer (return None if not exists - this is not an error)
-    answer = db.query(Answer).filter(Answer.question_id == question_id).first()
+    answer = question.answer
     if not answer:
         return None
     
@@ -45,42 +46,53 @@ async def get_answer(exam_id: int, question_id: int, db: Session = Depends(get_d
         typed_answer=answer.typed_answer,
         selected_option=answer.selected_option,
         selected_choice=answer.selected_choice,
-        has_uploaded_files=len(answer.uploaded_files) > 0
+        has_uploaded_files=answer.has_uploaded_files
     )
 
 
+async def _find_answer(db: AsyncSession, question_id: int) -> Optional[Answer]:
+    return await db.scalar(
+        select(Answer).options(selectinload(Answer.uploaded_files)).where(Answer.question_id == question_id)
+    )
+
+
+def _apply_edit(answer: Answer, request: AnswerSaveRequest) -> None:
+    if request.typed_answer is not None:
+        # CRITICAL: Store raw LaTeX with all backslashes preserved
+        answer.typed_answer = request.typed_answer
+    if request.selected_choice is not None:
+        answer.selected_choice = request.selected_choice
+    if request.selected_option is not None:
+        answer.selected_option = request.selected_option
+    answer.last_edited_at = datetime.utcnow()
+
+
 @router.post("/save", response_model=AnswerResponse)
-async def save_answer(request: AnswerSaveRequest, db: Session = Depends(get_db)):
+async def save_answer(request: AnswerSaveRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Save or update an answer for a question
     
     CRITICAL: Preserves LaTeX - NEVER strips backslashes
     """
     # Validate exam and question
-    exam = db.query(Exam).filter(Exam.id == request.exam_id).first()
+    exam = await db.get(Exam, request.exam_id)
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
     
     if exam.status == ExamStatus.SUBMITTED:
         raise HTTPException(status_code=400, detail="Cannot edit answers - exam is submitted")
     
-    question = db.query(Question).filter(Question.id == request.question_id).first()
+    question = await db.get(Question, request.question_id)
     if not question or question.exam_id != request.exam_id:
         raise HTTPException(status_code=404, detail="Question not found or doesn't belong to this exam")
     
     # Get or create answer (no sequential enforcement - can answer any question)
-    answer = db.query(Answer).filter(Answer.question_id == request.question_id).first()
+    answer = await _find_answer(db, request.question_id)
+    has_uploaded_files = answer is not None and len(answer.uploaded_files) > 0
     
     if answer:
         # Update existing answer
-        if request.typed_answer is not None:
-            # CRITICAL: Store raw LaTeX with all backslashes preserved
-            answer.typed_answer = request.typed_answer
-        if request.selected_choice is not None:
-            answer.selected_choice = request.selected_choice
-        if request.selected_option is not None:
-            answer.selected_option = request.selected_option
-        answer.last_edited_at = datetime.utcnow()
+        _apply_edit(answer, request)
     else:
         # Create new answer
         answer = Answer(
@@ -92,8 +104,19 @@ async def save_answer(request: AnswerSaveRequest, db: Session = Depends(get_db))
         )
         db.add(answer)
     
-    db.commit()
-    db.refresh(answer)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # A concurrent first save of this question won the insert: edit its row instead
+        await db.rollback()
+        answer = await _find_answer(db, request.question_id)
+        if answer is None:
+            raise
+        has_uploaded_files = len(answer.uploaded_files) > 0
+        _apply_edit(answer, request)
+        await db.commit()
+    
+    await db.refresh(answer, ["id", "first_saved_at", "last_edited_at"])  # not the uploaded files again
     
     return AnswerResponse(
         id=answer.id,
@@ -103,7 +126,7 @@ async def save_answer(request: AnswerSaveRequest, db: Session = Depends(get_db))
         selected_option=answer.selected_option,
         first_saved_at=answer.first_saved_at,
         last_edited_at=answer.last_edited_at,
-        has_uploaded_files=len(answer.uploaded_files) > 0
+        has_uploaded_files=has_uploaded_files
     )
 
 
@@ -112,7 +135,7 @@ async def upload_pdf(
     exam_id: int,
     question_id: int,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload a PDF answer sheet for a specific question
@@ -123,7 +146,7 @@ async def upload_pdf(
     - Links to answer record
     """
     # Validate exam
-    exam = db.query(Exam).filter(Exam.id == exam_id).first()
+    exam = await db.get(Exam, exam_id)
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
     
@@ -131,7 +154,7 @@ async def upload_pdf(
         raise HTTPException(status_code=400, detail="Cannot upload - exam is submitted")
     
     # Validate question
-    question = db.query(Question).filter(Question.id == question_id, Question.exam_id == exam_id).first()
+    question = await db.scalar(select(Question).where(Question.id == question_id, Question.exam_id == exam_id))
     if not question:
         raise HTTPException(status_code=404, detail="Question not found")
     
@@ -151,15 +174,15 @@ async def upload_pdf(
         )
     
     # Get or create answer record
-    answer = db.query(Answer).filter(Answer.question_id == question_id).first()
+    answer = await db.scalar(select(Answer).where(Answer.question_id == question_id))
     if not answer:
         answer = Answer(
             exam_id=exam_id,
             question_id=question_id
         )
         db.add(answer)
-        db.commit()
-        db.refresh(answer)
+        await db.commit()
+        await db.refresh(answer)
     
     # Create upload directory if it doesn't exist
     upload_dir = os.path.join(settings.UPLOAD_DIR, f"exam_{exam_id}")
@@ -181,8 +204,8 @@ async def upload_pdf(
         file_size=file_size
     )
     db.add(uploaded_file)
-    db.commit()
-    db.refresh(uploaded_file)
+    await db.commit()
+    await db.refresh(uploaded_file)
     
     return FileUploadResponse(
         id=uploaded_file.id,
@@ -193,9 +216,11 @@ async def upload_pdf(
 
 
 @router.get("/{answer_id}/files")
-async def get_uploaded_files(answer_id: int, db: Session = Depends(get_db)):
+async def get_uploaded_files(answer_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get all uploaded files for an answer"""
-    answer = db.query(Answer).filter(Answer.id == answer_id).first()
+    answer = await db.scalar(
+        select(Answer).options(selectinload(Answer.uploaded_files)).where(Answer.id == answer_id)
+    )
     if not answer:
         raise HTTPException(status_code=404, detail="Answer not found")
     
@@ -217,7 +242,7 @@ async def final_pdf_upload(
     exam_id: int,
     file: UploadFile = File(...),
     question_number: int = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload PDF after exam submission (final upload phase)
@@ -225,25 +250,29 @@ async def final_pdf_upload(
     If question_number is 0, uploads as a general answer sheet (attached to first question)
     Otherwise, uploads to the specific question number
     """
-    exam = db.query(Exam).filter(Exam.id == exam_id).first()
+    exam = await db.get(Exam, exam_id)
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
     
     # Handle question_number=0 (full answer sheet upload)
     if question_number == 0:
         # Attach to first question as a general answer sheet
-        question = db.query(Question).filter(
-            Question.exam_id == exam_id
-        ).order_by(Question.sequence_number).first()
+        question = await db.scalar(
+            select(Question).where(
+                Question.exam_id == exam_id
+            ).order_by(Question.sequence_number).limit(1)
+        )
         
         if not question:
             raise HTTPException(status_code=404, detail="No questions found for this exam")
     else:
         # Find question by sequence number
-        question = db.query(Question).filter(
-            Question.exam_id == exam_id,
-            Question.sequence_number == question_number
-        ).first()
+        question = await db.scalar(
+            select(Question).where(
+                Question.exam_id == exam_id,
+                Question.sequence_number == question_number
+            )
+        )
         
         if not question:
             raise HTTPException(status_code=404, detail=f"Question {question_number} not found")
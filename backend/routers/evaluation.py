@@ -1,36 +1,58 @@
 """
 Evaluation Router - Handles AI-based exam evaluation
 """
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from datetime import datetime
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, List, Optional
+import asyncio
+import json
 import logging
 
-from backend.database import get_db
-from backend.models import Exam, Question, Answer, UploadedFile, ExamStatus
-from backend.schemas import EvaluationRequest, EvaluationResponse
-from backend.gemini_service import gemini_service
+from backend.config import settings
+from backend.database import AsyncSessionLocal, get_async_db
+from backend.models import Exam, Question, Answer, UploadedFile, ExamStatus, QuestionResult, EvaluationJob, EvaluationBatch
+from backend.schemas import (
+    EvaluationRequest, EvaluationResponse, EvaluationJobResponse, QuestionResultResponse,
+    BatchEvaluationRequest, BatchEvaluationResponse
+)
+from backend import evaluation_jobs
+from backend import evaluation_runner
+from backend.exam_snapshot import load_exam_snapshot, question_count
 
 router = APIRouter()
 
 logger = logging.getLogger(__name__)
 
 
-@router.post("/evaluate", response_model=EvaluationResponse)
-async def evaluate_exam(request: EvaluationRequest, db: Session = Depends(get_db)):
+def _job_response(job: EvaluationJob) -> EvaluationJobResponse:
+    return EvaluationJobResponse(
+        job_id=job.id,
+        exam_id=job.exam_id,
+        status=job.status,
+        attempts=job.attempts,
+        max_attempts=job.max_attempts,
+        last_error=job.last_error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        next_run_at=job.next_run_at if job.status == evaluation_jobs.QUEUED else None
+    )
+
+
+@router.post("/evaluate", response_model=EvaluationJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def evaluate_exam(request: EvaluationRequest, db: AsyncSession = Depends(get_async_db)):
     """
-    Evaluate an exam using Gemini AI as an examiner
+    Queue AI evaluation of an exam
     
     Steps:
-    1. Validate exam is submitted
-    2. Gather all questions and answers
-    3. Format data for Gemini
-    4. Send to Gemini for evaluation
-    5. Store evaluation report
-    6. Return results
+    1. Validate exam (auto-submitting it if still open)
+    2. Queue an evaluation job (or return the one already queued/running)
+    3. Background workers grade MCQs locally, evaluate the rest with Gemini
+       and store the report; poll GET /jobs/{job_id} for progress
     """
-    exam = db.query(Exam).filter(Exam.id == request.exam_id).first()
+    exam = await db.get(Exam, request.exam_id)
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
 
@@ -43,143 +65,194 @@ async def evaluate_exam(request: EvaluationRequest, db: Session = Depends(get_db
         exam.subject,
     )
     
-    # If already evaluated, return stored report (idempotent)
+    # If already evaluated, report the finished job (idempotent)
     if exam.status == ExamStatus.EVALUATED and exam.evaluation_report:
-        return EvaluationResponse(
+        job = await db.run_sync(evaluation_jobs.latest_job, exam.id)
+        if job and job.status == evaluation_jobs.SUCCEEDED:
+            return _job_response(job)
+        return EvaluationJobResponse(
+            job_id=None,
             exam_id=exam.id,
-            evaluation_report=exam.evaluation_report,
-            evaluated_at=exam.evaluated_at
+            status=evaluation_jobs.SUCCEEDED,
+            finished_at=exam.evaluated_at
         )
 
     # Auto-submit if not yet submitted
-    if exam.status in (ExamStatus.IN_PROGRESS, ExamStatus.CREATED):
-        exam.status = ExamStatus.SUBMITTED
-        exam.submitted_at = datetime.utcnow()
-        db.query(Answer).filter(Answer.exam_id == request.exam_id).update({"is_locked": True})
-        db.commit()
-        db.refresh(exam)
+    await db.run_sync(evaluation_runner.submit_if_needed, exam)
     
     if exam.status != ExamStatus.SUBMITTED:
         raise HTTPException(status_code=400, detail="Exam must be submitted before evaluation")
     
-    # Gather all questions with answers
-    questions = db.query(Question).filter(
-        Question.exam_id == request.exam_id
-    ).order_by(Question.sequence_number).all()
-    
-    questions_with_answers = []
-    pdf_attachments = []
-    for question in questions:
-        answer = db.query(Answer).filter(Answer.question_id == question.id).first()
-        
-        answer_data = None
-        if answer:
-            uploaded_files = db.query(UploadedFile).filter(
-                UploadedFile.answer_id == answer.id
-            ).all()
-            uploaded_files_count = len(uploaded_files)
-            
-            answer_data = {
-                "typed_answer": answer.typed_answer,
-                "selected_option": answer.selected_option,
-                "selected_choice": answer.selected_choice,
-                "uploaded_files_count": uploaded_files_count,
-                "uploaded_files": [
-                    {
-                        "filename": f.filename,
-                        "file_path": f.file_path
-                    }
-                    for f in uploaded_files
-                ]
-            }
-
-            for f in uploaded_files:
-                pdf_attachments.append({
-                    "question_number": question.sequence_number,
-                    "filename": f.filename,
-                    "file_path": f.file_path
-                })
-        
-        questions_with_answers.append({
-            "question": {
-                "sequence_number": question.sequence_number,
-                "section": question.section,
-                "question_text": question.question_text,
-                "question_type": question.question_type.value,
-                "marks": question.marks,
-                "correct_answer": question.correct_answer  # For MCQs
-            },
-            "answer": answer_data
-        })
+    job = await db.run_sync(evaluation_jobs.enqueue_evaluation, exam.id)
+    return _job_response(job)
+
+
+@router.get("/jobs/{job_id}", response_model=EvaluationJobResponse)
+async def get_evaluation_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Get the status of an evaluation job
+    """
+    job = await db.get(EvaluationJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Evaluation job not found")
     
-    # Generate evaluation report using Gemini with a simple retry on internal errors
-    from backend.models import User
-    user = db.query(User).filter(User.id == exam.user_id).first()
+    return _job_response(job)
 
-    student_info = {
-        "name": user.name if user else "Unknown",
-        "email": user.email if user else "Unknown"
-    }
 
-    last_error: Exception | None = None
-    max_attempts = 2
-    for attempt in range(1, max_attempts + 1):
-        try:
-            evaluation_report = gemini_service.evaluate_exam(
-                board=exam.board.value,
-                class_num=exam.class_num,
-                subject=exam.subject,
-                student_info=student_info,
-                questions_with_answers=questions_with_answers,
-                paper_json=exam.paper_json,
-                pdf_attachments=pdf_attachments
-            )
-
-            logger.info(
-                "AI: evaluation completed exam_id=%s model=%s api_key=%s/%s attempt=%s",
-                request.exam_id,
-                gemini_service.last_model_used,
-                (gemini_service.last_key_index_used + 1) if gemini_service.last_key_index_used is not None else None,
-                len(gemini_service.api_keys),
-                attempt,
-            )
-
-            # Store evaluation in database
-            exam.evaluation_report = evaluation_report
-            exam.evaluated_at = datetime.utcnow()
-            exam.status = ExamStatus.EVALUATED
-            db.commit()
-            db.refresh(exam)
-
-            return EvaluationResponse(
-                exam_id=exam.id,
-                evaluation_report=exam.evaluation_report,
-                evaluated_at=exam.evaluated_at
-            )
-        except Exception as e:
-            last_error = e
-            logger.exception(
-                "AI: evaluation attempt failed exam_id=%s attempt=%s/%s err=%s",
-                request.exam_id,
-                attempt,
-                max_attempts,
-                str(e),
-            )
-            if attempt < max_attempts:
+@router.post("/batch", response_model=BatchEvaluationResponse, status_code=status.HTTP_202_ACCEPTED)
+async def evaluate_batch(request: BatchEvaluationRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Queue AI evaluation of many exams (e.g. a whole class)
+    
+    Pass `exam_ids` (open exams are auto-submitted, like /evaluate), or
+    `subject` (optionally with `board`/`class_num`) to take every SUBMITTED
+    exam of that subject. Each exam runs as its own job under the shared
+    worker cap, so a failed exam never fails the batch. Poll
+    GET /batch/{batch_id} for progress.
+    """
+    if bool(request.exam_ids) == bool(request.subject):
+        raise HTTPException(status_code=400, detail="Provide either exam_ids or subject")
+
+    skipped = []
+    if request.exam_ids:
+        requested = list(dict.fromkeys(request.exam_ids))
+        exams = {e.id: e for e in await db.scalars(select(Exam).where(Exam.id.in_(requested)))}
+        exam_ids = []
+        for exam_id in requested:
+            exam = exams.get(exam_id)
+            if exam is None:
+                skipped.append({"exam_id": exam_id, "reason": "Exam not found"})
                 continue
+            await db.run_sync(evaluation_runner.submit_if_needed, exam)
+            if exam.status not in (ExamStatus.SUBMITTED, ExamStatus.EVALUATED):
+                skipped.append({"exam_id": exam_id, "reason": "Exam must be submitted before evaluation"})
+                continue
+            exam_ids.append(exam_id)
+    else:
+        query = select(Exam.id).where(
+            Exam.subject == request.subject,
+            Exam.status == ExamStatus.SUBMITTED
+        )
+        if request.board:
+            query = query.where(Exam.board == request.board)
+        if request.class_num:
+            query = query.where(Exam.class_num == request.class_num)
+        exam_ids = list(await db.scalars(query.order_by(Exam.id)))
+
+    if not exam_ids:
+        raise HTTPException(status_code=400, detail="No exams to evaluate")
+    if len(exam_ids) > settings.EVALUATION_BATCH_MAX_EXAMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.EVALUATION_BATCH_MAX_EXAMS} exams per batch"
+        )
+
+    batch = await db.run_sync(evaluation_jobs.enqueue_batch, exam_ids, subject=request.subject)
+    return BatchEvaluationResponse(**await db.run_sync(evaluation_jobs.batch_progress, batch), skipped=skipped)
+
+
+@router.get("/batch/{batch_id}", response_model=BatchEvaluationResponse)
+async def get_evaluation_batch(batch_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Get aggregate and per-exam progress of an evaluation batch
+    """
+    batch = await db.get(EvaluationBatch, batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Evaluation batch not found")
+    
+    return BatchEvaluationResponse(**await db.run_sync(evaluation_jobs.batch_progress, batch))
+
+
+def _sse(event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
 
-    raise HTTPException(
-        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-        detail=f"Evaluation failed after {max_attempts} attempts: {str(last_error)}"
+
+@router.get("/{exam_id}/stream")
+async def stream_evaluation(
+    exam_id: int,
+    request: Request,
+    offset: int = 0,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Evaluate an exam and stream the examiner's feedback as Server-Sent Events
+    
+    Events:
+    - job: the evaluation job (queued or already running for this exam)
+    - delta: {"offset", "text"} Markdown feedback of the questions evaluated since
+      the last delta (as in the final report); the event id is the offset after it
+    - reset: a retry restarted the output from the beginning
+    - done: {"evaluation_report", "marks_achieved", "percentage"} after results are stored
+    - error: the job failed
+    
+    Reconnect with ?offset=N (or the Last-Event-ID header) to resume without
+    receiving earlier text again. Output is saved on the job as it arrives, so
+    a dropped connection does not interrupt the evaluation.
+    """
+    exam = await db.get(Exam, exam_id)
+    if not exam:
+        raise HTTPException(status_code=404, detail="Exam not found")
+
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        offset = int(last_event_id)
+
+    job = None
+    if not (exam.status == ExamStatus.EVALUATED and exam.evaluation_report):
+        await db.run_sync(evaluation_runner.submit_if_needed, exam)
+        if exam.status != ExamStatus.SUBMITTED:
+            raise HTTPException(status_code=400, detail="Exam must be submitted before evaluation")
+        job = await db.run_sync(evaluation_jobs.enqueue_evaluation, exam.id)
+    job_id = job.id if job else None
+
+    async def events():
+        position = max(0, offset)
+        if job is not None:
+            yield _sse("job", _job_response(job).model_dump())
+
+        while True:
+            async with AsyncSessionLocal() as poll_db:
+                current = await poll_db.get(EvaluationJob, job_id) if job_id else None
+                text = (current.partial_output or "") if current else ""
+                if current is not None and len(text) < position:
+                    position = 0
+                    yield _sse("reset", {"offset": 0}, event_id=0)
+                if len(text) > position:
+                    yield _sse("delta", {"offset": position, "text": text[position:]}, event_id=len(text))
+                    position = len(text)
+
+                if current is None or current.status == evaluation_jobs.SUCCEEDED:
+                    evaluated = await poll_db.get(Exam, exam_id)
+                    yield _sse("done", {
+                        "exam_id": exam_id,
+                        "evaluation_report": evaluated.evaluation_report,
+                        "marks_achieved": evaluated.marks_achieved,
+                        "percentage": evaluated.percentage,
+                        "evaluated_at": evaluated.evaluated_at,
+                    })
+                    return
+                if current.status == evaluation_jobs.FAILED:
+                    yield _sse("error", {"detail": current.last_error or "Evaluation failed"})
+                    return
+
+            if await request.is_disconnected():
+                return
+            await asyncio.sleep(settings.EVALUATION_STREAM_POLL_SECONDS)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 
 @router.get("/{exam_id}/report")
-async def get_evaluation_report(exam_id: int, db: Session = Depends(get_db)):
+async def get_evaluation_report(exam_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Get the evaluation report for an exam
     """
-    exam = db.query(Exam).filter(Exam.id == exam_id).first()
+    exam = await db.get(Exam, exam_id)
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
     
@@ -193,29 +266,62 @@ async def get_evaluation_report(exam_id: int, db: Session = Depends(get_db)):
     )
 
 
+@router.get("/{exam_id}/results", response_model=List[QuestionResultResponse])
+async def get_question_results(exam_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Get per-question marks and feedback for an evaluated exam
+    """
+    exam = await db.get(Exam, exam_id)
+    if not exam:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    
+    if exam.status != ExamStatus.EVALUATED:
+        raise HTTPException(status_code=400, detail="Exam has not been evaluated yet")
+    
+    rows = (await db.execute(select(QuestionResult, Question).join(
+        Question, QuestionResult.question_id == Question.id
+    ).where(
+        QuestionResult.exam_id == exam_id
+    ).order_by(Question.sequence_number))).all()
+    
+    return [
+        QuestionResultResponse(
+            question_id=question.id,
+            sequence_number=question.sequence_number,
+            section=question.section,
+            marks_awarded=result.marks_awarded,
+            max_marks=result.max_marks,
+            feedback=result.feedback,
+            selected_choice=result.selected_choice,
+            graded_by=result.graded_by
+        )
+        for result, question in rows
+    ]
+
+
 @router.get("/{exam_id}/summary")
-async def get_exam_summary(exam_id: int, db: Session = Depends(get_db)):
+async def get_exam_summary(exam_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Get a summary of the exam (for display after completion)
     """
-    exam = db.query(Exam).filter(Exam.id == exam_id).first()
+    exam = await db.get(Exam, exam_id)
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
     
     # Count answered questions
-    total_questions = db.query(Question).filter(Question.exam_id == exam_id).count()
+    total_questions = await question_count(db, exam)
     
-    answered_questions = db.query(Answer).filter(
+    answered_questions = await db.scalar(select(func.count(Answer.id)).where(
         Answer.exam_id == exam_id
-    ).filter(
+    ).where(
         (Answer.typed_answer.isnot(None)) |
         (Answer.selected_option.isnot(None))
-    ).count()
+    ))
     
     # Count uploaded PDFs
-    total_pdfs = db.query(UploadedFile).join(Answer).filter(
+    total_pdfs = await db.scalar(select(func.count(UploadedFile.id)).join(Answer).where(
         Answer.exam_id == exam_id
-    ).count()
+    ))
     
     # Calculate time taken
     time_taken_minutes = None
@@ -223,18 +329,12 @@ async def get_exam_summary(exam_id: int, db: Session = Depends(get_db)):
         time_taken_seconds = (exam.submitted_at - exam.started_at).total_seconds()
         time_taken_minutes = int(time_taken_seconds / 60)
     
-    # Calculate marks achieved (for evaluated exams)
+    # Marks are stored when the exam is evaluated
     marks_achieved = None
     percentage = None
-    if exam.status == ExamStatus.EVALUATED and exam.evaluation_report:
-        # Try to extract marks from evaluation report (if examiner provided)
-        # This is a simple pattern match - can be enhanced
-        import re
-        marks_pattern = r'(?:Total\s*Marks\s*Achieved|Marks\s*Obtained|Score)\s*:?\s*(\d+(?:\.\d+)?)\s*(?:/|out\s*of)\s*(\d+)'
-        match = re.search(marks_pattern, exam.evaluation_report, re.IGNORECASE)
-        if match:
-            marks_achieved = float(match.group(1))
-            percentage = round((marks_achieved / exam.total_marks) * 100, 2)
+    if exam.status == ExamStatus.EVALUATED:
+        marks_achieved = exam.marks_achieved
+        percentage = exam.percentage
     
     return {
         "exam_id": exam.id,
@@ -258,11 +358,12 @@ async def get_exam_summary(exam_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/{exam_id}/full-paper")
-async def get_full_question_paper(exam_id: int, db: Session = Depends(get_db)):
+async def get_full_question_paper(exam_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Get the complete question paper (for download/printing after submission)
     """
-    exam = db.query(Exam).filter(Exam.id == exam_id).first()
+    # Exam with all questions in order
+    exam = await load_exam_snapshot(db, exam_id, answers=False)
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
     
@@ -272,14 +373,9 @@ async def get_full_question_paper(exam_id: int, db: Session = Depends(get_db)):
             detail="Question paper can only be viewed after submission"
         )
     
-    # Get all questions in order
-    questions = db.query(Question).filter(
-        Question.exam_id == exam_id
-    ).order_by(Question.sequence_number).all()
-    
     # Format for display
     formatted_questions = []
-    for q in questions:
+    for q in exam.questions:
         formatted_questions.append({
             "sequence_number": q.sequence_number,
             "section": q.section,
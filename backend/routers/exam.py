@@ -2,21 +2,27 @@
 Exam Router - Handles exam creation, starting, and question navigation
 """
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 import json
 from datetime import datetime
 import fitz  # PyMuPDF for PDF text extraction
 import logging
 
-from backend.database import get_db
-from backend.models import User, Exam, Question, Answer, ExamStatus, QuestionType
+from backend.database import get_async_db
+from backend.models import User, Exam, Question, Answer, ExamStatus
 from backend.schemas import (
     ExamCreateRequest, ExamResponse, ExamStartRequest,
     CurrentQuestionResponse, QuestionResponse, AnswerResponse,
-    NextQuestionRequest
+    NextQuestionRequest, QuestionRegenerateRequest
 )
+from backend.config import get_board_pattern
+from backend.exam_snapshot import load_exam_snapshot, load_question_at, question_count
 from backend.gemini_service import gemini_service
+from backend.paper_cache import cache_enabled, cache_scope_user, get_cached_paper, paper_cache_key, store_paper
+from backend.paper_pool import attach_exam, claim_pooled_paper, pool_enabled, release_pooled_paper
+from backend.paper_questions import build_questions, question_fields, replace_paper_question
 
 router = APIRouter()
 
@@ -24,17 +30,19 @@ logger = logging.getLogger(__name__)
 
 
 @router.post("/create", response_model=ExamResponse)
-async def create_exam(request: ExamCreateRequest, db: Session = Depends(get_db)):
+async def create_exam(request: ExamCreateRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Create a new exam and generate the question paper using Gemini
     
     Steps:
     1. Create or get user
-    2. Generate question paper via Gemini
+    2. Take a pooled paper, reuse a cached one, or generate one via Gemini
     3. Create exam record
     4. Create all question records
     5. Return exam details
     """
+    pooled_paper_id = None
+    exam_saved = False
     try:
         logger.info(
             "AI: create_exam start user=%s board=%s class=%s subject=%s difficulty=%s",
@@ -45,15 +53,16 @@ async def create_exam(request: ExamCreateRequest, db: Session = Depends(get_db))
             request.difficulty_level or "medium",
         )
         # Step 1: Get or create user
-        user = db.query(User).filter(User.email == request.user_email).first()
+        user = await db.scalar(select(User).where(User.email == request.user_email))
         if not user:
             user = User(name=request.user_name, email=request.user_email)
             db.add(user)
-            db.commit()
-            db.refresh(user)
+            await db.commit()
+            await db.refresh(user)
+        user_id = user.id  # a rollback below expires `user`, and async sessions cannot lazy-load it
         
-        # Step 2: Generate question paper using Gemini
-        paper_json = gemini_service.generate_question_paper(
+        # Step 2: Reuse a cached paper for identical inputs, otherwise generate via Gemini
+        generation_inputs = dict(
             board=request.board.value,
             class_num=request.class_num,
             subject=request.subject,
@@ -61,14 +70,52 @@ async def create_exam(request: ExamCreateRequest, db: Session = Depends(get_db))
             difficulty_level=request.difficulty_level or "medium",
             syllabus_content=request.syllabus_content
         )
+        cache_key = paper_cache_key(**generation_inputs, user_id=cache_scope_user(user_id))
+        paper_json = None
 
-        logger.info(
-            "AI: create_exam generated model=%s api_key=%s/%s",
-            gemini_service.last_model_used,
-            (gemini_service.last_key_index_used + 1) if gemini_service.last_key_index_used is not None else None,
-            len(gemini_service.api_keys),
-        )
+        # A pooled paper is unused, so it also satisfies "fresh"; only plain combos are pooled
+        if pool_enabled() and not request.chapter_focus and not request.syllabus_content:
+            claimed = await db.run_sync(
+                claim_pooled_paper,
+                board=request.board.value,
+                class_num=request.class_num,
+                subject=request.subject,
+                difficulty_level=request.difficulty_level or "medium"
+            )
+            if claimed:
+                pooled_paper_id, paper_json = claimed
+                logger.info("AI: create_exam paper_pool hit pooled_paper_id=%s", pooled_paper_id)
+
+        if paper_json is None and cache_enabled() and not request.fresh:
+            paper_json = await db.run_sync(get_cached_paper, cache_key)
+            if paper_json is not None:
+                logger.info("AI: create_exam paper_cache hit key=%s", cache_key[:12])
+
+        if paper_json is None:
+            # A cache or pool miss leaves a read transaction open; end it so the
+            # pooled connection is free while the paper is generated
+            await db.commit()
+            paper_json = await gemini_service.generate_question_paper_async(**generation_inputs)
+            attempt = gemini_service.current_attempt()
+
+            logger.info(
+                "AI: create_exam generated model=%s api_key=%s/%s",
+                (attempt.model if attempt else None),
+                (attempt.key_index + 1) if attempt else None,
+                len(gemini_service.api_keys),
+            )
+
+            if cache_enabled():
+                try:
+                    await db.run_sync(store_paper, cache_key, paper_json, **generation_inputs)
+                except Exception:
+                    # A cache failure must never fail exam creation
+                    await db.rollback()
+                    logger.exception("AI: paper_cache store failed key=%s", cache_key[:12])
         
+        # Keep the difficulty with the exam's copy of the paper (question regeneration reuses it)
+        paper_json = {**paper_json, 'difficulty_level': generation_inputs['difficulty_level']}
+
         # Step 3: Create exam record with custom duration validation
         default_duration = paper_json['duration_minutes']
         final_duration = default_duration
@@ -80,7 +127,7 @@ async def create_exam(request: ExamCreateRequest, db: Session = Depends(get_db))
             # Silently ignore if custom duration is higher than default
         
         exam = Exam(
-            user_id=user.id,
+            user_id=user_id,
             board=request.board,
             class_num=request.class_num,
             subject=request.subject,
@@ -92,44 +139,21 @@ async def create_exam(request: ExamCreateRequest, db: Session = Depends(get_db))
             current_question_index=0
         )
         db.add(exam)
-        db.commit()
-        db.refresh(exam)
-        
-        # Step 4: Create question records
-        question_number = 1
-        for section_data in paper_json['sections']:
-            section = section_data['section']
-            for q_data in section_data['questions']:
-                # Normalize question type to a valid enum
-                raw_type = (q_data.get('question_type') or "Short Answer").strip()
-                type_key = raw_type.upper().replace(" ", "_")
-                if type_key not in QuestionType.__members__:
-                    # Infer type from content if model returned unexpected type
-                    if q_data.get('options') or q_data.get('correct_answer'):
-                        type_key = "MCQ"
-                    else:
-                        marks = int(q_data.get('marks') or 0)
-                        type_key = "LONG_ANSWER" if marks >= 5 else "SHORT_ANSWER"
-
-                question = Question(
-                    exam_id=exam.id,
-                    section=section,
-                    sequence_number=question_number,
-                    question_text=q_data['question_text'],
-                    question_type=QuestionType[type_key],
-                    marks=q_data['marks'],
-                    has_internal_choice=q_data.get('has_internal_choice', False),
-                    alternative_question_text=q_data.get('alternative_question_text'),
-                    options_json=q_data.get('options'),
-                    correct_answer=q_data.get('correct_answer')
-                )
-                db.add(question)
-                question_number += 1
+        # The exam, its questions and the pool attachment commit together, so a
+        # failure leaves nothing behind and a claimed paper can go back to the pool
+        await db.flush()
+
+        if pooled_paper_id is not None:
+            await db.run_sync(attach_exam, pooled_paper_id, exam.id)
         
-        db.commit()
+        # Step 4: Create question records (the count is cached for navigation)
+        questions = build_questions(exam.id, paper_json)
+        db.add_all(questions)
+        exam.total_questions = len(questions)
+        await db.commit()
+        exam_saved = True
         
-        # Count total questions
-        total_questions = db.query(Question).filter(Question.exam_id == exam.id).count()
+        total_questions = exam.total_questions
         
         return ExamResponse(
             id=exam.id,
@@ -146,7 +170,13 @@ async def create_exam(request: ExamCreateRequest, db: Session = Depends(get_db))
         )
     
     except Exception as e:
-        db.rollback()
+        await db.rollback()
+        if pooled_paper_id is not None and not exam_saved:
+            try:
+                await db.run_sync(release_pooled_paper, pooled_paper_id)
+            except Exception:
+                await db.rollback()
+                logger.exception("AI: paper_pool release failed pooled_paper_id=%s", pooled_paper_id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create exam: {str(e)}"
@@ -154,11 +184,11 @@ async def create_exam(request: ExamCreateRequest, db: Session = Depends(get_db))
 
 
 @router.post("/start", response_model=CurrentQuestionResponse)
-async def start_exam(request: ExamStartRequest, db: Session = Depends(get_db)):
+async def start_exam(request: ExamStartRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Start an exam - sets status to IN_PROGRESS and returns first question
     """
-    exam = db.query(Exam).filter(Exam.id == request.exam_id).first()
+    exam = await db.get(Exam, request.exam_id)
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
     
@@ -170,25 +200,21 @@ async def start_exam(request: ExamStartRequest, db: Session = Depends(get_db)):
     exam.started_at = datetime.utcnow()
     exam.time_remaining_seconds = exam.duration_minutes * 60
     exam.current_question_index = 0
-    db.commit()
-    db.refresh(exam)
+    await db.commit()
+    await db.refresh(exam)
     
     return await get_current_question(request.exam_id, db)
 
 
 @router.get("/{exam_id}/questions", response_model=List[QuestionResponse])
-async def get_all_questions(exam_id: int, db: Session = Depends(get_db)):
+async def get_all_questions(exam_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Get all questions for an exam (for navigation)
     """
-    exam = db.query(Exam).filter(Exam.id == exam_id).first()
-    if not exam:
+    snapshot = await load_exam_snapshot(db, exam_id, answers=False)
+    if not snapshot:
         raise HTTPException(status_code=404, detail="Exam not found")
     
-    questions = db.query(Question).filter(
-        Question.exam_id == exam_id
-    ).order_by(Question.sequence_number).all()
-    
     return [
         QuestionResponse(
             id=q.id,
@@ -202,22 +228,134 @@ async def get_all_questions(exam_id: int, db: Session = Depends(get_db)):
             options_json=q.options_json,
             correct_answer=q.correct_answer
         )
-        for q in questions
+        for q in snapshot.questions
     ]
 
 
-@router.get("/{exam_id}/answers", response_model=List[AnswerResponse])
-async def get_all_answers(exam_id: int, db: Session = Depends(get_db)):
+@router.post("/{exam_id}/questions/{question_id}/regenerate", response_model=QuestionResponse)
+async def regenerate_question(
+    exam_id: int,
+    question_id: int,
+    request: Optional[QuestionRegenerateRequest] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Get all answers for an exam (to check which questions are answered)
+    Replace one question (e.g. broken LaTeX or an ambiguous MCQ) with a freshly generated one
+
+    One short Gemini call built from the exam's board, class, subject and difficulty, the
+    question's section spec and the other questions in its section. The Question row keeps
+    its id and number; Exam.paper_json is patched to match. 409 if the question was answered
+    or the exam submitted while the replacement was being generated.
     """
-    exam = db.query(Exam).filter(Exam.id == exam_id).first()
+    exam = await db.get(Exam, exam_id)
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
-    
-    answers = db.query(Answer).join(Question).filter(
+
+    question = await db.scalar(select(Question).where(
+        Question.id == question_id,
         Question.exam_id == exam_id
-    ).all()
+    ))
+    if not question:
+        raise HTTPException(status_code=404, detail="Question not found")
+
+    if exam.status in (ExamStatus.SUBMITTED, ExamStatus.EVALUATED):
+        raise HTTPException(status_code=400, detail="Exam already submitted")
+    if await db.scalar(select(Answer.id).where(Answer.question_id == question_id)) is not None:
+        raise HTTPException(status_code=400, detail="Question already answered")
+
+    section_questions = (await db.scalars(select(Question).where(
+        Question.exam_id == exam_id,
+        Question.section == question.section
+    ).order_by(Question.sequence_number))).all()
+
+    # Section spec from the board pattern, with the marks this paper actually gave the question
+    pattern = get_board_pattern(exam.board.value, exam.class_num)
+    details = pattern['sections'].get(question.section) or {
+        "type": question.question_type.value,
+        "questions": len(section_questions)
+    }
+    details = {**details, "marks_each": question.marks}
+    paper_json = exam.paper_json or {}
+
+    logger.info(
+        "AI: regenerate_question exam=%s question=%s section=%s number=%s",
+        exam_id,
+        question_id,
+        question.section,
+        question.sequence_number,
+    )
+    # End the read transaction so the pooled connection is free during the Gemini call
+    # (sessions keep loaded objects on commit, so exam/question are still usable)
+    await db.commit()
+    try:
+        q_data = await gemini_service.regenerate_question_async(
+            board=exam.board.value,
+            class_num=exam.class_num,
+            subject=exam.subject,
+            pattern=pattern,
+            section=question.section,
+            details=details,
+            question_number=question.sequence_number,
+            with_choice=bool(question.has_internal_choice),
+            neighbours=[(q.sequence_number, q.question_text) for q in section_questions],
+            chapter_focus=exam.chapter_focus,
+            difficulty_level=paper_json.get('difficulty_level') or "medium",
+            reason=request.reason if request else None
+        )
+
+        # The student may have answered or submitted during the call: replace the question
+        # only if it is still unanswered and the exam still open (one conditional UPDATE)
+        replaced = await db.execute(
+            update(Question).where(
+                Question.id == question_id,
+                ~select(Answer.id).where(Answer.question_id == question_id).exists(),
+                select(Exam.id).where(
+                    Exam.id == exam_id,
+                    Exam.status.in_((ExamStatus.CREATED, ExamStatus.IN_PROGRESS))
+                ).exists()
+            ).values(**question_fields(q_data)).execution_options(synchronize_session=False)
+        )
+        if replaced.rowcount == 0:
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Question was answered or the exam submitted while it was being regenerated"
+            )
+        await db.refresh(exam)  # the paper as of now (another question may have been replaced meanwhile)
+        if (exam.paper_json or {}).get('sections'):
+            exam.paper_json = replace_paper_question(exam.paper_json, question.sequence_number, q_data)
+        await db.commit()
+        await db.refresh(question)
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to regenerate question: {str(e)}"
+        )
+
+    return QuestionResponse(
+        id=question.id,
+        section=question.section,
+        sequence_number=question.sequence_number,
+        question_text=question.question_text,
+        question_type=question.question_type,
+        marks=question.marks,
+        has_internal_choice=question.has_internal_choice,
+        alternative_question_text=question.alternative_question_text,
+        options_json=question.options_json
+    )
+
+
+@router.get("/{exam_id}/answers", response_model=List[AnswerResponse])
+async def get_all_answers(exam_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Get all answers for an exam (to check which questions are answered)
+    """
+    snapshot = await load_exam_snapshot(db, exam_id)
+    if not snapshot:
+        raise HTTPException(status_code=404, detail="Exam not found")
     
     return [
         AnswerResponse(
@@ -226,29 +364,24 @@ async def get_all_answers(exam_id: int, db: Session = Depends(get_db)):
             typed_answer=a.typed_answer,
             selected_option=a.selected_option,
             selected_choice=a.selected_choice,
-            has_uploaded_files=len(a.uploaded_files) > 0
+            has_uploaded_files=a.has_uploaded_files
         )
-        for a in answers
+        for a in snapshot.answers
     ]
 
 
 @router.get("/{exam_id}/current", response_model=CurrentQuestionResponse)
-async def get_current_question(exam_id: int, db: Session = Depends(get_db)):
+async def get_current_question(exam_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Get the current question for an exam based on sequential state
     
     CRITICAL: Enforces sequential answering rules
     """
-    exam = db.query(Exam).filter(Exam.id == exam_id).first()
+    exam = await db.get(Exam, exam_id)
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
     
-    # Get all questions ordered by sequence
-    all_questions = db.query(Question).filter(
-        Question.exam_id == exam_id
-    ).order_by(Question.sequence_number).all()
-    
-    total_questions = len(all_questions)
+    total_questions = await question_count(db, exam)
     
     # Check if exam is complete
     if exam.current_question_index >= total_questions:
@@ -272,21 +405,14 @@ async def get_current_question(exam_id: int, db: Session = Depends(get_db)):
             is_last_question=True
         )
     
-    # Get current question
-    current_question = all_questions[exam.current_question_index]
-    
-    # Get existing answer if any
-    answer = db.query(Answer).filter(
-        Answer.question_id == current_question.id
-    ).first()
+    # Get current question and its existing answer if any (one indexed lookup, not the whole paper)
+    current_question = await load_question_at(db, exam_id, exam.current_question_index + 1)
+    if not current_question:
+        raise HTTPException(status_code=404, detail="Question not found")
+    answer = current_question.answer
     
     # Check if can proceed (answer saved OR PDF uploaded)
-    can_proceed = False
-    if answer:
-        has_typed_answer = answer.typed_answer is not None and answer.typed_answer.strip() != ""
-        has_mcq_answer = answer.selected_option is not None
-        has_uploaded_files = len(answer.uploaded_files) > 0
-        can_proceed = has_typed_answer or has_mcq_answer or has_uploaded_files
+    can_proceed = answer is not None and answer.is_answered
     
     # Build response
     answer_response = None
@@ -299,7 +425,7 @@ async def get_current_question(exam_id: int, db: Session = Depends(get_db)):
             selected_option=answer.selected_option,
             first_saved_at=answer.first_saved_at,
             last_edited_at=answer.last_edited_at,
-            has_uploaded_files=len(answer.uploaded_files) > 0
+            has_uploaded_files=answer.has_uploaded_files
         )
     
     return CurrentQuestionResponse(
@@ -334,44 +460,37 @@ async def get_current_question(exam_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/{exam_id}/next", response_model=CurrentQuestionResponse)
-async def next_question(exam_id: int, db: Session = Depends(get_db)):
+async def next_question(exam_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Move to the next question
     
     CRITICAL: Validates that current question is answered before allowing progression
     """
-    exam = db.query(Exam).filter(Exam.id == exam_id).first()
+    exam = await db.get(Exam, exam_id)
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
     
     if exam.status != ExamStatus.IN_PROGRESS:
         raise HTTPException(status_code=400, detail="Exam is not in progress")
     
-    # Get current question
-    all_questions = db.query(Question).filter(
-        Question.exam_id == exam_id
-    ).order_by(Question.sequence_number).all()
-    
-    if exam.current_question_index >= len(all_questions):
+    if exam.current_question_index >= await question_count(db, exam):
         raise HTTPException(status_code=400, detail="No more questions")
     
-    current_question = all_questions[exam.current_question_index]
-    
     # No sequential answering enforcement: allow navigation without answering
     
     # Move to next question
     exam.current_question_index += 1
-    db.commit()
+    await db.commit()
     
     return await get_current_question(exam_id, db)
 
 
 @router.post("/{exam_id}/submit")
-async def submit_exam(exam_id: int, db: Session = Depends(get_db)):
+async def submit_exam(exam_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Submit the exam for evaluation
     """
-    exam = db.query(Exam).filter(Exam.id == exam_id).first()
+    exam = await db.get(Exam, exam_id)
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
     
@@ -384,20 +503,20 @@ async def submit_exam(exam_id: int, db: Session = Depends(get_db)):
     exam.submitted_at = datetime.utcnow()
     
     # Lock all answers
-    db.query(Answer).filter(Answer.exam_id == exam_id).update({"is_locked": True})
+    await db.execute(update(Answer).where(Answer.exam_id == exam_id).values(is_locked=True))
     
-    db.commit()
+    await db.commit()
     
     return {"message": "Exam submitted successfully", "exam_id": exam_id}
 
 
 @router.get("/{exam_id}/timer")
-async def get_timer_state(exam_id: int, db: Session = Depends(get_db)):
+async def get_timer_state(exam_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Get the current timer state for an exam
     Allows timer to persist across page refreshes
     """
-    exam = db.query(Exam).filter(Exam.id == exam_id).first()
+    exam = await db.get(Exam, exam_id)
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
     
@@ -420,16 +539,16 @@ async def get_timer_state(exam_id: int, db: Session = Depends(get_db)):
 
 
 @router.post("/{exam_id}/update-timer")
-async def update_timer(exam_id: int, time_remaining: int, db: Session = Depends(get_db)):
+async def update_timer(exam_id: int, time_remaining: int, db: AsyncSession = Depends(get_async_db)):
     """
     Update the timer state (for persistence)
     """
-    exam = db.query(Exam).filter(Exam.id == exam_id).first()
+    exam = await db.get(Exam, exam_id)
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
     
     exam.time_remaining_seconds = time_remaining
-    db.commit()
+    await db.commit()
     
     return {"message": "Timer updated"}
 
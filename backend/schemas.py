@@ -20,6 +20,7 @@ class ExamCreateRequest(BaseModel):
     custom_duration_minutes: Optional[int] = Field(None, ge=1, description="Custom exam duration (can only be lower than default)")
     difficulty_level: Optional[str] = Field("medium", description="Difficulty: easy, medium, hard, extreme, ultra_extreme")
     syllabus_content: Optional[str] = Field(None, description="Extracted syllabus content from uploaded PDF")
+    fresh: bool = Field(False, description="Skip the paper cache and generate a new paper")
 
 
 class ExamStartRequest(BaseModel):
@@ -27,6 +28,11 @@ class ExamStartRequest(BaseModel):
     exam_id: int
 
 
+class QuestionRegenerateRequest(BaseModel):
+    """Optional feedback for regenerating one question"""
+    reason: Optional[str] = Field(None, max_length=500, description="What was wrong, e.g. broken LaTeX or an ambiguous MCQ")
+
+
 class QuestionResponse(BaseModel):
     """Response schema for a single question"""
     id: int
@@ -131,3 +137,63 @@ class EvaluationResponse(BaseModel):
     
     class Config:
         from_attributes = True
+
+
+class EvaluationJobResponse(BaseModel):
+    """Status of a queued evaluation"""
+    job_id: Optional[int]  # None when the exam was evaluated before jobs existed
+    exam_id: int
+    status: str  # queued, running, succeeded, failed
+    attempts: int = 0
+    max_attempts: int = 0
+    last_error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    next_run_at: Optional[datetime] = None
+
+
+class BatchEvaluationRequest(BaseModel):
+    """Evaluate many exams at once: explicit exam ids, or every SUBMITTED exam of a subject"""
+    exam_ids: Optional[List[int]] = None
+    subject: Optional[str] = None
+    board: Optional[BoardEnum] = None  # filters for subject selection
+    class_num: Optional[int] = Field(None, ge=6, le=12)
+
+
+class BatchExamStatus(BaseModel):
+    """One exam's progress within a batch"""
+    exam_id: int
+    status: str  # queued, running, succeeded, failed
+    job_id: Optional[int] = None
+    attempts: int = 0
+    last_error: Optional[str] = None
+    marks_achieved: Optional[float] = None
+    percentage: Optional[float] = None
+
+
+class BatchEvaluationResponse(BaseModel):
+    """Aggregate progress of an evaluation batch"""
+    batch_id: int
+    subject: Optional[str] = None
+    created_at: datetime
+    total: int
+    queued: int
+    running: int
+    succeeded: int
+    failed: int
+    completed: bool
+    exams: List[BatchExamStatus]
+    skipped: List[Dict[str, Any]] = []  # requested exams not added: {"exam_id", "reason"}
+
+
+class QuestionResultResponse(BaseModel):
+    """Per-question marks from an evaluation"""
+    question_id: int
+    sequence_number: int
+    section: str
+    marks_awarded: float
+    max_marks: int
+    feedback: Optional[str]
+    selected_choice: Optional[str]
+    graded_by: str  # "local" or "ai"
@@ -0,0 +1,160 @@
+"""
+Gemini Files API upload cache
+Reuses uploaded file URIs per (file content hash, API key) until the Files API expires them
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+import hashlib
+import os
+import threading
+import time
+
+from backend.config import settings
+
+_HASH_CHUNK_BYTES = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class CachedUpload:
+    """A file already uploaded with one API key"""
+    uri: str
+    mime_type: str
+    name: Optional[str]
+    expires_at: float  # time.time() epoch seconds
+
+
+class UploadCache:
+    """
+    Maps (sha256 of file bytes, key_index) to a Files API upload.
+
+    Uploaded files belong to the key that uploaded them, so a switch to
+    another key re-uploads for that key only. Entries are dropped a safety
+    margin before the Files API expiry (48h by default).
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, int], CachedUpload] = {}
+        self._digests: Dict[Tuple[str, int, int], str] = {}  # (path, size, mtime_ns) -> sha256
+        self._page_counts: Dict[Tuple[str, int, int], int] = {}  # (path, size, mtime_ns) -> PDF pages
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def digest(self, file_path: str) -> str:
+        """SHA-256 of a file, streamed and memoized until the file changes."""
+        stamp = _stamp(file_path)
+        with self._lock:
+            cached = self._digests.get(stamp)
+        if cached:
+            return cached
+
+        sha = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK_BYTES), b""):
+                sha.update(chunk)
+        value = sha.hexdigest()
+        with self._lock:
+            self._digests[stamp] = value
+        return value
+
+    def page_count(self, file_path: str) -> int:
+        """Pages of a PDF (estimated from its size if it cannot be parsed), memoized until the file changes."""
+        stamp = _stamp(file_path)
+        with self._lock:
+            cached = self._page_counts.get(stamp)
+        if cached:
+            return cached
+
+        try:
+            import fitz  # PyMuPDF
+
+            with fitz.open(file_path) as doc:
+                value = doc.page_count
+        except Exception:
+            # Assume ~100KB per scanned page when the PDF cannot be opened
+            value = max(1, stamp[1] // (100 * 1024))
+        with self._lock:
+            self._page_counts[stamp] = value
+        return value
+
+    def get(self, digest: str, key_index: int) -> Optional[CachedUpload]:
+        if not settings.GEMINI_UPLOAD_CACHE_ENABLED:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get((digest, key_index))
+            if entry and entry.expires_at - settings.GEMINI_UPLOAD_EXPIRY_MARGIN_SECONDS > now:
+                self.hits += 1
+                return entry
+            if entry:
+                del self._entries[(digest, key_index)]
+            self.misses += 1
+            return None
+
+    def put(self, digest: str, key_index: int, uploaded: Any) -> CachedUpload:
+        """Remember an upload returned by client.files.upload."""
+        entry = CachedUpload(
+            uri=uploaded.uri,
+            mime_type=getattr(uploaded, "mime_type", None) or "application/pdf",
+            name=getattr(uploaded, "name", None),
+            expires_at=_expiry_epoch(getattr(uploaded, "expiration_time", None)),
+        )
+        if settings.GEMINI_UPLOAD_CACHE_ENABLED:
+            with self._lock:
+                self._entries[(digest, key_index)] = entry
+        return entry
+
+    def invalidate_key(self, key_index: int) -> int:
+        """Forget every upload made with a key (e.g. the API says a file is gone)."""
+        with self._lock:
+            stale = [k for k in self._entries if k[1] == key_index]
+            for k in stale:
+                del self._entries[k]
+            return len(stale)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            per_key: Dict[int, int] = {}
+            for (_, key_index), entry in self._entries.items():
+                if entry.expires_at > now:
+                    per_key[key_index] = per_key.get(key_index, 0) + 1
+            return {
+                "enabled": settings.GEMINI_UPLOAD_CACHE_ENABLED,
+                "hits": self.hits,
+                "misses": self.misses,
+                "files_by_key": [
+                    {"api_key_index": k + 1, "files": n} for k, n in sorted(per_key.items())
+                ],
+            }
+
+
+def _stamp(file_path: str) -> Tuple[str, int, int]:
+    stat = os.stat(file_path)
+    return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns
+
+
+def _expiry_epoch(expiration_time: Any) -> float:
+    """Convert the Files API expiration_time (datetime or RFC 3339 string) to epoch seconds."""
+    if isinstance(expiration_time, str):
+        try:
+            expiration_time = datetime.fromisoformat(expiration_time.replace("Z", "+00:00"))
+        except ValueError:
+            expiration_time = None
+    if isinstance(expiration_time, datetime):
+        if expiration_time.tzinfo is None:
+            expiration_time = expiration_time.replace(tzinfo=timezone.utc)
+        return expiration_time.timestamp()
+    return time.time() + settings.GEMINI_UPLOAD_DEFAULT_TTL_SECONDS
+
+
+def is_file_reference_error(message: str) -> bool:
+    """True if a generate_content error points at an uploaded file that no longer exists."""
+    lowered = message.lower()
+    return "file" in lowered and any(
+        marker in message for marker in ("PERMISSION_DENIED", "NOT_FOUND", "403", "404")
+    )
+
+
+upload_cache = UploadCache()
@@ -0,0 +1,317 @@
+"""
+Index check for the hot queries
+
+Builds a scratch database with the Alembic migrations (not create_all), fails if the
+models have drifted from them, then grows the tables in steps. After each step it
+runs the real exam, answer and evaluation code paths, captures every statement they
+send and EXPLAINs it: a full scan of one of the growing tables, or a path whose plans
+do not use the indexes listed for it in EXPECTED_INDEXES, fails the check.
+
+    python benchmarks/explain_check.py
+    python benchmarks/explain_check.py --exams 500 5000 40000   # ~1.2M answers
+    python benchmarks/explain_check.py --database-url postgresql://.../scratch --verbose
+
+A --database-url database is migrated and filled with rows, so point it at a scratch
+database. On PostgreSQL a "Seq Scan" on a growing table fails the check.
+"""
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+import argparse
+import asyncio
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_BACKEND", "fake")  # never call the real API from a benchmark
+
+from alembic import command  # noqa: E402
+from alembic.autogenerate import compare_metadata  # noqa: E402
+from alembic.config import Config  # noqa: E402
+from alembic.runtime.migration import MigrationContext  # noqa: E402
+from sqlalchemy import create_engine, event, insert, text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from backend import evaluation_jobs  # noqa: E402
+from backend.database import Base, make_async_engine  # noqa: E402
+from backend.evaluation_runner import gather_inputs  # noqa: E402
+from backend.models import (  # noqa: E402
+    Answer, BoardEnum, EvaluationJob, Exam, ExamStatus, Question, QuestionResult, QuestionType, UploadedFile, User
+)
+from backend.routers import answer as answer_router  # noqa: E402
+from backend.routers import evaluation as evaluation_router  # noqa: E402
+from backend.routers import exam as exam_router  # noqa: E402
+from backend.schemas import AnswerSaveRequest  # noqa: E402
+
+QUESTIONS_PER_EXAM = 30
+SUBJECTS = ("Mathematics", "Physics", "Chemistry", "Biology", "English")
+# Tables that grow with every exam: a full scan of any of them fails the check
+GROWING_TABLES = {"exams", "questions", "answers", "uploaded_files", "question_results", "evaluation_jobs"}
+# Indexes each hot path must use (an alternative is written "a|b"); a plan without them fails
+EXPECTED_INDEXES = {
+    "exam get_current_question": ["ix_questions_exam_sequence"],
+    "exam next_question": ["ix_questions_exam_sequence"],
+    "exam get_all_questions": ["ix_questions_exam_sequence"],
+    "exam get_all_answers": ["ix_questions_exam_sequence", "ix_uploaded_files_answer_id"],
+    "answer get_answer": ["ix_uploaded_files_answer_id"],
+    "answer save_answer": ["ix_uploaded_files_answer_id"],
+    "evaluation gather_inputs": ["ix_questions_exam_sequence", "ix_uploaded_files_answer_id"],
+    "evaluation get_exam_summary": ["ix_answers_exam_id", "ix_uploaded_files_answer_id"],
+    "evaluation get_question_results": ["ix_question_results_exam_id"],
+    "evaluation get_full_question_paper": ["ix_questions_exam_sequence"],
+    "evaluation jobs by exam": ["ix_evaluation_jobs_exam_id|ux_evaluation_jobs_active_exam"],
+    "evaluation job queue": ["ix_evaluation_jobs_due"],
+    "evaluation batch selection": ["ix_exams_subject_status"],
+    "exam submit_exam": ["ix_answers_exam_id"],
+}
+SQLITE_SCAN = re.compile(r"^SCAN (\w+?)(?:_\d+)?\b")
+POSTGRES_SCAN = re.compile(r"Seq Scan on (\w+)")
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+
+def migrate(engine) -> List[Any]:
+    """alembic upgrade head on the engine's database; returns the model/migration drift."""
+    config = Config(ALEMBIC_INI)
+    config.attributes["configure_logger"] = False
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, "head")
+    with engine.connect() as connection:
+        return compare_metadata(MigrationContext.configure(connection), Base.metadata)
+
+
+class DataBuilder:
+    """Bulk-inserts exams with explicit ids (Core executemany, no ORM flushes)."""
+
+    STATUSES = (ExamStatus.EVALUATED, ExamStatus.SUBMITTED, ExamStatus.IN_PROGRESS, ExamStatus.CREATED)
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.exams = 0
+
+    def grow_to(self, exams: int, chunk: int = 500) -> Dict[ExamStatus, int]:
+        """Add exams until there are `exams`; returns the id of one new exam per status."""
+        probes: Dict[ExamStatus, int] = {}
+        while self.exams < exams:
+            first = self.exams + 1
+            last = min(exams, self.exams + chunk)
+            self._insert(range(first, last + 1))
+            for exam_id in range(max(first, last - len(self.STATUSES) + 1), last + 1):
+                probes[self._status(exam_id)] = exam_id
+            self.exams = last
+        with self.engine.begin() as connection:
+            connection.execute(text("ANALYZE"))
+        return probes
+
+    def _status(self, exam_id: int) -> ExamStatus:
+        return self.STATUSES[exam_id % len(self.STATUSES)]
+
+    def _insert(self, exam_ids: range) -> None:
+        now = datetime.utcnow()
+        rows: Dict[Any, List[Dict[str, Any]]] = {
+            User: [], Exam: [], Question: [], Answer: [], UploadedFile: [], QuestionResult: [], EvaluationJob: []
+        }
+        for exam_id in exam_ids:
+            status = self._status(exam_id)
+            rows[User].append({"id": exam_id, "name": f"Student {exam_id}", "email": f"s{exam_id}@example.com", "created_at": now})
+            rows[Exam].append({
+                "id": exam_id, "user_id": exam_id, "board": BoardEnum.CBSE, "class_num": 10,
+                "subject": SUBJECTS[exam_id % len(SUBJECTS)], "duration_minutes": 180,
+                "total_marks": QUESTIONS_PER_EXAM * 2, "status": status, "started_at": now,
+                "current_question_index": QUESTIONS_PER_EXAM // 2, "total_questions": QUESTIONS_PER_EXAM,
+                "paper_json": {"instructions": [], "sections": []}, "created_at": now, "updated_at": now,
+            })
+            if status != ExamStatus.CREATED:
+                rows[EvaluationJob].append({
+                    "id": exam_id, "exam_id": exam_id, "status": evaluation_jobs.SUCCEEDED,
+                    "attempts": 1, "max_attempts": 3, "created_at": now,
+                })
+            for number in range(1, QUESTIONS_PER_EXAM + 1):
+                row_id = (exam_id - 1) * QUESTIONS_PER_EXAM + number
+                mcq = number % 2 == 1
+                rows[Question].append({
+                    "id": row_id, "exam_id": exam_id, "section": "A" if mcq else "B", "sequence_number": number,
+                    "question_text": f"Question {number}", "question_type": QuestionType.MCQ if mcq else QuestionType.SHORT_ANSWER,
+                    "marks": 1 if mcq else 3, "has_internal_choice": False, "created_at": now,
+                    "options_json": {"A": "1", "B": "2", "C": "3", "D": "4"} if mcq else None,
+                    "correct_answer": "B" if mcq else None,
+                })
+                rows[Answer].append({
+                    "id": row_id, "exam_id": exam_id, "question_id": row_id, "is_locked": False,
+                    "selected_option": "B" if mcq else None, "typed_answer": None if mcq else f"Answer {number}",
+                    "first_saved_at": now, "last_edited_at": now,
+                })
+                if number % 3 == 0:
+                    rows[UploadedFile].append({
+                        "id": row_id, "answer_id": row_id, "filename": f"q{number}.pdf",
+                        "file_path": f"/tmp/q{number}.pdf", "file_size": 1024, "uploaded_at": now,
+                    })
+                if status == ExamStatus.EVALUATED:
+                    rows[QuestionResult].append({
+                        "id": row_id, "exam_id": exam_id, "question_id": row_id, "marks_awarded": 1.0,
+                        "max_marks": 1 if mcq else 3, "graded_by": "local", "created_at": now,
+                    })
+        with self.engine.begin() as connection:
+            for model, values in rows.items():
+                if values:
+                    connection.execute(insert(model), values)
+
+
+class PlanCollector:
+    """Captures the statements sent while active so they can be EXPLAINed afterwards."""
+
+    def __init__(self, engine):
+        self.statements: List[Tuple[str, Any]] = []
+        self.active = False
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active and not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            self.statements.append((statement, parameters))
+
+    @contextmanager
+    def collecting(self):
+        self.statements, self.active = [], True
+        try:
+            yield self
+        finally:
+            self.active = False
+
+
+async def explain(engine: AsyncEngine, statement: str, parameters: Any) -> Tuple[List[str], List[str]]:
+    """(plan lines, full scans of growing tables) for one captured statement, on the driver that sent it."""
+    postgres = engine.dialect.name == "postgresql"
+    async with engine.connect() as connection:
+        rows = (await connection.exec_driver_sql(("EXPLAIN " if postgres else "EXPLAIN QUERY PLAN ") + statement, parameters)).all()
+        await connection.rollback()
+    plan = [row[0] if postgres else row[-1] for row in rows]
+    pattern = POSTGRES_SCAN if postgres else SQLITE_SCAN
+    scans = [line.strip() for line in plan if (m := pattern.search(line.strip())) and m.group(1) in GROWING_TABLES]
+    return plan, scans
+
+
+def unused_indexes(name: str, plans: List[str]) -> List[str]:
+    """The EXPECTED_INDEXES of a hot path that appear in none of its plan lines."""
+    return [
+        expected for expected in EXPECTED_INDEXES[name]
+        if not any(re.search(rf"\b(?:{expected})\b", line) for line in plans)
+    ]
+
+
+def hot_paths(probes: Dict[ExamStatus, int]) -> Dict[str, Callable[[AsyncSession], Awaitable[Any]]]:
+    evaluated, submitted, live = probes[ExamStatus.EVALUATED], probes[ExamStatus.SUBMITTED], probes[ExamStatus.IN_PROGRESS]
+    live_question = (live - 1) * QUESTIONS_PER_EXAM + 2
+
+    def batch_selection(db: Session) -> Any:
+        # The subject filter of POST /api/evaluation/batch
+        return db.query(Exam.id).filter(
+            Exam.subject == SUBJECTS[0], Exam.status == ExamStatus.SUBMITTED
+        ).order_by(Exam.id).limit(50).all()
+
+    async def evaluation_inputs(db: AsyncSession) -> Any:
+        return await gather_inputs(db, await db.get(Exam, submitted))
+
+    def jobs_by_exam(db: Session) -> Any:
+        return evaluation_jobs.active_job(db, submitted), evaluation_jobs.latest_job(db, submitted)
+
+    def job_queue(db: Session) -> Any:
+        # Every worker tick: lease upkeep, then claiming (no job is due, so nothing changes)
+        evaluation_jobs.renew_leases(db, "explain-check")
+        evaluation_jobs.requeue_expired(db)
+        return evaluation_jobs.claim_next_job(db, "explain-check")
+
+    return {
+        "exam get_current_question": lambda db: exam_router.get_current_question(live, db),
+        "exam next_question": lambda db: exam_router.next_question(live, db),
+        "exam get_all_questions": lambda db: exam_router.get_all_questions(live, db),
+        "exam get_all_answers": lambda db: exam_router.get_all_answers(live, db),
+        "answer get_answer": lambda db: answer_router.get_answer(live, live_question, db),
+        "answer save_answer": lambda db: answer_router.save_answer(
+            AnswerSaveRequest(exam_id=live, question_id=live_question, typed_answer="$x^2$"), db
+        ),
+        "evaluation gather_inputs": evaluation_inputs,
+        "evaluation get_exam_summary": lambda db: evaluation_router.get_exam_summary(submitted, db),
+        "evaluation get_question_results": lambda db: evaluation_router.get_question_results(evaluated, db),
+        "evaluation get_full_question_paper": lambda db: evaluation_router.get_full_question_paper(submitted, db),
+        "evaluation jobs by exam": lambda db: db.run_sync(jobs_by_exam),
+        "evaluation job queue": lambda db: db.run_sync(job_queue),
+        "evaluation batch selection": lambda db: db.run_sync(batch_selection),
+        "exam submit_exam": lambda db: exam_router.submit_exam(live, db),  # last: locks the live exam
+    }
+
+
+async def check_hot_paths(url: str, builder: DataBuilder, sizes: List[int], verbose: bool) -> List[str]:
+    """EXPLAIN every hot path at each table size, through the async engine the API uses."""
+    engine = make_async_engine(url)
+    session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    collector = PlanCollector(engine.sync_engine)
+    failures = []
+    for exams in sorted(sizes):
+        probes = builder.grow_to(exams)
+        missing = set(hot_paths(probes)) ^ set(EXPECTED_INDEXES)
+        if missing:
+            raise ValueError(f"EXPECTED_INDEXES does not match the hot paths: {sorted(missing)}")
+        print(f"\n{exams} exams, {exams * QUESTIONS_PER_EXAM} answers")
+        for name, path in hot_paths(probes).items():
+            async with session_factory() as db:  # a fresh session per path, like a request
+                with collector.collecting():
+                    await path(db)
+            scans, plans = [], []
+            for statement, parameters in collector.statements:
+                plan, statement_scans = await explain(engine, statement, parameters)
+                scans.extend(statement_scans)
+                plans.extend(plan)
+                if verbose:
+                    print(f"    {' '.join(statement.split())[:120]}")
+                    for line in plan:
+                        print(f"        {line}")
+            unused = unused_indexes(name, plans)
+            problems = (["FULL SCAN: " + "; ".join(scans)] if scans else []) + (
+                ["NOT USING: " + ", ".join(unused)] if unused else []
+            )
+            print(f"  {name:38} {len(collector.statements):>2} statements  {'  '.join(problems) or 'indexed'}")
+            if problems:
+                failures.append(f"{name} at {exams} exams")
+    await engine.dispose()
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--exams", type=int, nargs="+", default=[500, 5000],
+                        help=f"table sizes to check, in exams of {QUESTIONS_PER_EXAM} answered questions")
+    parser.add_argument("--database-url", help="scratch database to use instead of a temporary SQLite file")
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    scratch = None
+    url = args.database_url
+    if url is None:
+        scratch = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{os.path.join(scratch.name, 'explain_check.db')}"
+    engine = create_engine(url)
+
+    drift = migrate(engine)
+    failures = []
+    if drift:
+        failures.append("models differ from the migrations")
+        print("Models differ from the migrations (add a revision):")
+        for diff in drift:
+            print(f"    {diff}")
+
+    failures.extend(asyncio.run(check_hot_paths(url, DataBuilder(engine), args.exams, args.verbose)))
+
+    engine.dispose()
+    if scratch is not None:
+        scratch.cleanup()
+    if failures:
+        print(f"\nFAILED: {', '.join(failures)}")
+        return 1
+    print("\nOK")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
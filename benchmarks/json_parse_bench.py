@@ -0,0 +1,183 @@
+"""
+Model-JSON decoding benchmark: backend.model_json vs the previous parse chain
+
+Builds large question papers (40 questions by default) with the offline fake
+backend, renders each as the messy variants models actually return (clean
+fenced, prose-wrapped, smart quotes, trailing commas, single backslashes,
+truncated) and times both decoders on every variant:
+
+- legacy: the old GeminiService._load_model_json chain (fence split, json.loads,
+  smart quote / trailing comma / backslash rewrites, json_repair, then a walk
+  restoring LaTeX control escapes), kept here verbatim as the baseline
+- tokenizer: GeminiService._load_model_json, i.e. model_json.loads with
+  json_repair only for output it cannot read
+
+    python benchmarks/json_parse_bench.py --questions 40 --repeat 200
+"""
+from typing import Any, Callable, Dict, List
+import argparse
+import copy
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_BACKEND", "fake")  # never call the real API from a benchmark
+
+from backend import fake_gemini  # noqa: E402
+from backend.config import get_board_pattern  # noqa: E402
+from backend.gemini_service import gemini_service  # noqa: E402
+from replay_bench import _variants, ms, percentile  # noqa: E402
+
+
+def legacy_load(response_text: str) -> Any:
+    """The parse chain model_json replaced, unchanged apart from the stage timing hooks."""
+
+    def _restore_latex_control_escapes(obj: Any) -> Any:
+        if isinstance(obj, str):
+            return (
+                obj.replace("\f", r"\\f")
+                .replace("\t", r"\\t")
+                .replace("\b", r"\\b")
+                .replace("\r", r"\\r")
+            )
+        if isinstance(obj, list):
+            return [_restore_latex_control_escapes(v) for v in obj]
+        if isinstance(obj, dict):
+            return {k: _restore_latex_control_escapes(v) for k, v in obj.items()}
+        return obj
+
+    if "```json" in response_text:
+        response_text = response_text.split("```json")[1].split("```")[0].strip()
+    elif "```" in response_text:
+        response_text = response_text.split("```")[1].split("```")[0].strip()
+
+    try:
+        paper_data = json.loads(response_text)
+    except json.JSONDecodeError:
+        start = response_text.find("{")
+        end = response_text.rfind("}")
+        if start != -1 and end != -1 and end > start:
+            response_text = response_text[start:end + 1]
+        response_text = response_text.replace("“", '"').replace("”", '"')
+        response_text = response_text.replace("‘", "'").replace("’", "'")
+        response_text = re.sub(r",\s*([}\]])", r"\1", response_text)
+        response_text = re.sub(r"(?<!\\)\\(?!\\)(?!u[0-9a-fA-F]{4})", r"\\\\", response_text)
+        try:
+            paper_data = json.loads(response_text)
+        except json.JSONDecodeError:
+            from json_repair import repair_json
+
+            paper_data = json.loads(repair_json(response_text))
+
+    return _restore_latex_control_escapes(paper_data)
+
+
+def build_paper(board: str, class_num: int, subject: str, questions: int) -> Dict[str, Any]:
+    """A fake paper for the board pattern, padded or trimmed to `questions` questions."""
+    pattern = get_board_pattern(board, class_num)
+    prompt = gemini_service._create_question_generation_prompt(board, class_num, subject, pattern)
+    _, text = fake_gemini.respond(prompt)
+    paper = json.loads(text.split("```json", 1)[1].rsplit("```", 1)[0])
+
+    flat = [(s, q) for s in paper["sections"] for q in s["questions"]]
+    for s in paper["sections"]:
+        s["questions"] = []
+    for number in range(1, questions + 1):
+        section, question = flat[min(number, len(flat)) - 1]
+        question = copy.deepcopy(question)
+        question["question_number"] = number
+        section["questions"].append(question)
+    paper["sections"] = [s for s in paper["sections"] if s["questions"]]
+    return paper
+
+
+def questions_in(data: Any) -> int:
+    if not isinstance(data, dict):
+        return 0
+    return sum(len(s.get("questions") or []) for s in data.get("sections") or [] if isinstance(s, dict))
+
+
+def time_decoder(decode: Callable[[str], Any], text: str, repeat: int) -> Dict[str, Any]:
+    seconds: List[float] = []
+    result, error = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        try:
+            result = decode(text)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"[:160]
+        seconds.append(time.perf_counter() - started)
+    return {
+        "ok": error is None,
+        "error": error,
+        "questions": questions_in(result),
+        "result": result,
+        "mean_ms": ms(sum(seconds) / len(seconds)),
+        "p50_ms": ms(percentile(seconds, 50)),
+        "p95_ms": ms(percentile(seconds, 95)),
+    }
+
+
+def latex_intact(data: Any) -> bool:
+    """True when every question text still contains the single-backslash \\frac the fake backend writes."""
+    if not isinstance(data, dict):
+        return False
+    texts = [q.get("question_text", "") for s in data.get("sections") or [] for q in s.get("questions") or []]
+    return bool(texts) and all("\\frac{" in t and "\\\\frac" not in t and "\f" not in t for t in texts)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--board", default="CBSE")
+    parser.add_argument("--class-num", type=int, default=10)
+    parser.add_argument("--subject", default="Mathematics")
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args()
+
+    paper = build_paper(args.board, args.class_num, args.subject, args.questions)
+    fenced = "```json\n" + json.dumps(paper, indent=2, ensure_ascii=False) + "\n```"
+    decoders = {"legacy": legacy_load, "tokenizer": gemini_service._load_model_json}
+
+    rows = {}
+    for variant, text in _variants(fenced).items():
+        row = {"chars": len(text)}
+        for name, decode in decoders.items():
+            timing = time_decoder(decode, text, args.repeat)
+            timing["latex_intact"] = latex_intact(timing.pop("result"))
+            row[name] = timing
+        legacy_ms, tokenizer_ms = row["legacy"]["mean_ms"], row["tokenizer"]["mean_ms"]
+        row["speedup"] = round(legacy_ms / tokenizer_ms, 2) if tokenizer_ms else None
+        rows[variant] = row
+
+    print(f"\n{args.questions}-question {args.board} class {args.class_num} {args.subject} paper, "
+          f"{args.repeat} runs per cell\n")
+    header = (f"{'variant':17} {'chars':>7} | {'legacy ms':>9} {'p95':>7} {'qs':>3} {'latex':>5} | "
+              f"{'tokenizer ms':>12} {'p95':>7} {'qs':>3} {'latex':>5} | {'speedup':>7}")
+    print(header)
+    print("-" * len(header))
+    for variant, row in rows.items():
+        cells = []
+        for name in decoders:
+            t = row[name]
+            qs = t["questions"] if t["ok"] else "ERR"
+            width = 9 if name == "legacy" else 12
+            cells.append(f"{t['mean_ms']:>{width}} {t['p95_ms']:>7} {qs:>3} {str(t['latex_intact']):>5}")
+        print(f"{variant:17} {row['chars']:>7} | {cells[0]} | {cells[1]} | {row['speedup']:>7}")
+    for variant, row in rows.items():
+        for name in decoders:
+            if row[name]["error"]:
+                print(f"  {variant} / {name}: {row[name]['error']}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"questions": args.questions, "repeat": args.repeat, "variants": rows}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
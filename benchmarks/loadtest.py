@@ -0,0 +1,239 @@
+"""
+End-to-end load test for the AI Grader API (standard library only)
+
+Drives N simulated students through create -> start -> save answers -> submit
+-> evaluate -> report and prints p50/p95/p99 latency per endpoint plus
+throughput. Run it against a server using the offline Gemini stand-in so no
+quota is spent:
+
+    GEMINI_BACKEND=fake GEMINI_RPM_LIMIT=0 GEMINI_TPM_LIMIT=0 GEMINI_RPD_LIMIT=0 \\
+        uvicorn backend.main:app --port 8000
+    python benchmarks/loadtest.py --students 50 --concurrency 20
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+
+class Recorder:
+    """Latencies and failures per endpoint template"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.flows: List[float] = []
+        self.failed_flows: List[str] = []
+
+    def record(self, endpoint: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def flow_done(self, seconds: float) -> None:
+        with self._lock:
+            self.flows.append(seconds)
+
+    def flow_failed(self, reason: str) -> None:
+        with self._lock:
+            self.failed_flows.append(reason)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (values need not be sorted)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Client:
+    def __init__(self, base_url: str, recorder: Recorder, timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.recorder = recorder
+        self.timeout = timeout
+
+    def call(self, method: str, endpoint: str, path: str, body: Optional[Dict[str, Any]] = None) -> Tuple[int, Any]:
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=data,
+            method=method,
+            headers={"Content-Type": "application/json"} if data else {},
+        )
+        started = time.perf_counter()
+        status, payload = 0, None
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                status = response.status
+                payload = json.loads(response.read() or b"null")
+        except urllib.error.HTTPError as e:
+            status = e.code
+            payload = e.read().decode(errors="replace")
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            payload = str(e)
+        self.recorder.record(endpoint, time.perf_counter() - started, 200 <= status < 300)
+        return status, payload
+
+
+def student_flow(client: Client, index: int, args: argparse.Namespace) -> None:
+    started = time.perf_counter()
+    rng = random.Random(args.seed + index)
+
+    status, exam = client.call("POST", "POST /exam/create", "/api/exam/create", {
+        "user_name": f"Load Student {index}",
+        "user_email": f"load{index}.{args.run_id}@example.com",
+        "board": args.board,
+        "class_num": args.class_num,
+        "subject": args.subject,
+        "difficulty_level": "medium",
+        "fresh": args.fresh,
+    })
+    if status != 200:
+        client.recorder.flow_failed(f"create_exam {status}")
+        return
+    exam_id = exam["id"]
+
+    client.call("POST", "POST /exam/start", "/api/exam/start", {"exam_id": exam_id})
+    status, questions = client.call("GET", "GET /exam/{id}/questions", f"/api/exam/{exam_id}/questions")
+    if status != 200:
+        client.recorder.flow_failed(f"questions {status}")
+        return
+
+    answered = questions if args.answer_ratio >= 1 else [q for q in questions if rng.random() < args.answer_ratio]
+    for question in answered:
+        body = {"exam_id": exam_id, "question_id": question["id"]}
+        if question["question_type"] == "MCQ":
+            body["selected_option"] = rng.choice("ABCD")
+        else:
+            body["typed_answer"] = f"Using $\\frac{{a}}{{b}} = {rng.randint(1, 9)}$, the result follows in two steps."
+            if question.get("has_internal_choice"):
+                body["selected_choice"] = "main"
+        client.call("POST", "POST /answer/save", "/api/answer/save", body)
+        if args.think_seconds:
+            time.sleep(rng.uniform(0, args.think_seconds))
+
+    client.call("POST", "POST /exam/{id}/submit", f"/api/exam/{exam_id}/submit")
+
+    status, job = client.call("POST", "POST /evaluation/evaluate", "/api/evaluation/evaluate", {"exam_id": exam_id})
+    if status not in (200, 202):
+        client.recorder.flow_failed(f"evaluate {status}")
+        return
+    deadline = time.monotonic() + args.evaluation_timeout
+    while job.get("status") in ("queued", "running") and job.get("job_id"):
+        if time.monotonic() > deadline:
+            client.recorder.flow_failed("evaluation timeout")
+            return
+        time.sleep(args.poll_seconds)
+        status, job = client.call("GET", "GET /evaluation/jobs/{id}", f"/api/evaluation/jobs/{job['job_id']}")
+        if status != 200:
+            client.recorder.flow_failed(f"job poll {status}")
+            return
+    if job.get("status") != "succeeded":
+        client.recorder.flow_failed(f"evaluation {job.get('status')}: {job.get('last_error')}")
+        return
+
+    status, _ = client.call("GET", "GET /evaluation/{id}/report", f"/api/evaluation/{exam_id}/report")
+    if status != 200:
+        client.recorder.flow_failed(f"report {status}")
+        return
+    client.recorder.flow_done(time.perf_counter() - started)
+
+
+def report(recorder: Recorder, elapsed: float, students: int) -> Dict[str, Any]:
+    endpoints = {}
+    for endpoint, values in sorted(recorder.latencies.items()):
+        endpoints[endpoint] = {
+            "count": len(values),
+            "errors": recorder.errors.get(endpoint, 0),
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+            "max_ms": round(max(values) * 1000, 1),
+        }
+    total_requests = sum(len(v) for v in recorder.latencies.values())
+    return {
+        "students": students,
+        "completed": len(recorder.flows),
+        "failed": len(recorder.failed_flows),
+        "failures": recorder.failed_flows[:20],
+        "elapsed_seconds": round(elapsed, 2),
+        "requests": total_requests,
+        "requests_per_second": round(total_requests / elapsed, 2) if elapsed else 0.0,
+        "students_per_minute": round(len(recorder.flows) / elapsed * 60, 2) if elapsed else 0.0,
+        "flow_p50_seconds": round(percentile(recorder.flows, 50), 2),
+        "flow_p95_seconds": round(percentile(recorder.flows, 95), 2),
+        "endpoints": endpoints,
+    }
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    print(f"\nstudents={result['students']} completed={result['completed']} failed={result['failed']} "
+          f"elapsed={result['elapsed_seconds']}s")
+    print(f"throughput: {result['requests_per_second']} req/s, {result['students_per_minute']} students/min; "
+          f"flow p50={result['flow_p50_seconds']}s p95={result['flow_p95_seconds']}s\n")
+    header = f"{'endpoint':34} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for endpoint, row in result["endpoints"].items():
+        print(f"{endpoint:34} {row['count']:>6} {row['errors']:>6} {row['p50_ms']:>9} "
+              f"{row['p95_ms']:>9} {row['p99_ms']:>9} {row['max_ms']:>9}")
+    for failure in result["failures"]:
+        print(f"  failed: {failure}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--students", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--ramp-seconds", type=float, default=0.0, help="spread student start times over this window")
+    parser.add_argument("--board", default="CBSE")
+    parser.add_argument("--class-num", type=int, default=10)
+    parser.add_argument("--subject", default="Mathematics")
+    parser.add_argument("--fresh", action="store_true", help="bypass the paper cache (one generation per student)")
+    parser.add_argument("--answer-ratio", type=float, default=0.8, help="fraction of questions answered")
+    parser.add_argument("--think-seconds", type=float, default=0.0, help="max pause between answer saves")
+    parser.add_argument("--poll-seconds", type=float, default=1.0)
+    parser.add_argument("--evaluation-timeout", type=float, default=600.0)
+    parser.add_argument("--timeout", type=float, default=300.0, help="per-request timeout")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args()
+    args.run_id = int(time.time())
+
+    recorder = Recorder()
+    client = Client(args.base_url, recorder, args.timeout)
+
+    def run(index: int) -> None:
+        if args.ramp_seconds:
+            time.sleep(args.ramp_seconds * index / max(1, args.students))
+        try:
+            student_flow(client, index, args)
+        except Exception as e:  # keep the run going; report the failure
+            recorder.flow_failed(f"{type(e).__name__}: {e}")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(run, range(args.students)))
+    result = report(recorder, time.perf_counter() - started, args.students)
+
+    print_report(result)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(result, f, indent=2)
+    return 0 if result["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
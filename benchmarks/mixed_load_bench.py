@@ -0,0 +1,152 @@
+"""
+Mixed read/write throughput per server worker (standard library only)
+
+Creates and starts a set of exams, then has C concurrent clients hit them with
+the exam-taking mix for a fixed time: autosaves, current-question and answer
+reads, timer reads/updates and summaries. Prints requests/s in total and per
+uvicorn worker, with latency percentiles per endpoint. Run it against a server
+on the offline Gemini stand-in, once per build or database you want to compare:
+
+    GEMINI_BACKEND=fake GEMINI_RPM_LIMIT=0 GEMINI_TPM_LIMIT=0 GEMINI_RPD_LIMIT=0 \\
+        uvicorn backend.main:app --port 8000 --workers 2
+    python benchmarks/mixed_load_bench.py --server-workers 2 --concurrency 32 --seconds 20
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadtest import Client, Recorder, percentile  # noqa: E402
+
+Operation = Callable[[Client, Dict[str, Any], random.Random], None]
+
+
+def save_answer(client: Client, exam: Dict[str, Any], rng: random.Random) -> None:
+    question = rng.choice(exam["questions"])
+    body = {"exam_id": exam["id"], "question_id": question["id"]}
+    if question["question_type"] == "MCQ":
+        body["selected_option"] = rng.choice("ABCD")
+    else:
+        body["typed_answer"] = f"Since $x^2 = {rng.randint(1, 99)}$, we get $x = \\pm\\sqrt{{x^2}}$."
+    client.call("POST", "POST /answer/save", "/api/answer/save", body)
+
+
+def get_answer(client: Client, exam: Dict[str, Any], rng: random.Random) -> None:
+    question = rng.choice(exam["questions"])
+    client.call("GET", "GET /answer/get/{exam}/{q}", f"/api/answer/get/{exam['id']}/{question['id']}")
+
+
+# (weight, name, operation): roughly what an exam-taking frontend sends
+MIX: List[Tuple[int, Operation]] = [
+    (35, save_answer),
+    (20, lambda c, e, r: c.call("GET", "GET /exam/{id}/current", f"/api/exam/{e['id']}/current")),
+    (15, lambda c, e, r: c.call("GET", "GET /exam/{id}/answers", f"/api/exam/{e['id']}/answers")),
+    (10, get_answer),
+    (10, lambda c, e, r: c.call("GET", "GET /exam/{id}/timer", f"/api/exam/{e['id']}/timer")),
+    (5, lambda c, e, r: c.call(
+        "POST", "POST /exam/{id}/update-timer", f"/api/exam/{e['id']}/update-timer?time_remaining={r.randint(60, 10800)}"
+    )),
+    (5, lambda c, e, r: c.call("GET", "GET /evaluation/{id}/summary", f"/api/evaluation/{e['id']}/summary")),
+]
+
+
+def create_exams(client: Client, count: int, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    exams = []
+    for index in range(count):
+        status, exam = client.call("POST", "setup", "/api/exam/create", {
+            "user_name": f"Mixed Load {index}",
+            "user_email": f"mixed{index}.{args.run_id}@example.com",
+            "board": args.board,
+            "class_num": args.class_num,
+            "subject": args.subject,
+            "difficulty_level": "medium",
+        })
+        if status != 200:
+            raise RuntimeError(f"create_exam failed with {status}: {exam}")
+        client.call("POST", "setup", "/api/exam/start", {"exam_id": exam["id"]})
+        status, questions = client.call("GET", "setup", f"/api/exam/{exam['id']}/questions")
+        if status != 200:
+            raise RuntimeError(f"questions failed with {status}: {questions}")
+        exams.append({"id": exam["id"], "questions": questions})
+    return exams
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--server-workers", type=int, default=1, help="uvicorn --workers of the server under test")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--exams", type=int, default=16, help="exams shared by the clients")
+    parser.add_argument("--seconds", type=float, default=15.0, help="measured duration")
+    parser.add_argument("--board", default="CBSE")
+    parser.add_argument("--class-num", type=int, default=10)
+    parser.add_argument("--subject", default="Mathematics")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args()
+    args.run_id = int(time.time())
+
+    exams = create_exams(Client(args.base_url, Recorder(), args.timeout), args.exams, args)
+
+    recorder = Recorder()
+    client = Client(args.base_url, recorder, args.timeout)
+    weights = [weight for weight, _ in MIX]
+    operations = [operation for _, operation in MIX]
+    deadline = time.perf_counter() + args.seconds
+
+    def run(index: int) -> None:
+        rng = random.Random(args.seed + index)
+        while time.perf_counter() < deadline:
+            operation = rng.choices(operations, weights)[0]
+            operation(client, rng.choice(exams), rng)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(run, range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    requests = sum(len(v) for v in recorder.latencies.values())
+    result = {
+        "concurrency": args.concurrency,
+        "server_workers": args.server_workers,
+        "elapsed_seconds": round(elapsed, 2),
+        "requests": requests,
+        "errors": sum(recorder.errors.values()),
+        "requests_per_second": round(requests / elapsed, 1),
+        "requests_per_second_per_worker": round(requests / elapsed / args.server_workers, 1),
+        "endpoints": {
+            endpoint: {
+                "count": len(values),
+                "errors": recorder.errors.get(endpoint, 0),
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p95_ms": round(percentile(values, 95) * 1000, 1),
+                "p99_ms": round(percentile(values, 99) * 1000, 1),
+            }
+            for endpoint, values in sorted(recorder.latencies.items())
+        },
+    }
+
+    print(f"\nconcurrency={args.concurrency} server_workers={args.server_workers} elapsed={result['elapsed_seconds']}s "
+          f"requests={requests} errors={result['errors']}")
+    print(f"throughput: {result['requests_per_second']} req/s, "
+          f"{result['requests_per_second_per_worker']} req/s per worker\n")
+    header = f"{'endpoint':34} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for endpoint, row in result["endpoints"].items():
+        print(f"{endpoint:34} {row['count']:>6} {row['errors']:>6} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9}")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(result, f, indent=2)
+    return 0 if result["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+SQL query-count check for the per-exam views
+
+Builds exams of different sizes in a scratch SQLite database (every question
+answered, every other answer with an uploaded PDF; one submitted and one in
+progress per size) and counts the statements
+each view (and the exam snapshot loaders behind them) issues. A view whose
+count grows with the number of questions has an N+1; a view over its budget
+has regressed; a snapshot missing questions, answers or files is wrong.
+Exits non-zero on any of them.
+
+    python benchmarks/query_count_check.py
+    python benchmarks/query_count_check.py --sizes 5 40 120 --verbose
+"""
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_BACKEND", "fake")  # never call the real API from a benchmark
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from backend.database import Base  # noqa: E402
+from backend.evaluation_runner import gather_inputs  # noqa: E402
+from backend.exam_snapshot import load_exam_snapshot, load_question_at  # noqa: E402
+from backend.models import (  # noqa: E402
+    Answer, BoardEnum, Exam, ExamStatus, Question, QuestionType, UploadedFile, User
+)
+from backend.routers import answer as answer_router  # noqa: E402
+from backend.routers import evaluation as evaluation_router  # noqa: E402
+from backend.routers import exam as exam_router  # noqa: E402
+
+# Statements allowed per view, whatever the number of questions
+BUDGETS = {
+    "snapshot load_exam_snapshot": 3,
+    "snapshot load_exam_snapshot no answers": 2,
+    "snapshot load_question_at": 1,
+    "evaluation gather_inputs": 4,  # includes the caller's exam lookup
+    "exam get_all_questions": 2,
+    "exam get_all_answers": 3,
+    "exam get_current_question": 2,
+    "exam next_question": 4,
+    "answer get_answer": 2,
+    "evaluation get_exam_summary": 3,
+    "evaluation get_full_question_paper": 2,
+}
+
+
+class QueryCounter:
+    """Counts statements sent to the database while active."""
+
+    def __init__(self, engine):
+        self.count = 0
+        self.statements: List[str] = []
+        self.active = False
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active:
+            self.count += 1
+            self.statements.append(" ".join(statement.split())[:140])
+
+    @contextmanager
+    def counting(self):
+        self.count, self.statements, self.active = 0, [], True
+        try:
+            yield self
+        finally:
+            self.active = False
+
+
+def build_exam(db: Session, questions: int, status: ExamStatus = ExamStatus.SUBMITTED) -> Dict[str, int]:
+    user = User(name="Query Check", email=f"query-check-{questions}-{status.value}@example.com")
+    db.add(user)
+    db.flush()
+    exam = Exam(
+        user_id=user.id,
+        board=BoardEnum.CBSE,
+        class_num=10,
+        subject="Mathematics",
+        duration_minutes=180,
+        total_marks=questions * 2,
+        paper_json={"instructions": ["All questions are compulsory."], "sections": []},
+        status=status,
+        current_question_index=questions // 2,
+        total_questions=questions,
+    )
+    db.add(exam)
+    db.flush()
+    rows = []
+    for number in range(1, questions + 1):
+        mcq = number % 2 == 1
+        question = Question(
+            exam_id=exam.id,
+            section="A" if mcq else "B",
+            sequence_number=number,
+            question_text=f"Question {number}: evaluate $\\frac{{{number}}}{{2}}$",
+            question_type=QuestionType.MCQ if mcq else QuestionType.SHORT_ANSWER,
+            marks=1 if mcq else 3,
+            options_json={"A": "1", "B": "2", "C": "3", "D": "4"} if mcq else None,
+            correct_answer="B" if mcq else None,
+        )
+        db.add(question)
+        db.flush()
+        answer = Answer(
+            exam_id=exam.id,
+            question_id=question.id,
+            selected_option="B" if mcq else None,
+            typed_answer=None if mcq else f"Answer {number}",
+        )
+        db.add(answer)
+        db.flush()
+        if not mcq:
+            db.add(UploadedFile(answer_id=answer.id, filename=f"q{number}.pdf", file_path=f"/tmp/q{number}.pdf", file_size=1024))
+        rows.append(question.id)
+    db.commit()
+    return {"exam_id": exam.id, "question_id": rows[len(rows) // 2]}
+
+
+def views(
+    size: int,
+    ids: Dict[str, int],
+    live_ids: Dict[str, int]
+) -> Dict[str, Callable[[AsyncSession], Awaitable[Any]]]:
+    exam_id, question_id = ids["exam_id"], ids["question_id"]
+
+    async def snapshot(db: AsyncSession, answers: bool = True):
+        loaded = await load_exam_snapshot(db, exam_id, answers)
+        # A cheap load that drops rows is not a pass
+        assert len(loaded.questions) == size, f"{len(loaded.questions)} of {size} questions loaded"
+        if answers:
+            assert all(q.answer is not None for q in loaded.questions), "answers missing"
+            files = sum(len(q.answer.files) for q in loaded.questions)
+            assert files == size // 2, f"{files} of {size // 2} uploaded files loaded"
+
+    async def question_at(db: AsyncSession):
+        loaded = await load_question_at(db, exam_id, size // 2)
+        assert loaded is not None and loaded.answer is not None, "question or its answer missing"
+
+    async def evaluation_inputs(db: AsyncSession):
+        return await gather_inputs(db, await db.get(Exam, exam_id))
+
+    return {
+        "snapshot load_exam_snapshot": snapshot,
+        "snapshot load_exam_snapshot no answers": lambda db: snapshot(db, answers=False),
+        "snapshot load_question_at": question_at,
+        "evaluation gather_inputs": evaluation_inputs,
+        "exam get_all_questions": lambda db: exam_router.get_all_questions(exam_id, db),
+        "exam get_all_answers": lambda db: exam_router.get_all_answers(exam_id, db),
+        "exam get_current_question": lambda db: exam_router.get_current_question(exam_id, db),
+        "exam next_question": lambda db: exam_router.next_question(live_ids["exam_id"], db),
+        "answer get_answer": lambda db: answer_router.get_answer(exam_id, question_id, db),
+        "evaluation get_exam_summary": lambda db: evaluation_router.get_exam_summary(exam_id, db),
+        "evaluation get_full_question_paper": lambda db: evaluation_router.get_full_question_paper(exam_id, db),
+    }
+
+
+async def check(args: argparse.Namespace) -> int:
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    counter = QueryCounter(engine.sync_engine)
+
+    async with session_factory() as db:
+        exams = {}
+        for size in args.sizes:
+            exams[size] = (
+                await db.run_sync(build_exam, size),
+                await db.run_sync(build_exam, size, ExamStatus.IN_PROGRESS),
+            )
+
+    counts: Dict[str, Dict[int, int]] = {}
+    statements: Dict[str, List[str]] = {}
+    failures = []
+    for size, (ids, live_ids) in exams.items():
+        for name, view in views(size, ids, live_ids).items():
+            async with session_factory() as db:  # a fresh session per view, like a request
+                with counter.counting():
+                    try:
+                        await view(db)
+                    except AssertionError as e:
+                        print(f"{name} ({size} questions): incomplete result: {e}")
+                        failures.append(name)
+            counts.setdefault(name, {})[size] = counter.count
+            statements[name] = counter.statements
+
+    print(f"\n{'view':40} " + " ".join(f"{f'{s} qs':>7}" for s in args.sizes) + f" {'budget':>7}")
+    for name, by_size in counts.items():
+        budget = BUDGETS[name]
+        flag = ""
+        if len(set(by_size.values())) > 1:
+            flag = "  grows with questions (N+1)"
+        elif max(by_size.values()) > budget:
+            flag = "  over budget"
+        if flag:
+            failures.append(name)
+        print(f"{name:40} " + " ".join(f"{by_size[s]:>7}" for s in args.sizes) + f" {budget:>7}{flag}")
+        if args.verbose:
+            for statement in statements[name]:
+                print(f"    {statement}")
+
+    await engine.dispose()
+    if failures:
+        print(f"\nFAILED: {', '.join(failures)}")
+        return 1
+    print("\nOK")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 40])
+    parser.add_argument("--verbose", action="store_true", help="print the statements of the largest exam")
+    return asyncio.run(check(parser.parse_args()))
+
+if __name__ == "__main__":
+    sys.exit(main())
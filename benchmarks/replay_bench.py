@@ -0,0 +1,424 @@
+"""
+Replay benchmark for recorded Gemini responses
+
+Replays cassettes (raw model responses saved with GEMINI_CASSETTE_MODE=record)
+through the CPU-side stages of the app and reports timing and success rates:
+
+- JSON decoding, per stage of GeminiService._load_model_json
+  (json = C decoder fast path, tokenizer = backend.model_json reader,
+  json_repair = last resort)
+- full response parsing (paper / section / evaluation parsers)
+- paper validation: issues backend.paper_validation would send back for repair
+- create_exam question insertion into a scratch SQLite database
+- evaluation prompt building for the parsed papers
+
+Record a corpus from real traffic:
+    GEMINI_CASSETTE_MODE=record uvicorn backend.main:app
+or synthesize one offline from the fake backend, including messy variants
+(prose-wrapped, smart quotes, trailing commas, single backslashes, truncated):
+    python benchmarks/replay_bench.py --synthesize --cassettes /tmp/cassettes
+
+Then:
+    python benchmarks/replay_bench.py --cassettes /tmp/cassettes --repeat 5
+"""
+from typing import Any, Callable, Dict, List, Optional
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_BACKEND", "fake")  # never call the real API from a benchmark
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from backend import fake_gemini, paper_validation  # noqa: E402
+from backend.cassettes import CassetteStore  # noqa: E402
+from backend.config import BOARD_PATTERNS, get_board_pattern, settings  # noqa: E402
+from backend.database import Base  # noqa: E402
+from backend.gemini_service import gemini_service  # noqa: E402
+from backend.models import BoardEnum, Exam, ExamStatus, User  # noqa: E402
+from backend.paper_questions import build_questions  # noqa: E402
+
+CLASS_FOR_BAND = {"class_6_to_8": 7, "class_9_to_10": 10, "class_11_to_12": 12}
+SUBJECTS = ["Mathematics", "Physics"]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(pct / 100 * len(ordered))) - 1]
+
+
+def ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+# ---------- corpus synthesis ----------
+
+def _variants(text: str) -> Dict[str, str]:
+    """Messy renderings of a clean fenced response, one per fallback stage of the parser."""
+    body = text.split("```json", 1)[-1].rsplit("```", 1)[0].strip()
+    return {
+        "clean": text,
+        "prose": f"Here is the requested output.\n\n{body}\n\nLet me know if you need changes.",
+        "smart_quotes": re.sub(r'"title": "([^"]*)"', '"title": “\\1”', body),
+        "trailing_commas": re.sub(r'("|\d|true|false|null|\]|\})(\s*\n\s*)([}\]])', r"\1,\2\3", body),
+        "single_backslash": body.replace("\\\\", "\\"),
+        "truncated": body[: int(len(body) * 0.97)],
+    }
+
+
+def synthesize(store: CassetteStore) -> int:
+    """Write paper, section and evaluation cassettes for every BOARD_PATTERNS entry."""
+    written = 0
+    for board, bands in BOARD_PATTERNS.items():
+        for band in bands:
+            class_num = CLASS_FOR_BAND[band]
+            pattern = get_board_pattern(board, class_num)
+            for subject in SUBJECTS:
+                prompts = [gemini_service._create_question_generation_prompt(board, class_num, subject, pattern)]
+                allocation = gemini_service._allocate_internal_choices(pattern)
+                first_number = 1
+                for section, details in pattern["sections"].items():
+                    prompts.append(gemini_service._create_section_generation_prompt(
+                        board, class_num, subject, pattern, section, first_number, allocation.get(section, 0)
+                    ))
+                    first_number += details["questions"]
+
+                _, paper_text = fake_gemini.respond(prompts[0])
+                paper = gemini_service._load_model_json(paper_text)
+                items = _answers_for(paper)
+                prompts.append(gemini_service._create_evaluation_prompt(
+                    board, class_num, subject, {"name": "Bench Student", "email": "bench@example.com"},
+                    items, paper
+                ))
+
+                for prompt in prompts:
+                    kind, text = fake_gemini.respond(prompt)
+                    for variant, variant_text in _variants(text).items():
+                        key = hashlib.sha256(f"{variant}\n{prompt}".encode("utf-8")).hexdigest()
+                        store.write({
+                            "key": key,
+                            "kind": kind,
+                            "variant": variant,
+                            "model": "synthetic",
+                            "prompt": prompt,
+                            "response_text": variant_text,
+                        })
+                        written += 1
+    return written
+
+
+# ---------- stages ----------
+
+def _answers_for(paper: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """questions_with_answers for a parsed paper, every question answered."""
+    items = []
+    number = 1
+    for section in paper["sections"]:
+        for q in section["questions"]:
+            is_mcq = (q.get("question_type") or "").upper() == "MCQ"
+            items.append({
+                "question": {
+                    "id": number,
+                    "sequence_number": number,
+                    "section": section["section"],
+                    "question_text": q["question_text"],
+                    "question_type": q.get("question_type") or "Short Answer",
+                    "marks": q["marks"],
+                    "has_internal_choice": q.get("has_internal_choice", False),
+                    "alternative_question_text": q.get("alternative_question_text"),
+                    "correct_answer": q.get("correct_answer"),
+                },
+                "answer": {
+                    "typed_answer": None if is_mcq else "Using $\\frac{a}{b} = 2$ the result follows.",
+                    "selected_option": "B" if is_mcq else None,
+                    "selected_choice": "main" if q.get("has_internal_choice") else None,
+                    "uploaded_files_count": 0,
+                    "uploaded_files": [],
+                },
+            })
+            number += 1
+    return items
+
+
+def _parser_for(entry: Dict[str, Any]) -> Optional[Callable[[str], Any]]:
+    """Full response parser for a cassette, with the inputs recovered from its prompt."""
+    prompt = entry.get("prompt", "")
+    kind = entry.get("kind")
+    if kind == "paper":
+        request = fake_gemini.paper_request(prompt)
+        if request:
+            pattern = get_board_pattern(request["board"], request["class_num"])
+            return lambda text: gemini_service._parse_question_paper_response(text, pattern)
+    if kind == "section":
+        request = fake_gemini.section_request(prompt)
+        if request:
+            return lambda text: gemini_service._parse_section_response(
+                text, request["section"], request["details"], request["first_number"]
+            )
+    if kind == "evaluation":
+        request = fake_gemini.evaluation_request(prompt)
+        if request:
+            items = [
+                {
+                    "question": {
+                        "sequence_number": q["sequence_number"],
+                        "section": q["section"],
+                        "marks": q["marks"],
+                        "has_internal_choice": q["has_internal_choice"],
+                    },
+                    "answer": {"typed_answer": "x"} if q["attempted"] else None,
+                }
+                for q in request["questions"]
+            ]
+            return lambda text: gemini_service._parse_evaluation_response(text, items)
+    return None
+
+
+class Results:
+    def __init__(self):
+        self.stage_seconds: Dict[str, List[float]] = {}
+        self.parsed_by: Dict[str, int] = {}
+        self.by_kind: Dict[str, Dict[str, Any]] = {}
+        self.by_variant: Dict[str, Dict[str, int]] = {}
+        self.insert_seconds: List[float] = []
+        self.inserted_questions = 0
+        self.insert_errors: Dict[str, int] = {}
+        self.prompt_seconds: List[float] = []
+        self.prompt_chars: List[int] = []
+        self.paper_issues: Dict[str, int] = {}
+        self.papers_needing_repair = 0
+
+    def kind(self, kind: str) -> Dict[str, Any]:
+        return self.by_kind.setdefault(kind, {"count": 0, "ok": 0, "seconds": [], "errors": {}})
+
+
+def run_json_stages(text: str, results: Results) -> Optional[Any]:
+    stages: List[tuple] = []
+    try:
+        data = gemini_service._load_model_json(text, trace=lambda stage, seconds: stages.append((stage, seconds)))
+    except Exception:
+        data = None
+    for stage, seconds in stages:
+        results.stage_seconds.setdefault(stage, []).append(seconds)
+    decoded_by = [s for s, _ in stages if s in ("json", "tokenizer", "json_repair")]
+    label = decoded_by[-1] if decoded_by and data is not None else "failed"
+    results.parsed_by[label] = results.parsed_by.get(label, 0) + 1
+    return data
+
+
+def run_insertion(session_factory: Any, paper: Dict[str, Any], board: str, class_num: int, results: Results) -> bool:
+    db = session_factory()
+    try:
+        user = db.query(User).first()
+        if user is None:
+            user = User(name="Bench", email="bench@example.com")
+            db.add(user)
+            db.commit()
+        exam = Exam(
+            user_id=user.id,
+            board=BoardEnum(board),
+            class_num=class_num,
+            subject="Bench",
+            duration_minutes=paper["duration_minutes"],
+            total_marks=paper["total_marks"],
+            paper_json=paper,
+            status=ExamStatus.CREATED,
+            current_question_index=0,
+        )
+        db.add(exam)
+        db.commit()
+
+        started = time.perf_counter()
+        try:
+            questions = build_questions(exam.id, paper)
+            db.add_all(questions)
+            db.commit()
+        except Exception as e:
+            # A paper that parsed but cannot be stored (e.g. a question repaired without marks)
+            db.rollback()
+            name = type(e).__name__
+            results.insert_errors[name] = results.insert_errors.get(name, 0) + 1
+            return False
+        results.insert_seconds.append(time.perf_counter() - started)
+        results.inserted_questions += len(questions)
+        return True
+    finally:
+        db.close()
+
+
+def run_prompt_building(paper: Dict[str, Any], board: str, class_num: int, results: Results) -> None:
+    items = _answers_for(paper)
+    started = time.perf_counter()
+    prompt = gemini_service._create_evaluation_prompt(
+        board, class_num, "Bench", {"name": "Bench Student", "email": "bench@example.com"}, items, paper
+    )
+    results.prompt_seconds.append(time.perf_counter() - started)
+    results.prompt_chars.append(len(prompt))
+
+
+def run(entries: List[Dict[str, Any]], repeat: int, database_url: str) -> Results:
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine)
+    results = Results()
+
+    for _ in range(repeat):
+        for entry in entries:
+            text = entry.get("response_text", "")
+            kind = entry.get("kind", "other")
+            variant = entry.get("variant", "recorded")
+            stats = results.kind(kind)
+            stats["count"] += 1
+
+            data = run_json_stages(text, results)
+
+            parser = _parser_for(entry)
+            ok = False
+            if parser is not None:
+                started = time.perf_counter()
+                try:
+                    parsed = parser(text)
+                    ok = True
+                except Exception as e:
+                    parsed = None
+                    name = type(e).__name__
+                    stats["errors"][name] = stats["errors"].get(name, 0) + 1
+                stats["seconds"].append(time.perf_counter() - started)
+            else:
+                parsed = data
+                ok = data is not None
+            stats["ok"] += int(ok)
+            variant_stats = results.by_variant.setdefault(variant, {"count": 0, "ok": 0})
+            variant_stats["count"] += 1
+            variant_stats["ok"] += int(ok)
+
+            if kind == "paper" and ok:
+                request = fake_gemini.paper_request(entry.get("prompt", "")) or {"board": "CBSE", "class_num": 10}
+                report = paper_validation.normalize_paper(parsed, get_board_pattern(request["board"], request["class_num"]))
+                results.papers_needing_repair += int(bool(report.issues))
+                for code, count in report.codes().items():
+                    results.paper_issues[code] = results.paper_issues.get(code, 0) + count
+                if report.fatal:
+                    continue  # the app regenerates these before storing anything
+                if run_insertion(session_factory, parsed, request["board"], request["class_num"], results):
+                    run_prompt_building(parsed, request["board"], request["class_num"], results)
+
+    engine.dispose()
+    return results
+
+
+def summarize(results: Results, corpus_size: int) -> Dict[str, Any]:
+    total = sum(results.parsed_by.values()) or 1
+    return {
+        "cassettes": corpus_size,
+        "json_stages": {
+            stage: {
+                "runs": len(values),
+                "share_pct": round(len(values) / total * 100, 1),
+                "mean_ms": ms(sum(values) / len(values)),
+                "p95_ms": ms(percentile(values, 95)),
+            }
+            for stage, values in results.stage_seconds.items()
+        },
+        "decoded_by": {
+            label: {"count": count, "pct": round(count / total * 100, 1)}
+            for label, count in sorted(results.parsed_by.items())
+        },
+        "parsers": {
+            kind: {
+                "count": stats["count"],
+                "success_pct": round(stats["ok"] / stats["count"] * 100, 1) if stats["count"] else 0.0,
+                "p50_ms": ms(percentile(stats["seconds"], 50)),
+                "p95_ms": ms(percentile(stats["seconds"], 95)),
+                "errors": stats["errors"],
+            }
+            for kind, stats in sorted(results.by_kind.items())
+        },
+        "variants": {
+            variant: {"count": v["count"], "success_pct": round(v["ok"] / v["count"] * 100, 1)}
+            for variant, v in sorted(results.by_variant.items())
+        },
+        "paper_validation": {
+            "papers_needing_repair": results.papers_needing_repair,
+            "issues": dict(sorted(results.paper_issues.items())),
+        },
+        "question_insertion": {
+            "papers": len(results.insert_seconds),
+            "errors": results.insert_errors,
+            "questions": results.inserted_questions,
+            "p50_ms": ms(percentile(results.insert_seconds, 50)),
+            "p95_ms": ms(percentile(results.insert_seconds, 95)),
+            "questions_per_second": round(results.inserted_questions / sum(results.insert_seconds), 1)
+            if results.insert_seconds else 0.0,
+        },
+        "evaluation_prompt": {
+            "builds": len(results.prompt_seconds),
+            "p50_ms": ms(percentile(results.prompt_seconds, 50)),
+            "p95_ms": ms(percentile(results.prompt_seconds, 95)),
+            "mean_chars": round(sum(results.prompt_chars) / len(results.prompt_chars)) if results.prompt_chars else 0,
+        },
+    }
+
+
+def print_summary(summary: Dict[str, Any]) -> None:
+    print(f"\ncassettes: {summary['cassettes']}\n")
+    print(f"{'json stage':22} {'runs':>7} {'share %':>8} {'mean ms':>9} {'p95 ms':>9}")
+    for stage, row in summary["json_stages"].items():
+        print(f"{stage:22} {row['runs']:>7} {row['share_pct']:>8} {row['mean_ms']:>9} {row['p95_ms']:>9}")
+    print("\ndecoded by: " + ", ".join(f"{k}={v['count']} ({v['pct']}%)" for k, v in summary["decoded_by"].items()))
+    print(f"\n{'parser':12} {'count':>6} {'ok %':>6} {'p50 ms':>9} {'p95 ms':>9}  errors")
+    for kind, row in summary["parsers"].items():
+        print(f"{kind:12} {row['count']:>6} {row['success_pct']:>6} {row['p50_ms']:>9} {row['p95_ms']:>9}  {row['errors'] or ''}")
+    if len(summary["variants"]) > 1:
+        print("\nsuccess by variant: " + ", ".join(f"{k}={v['success_pct']}%" for k, v in summary["variants"].items()))
+    pv = summary["paper_validation"]
+    print(f"\npapers needing repair: {pv['papers_needing_repair']}"
+          + (f" ({', '.join(f'{k}={v}' for k, v in pv['issues'].items())})" if pv["issues"] else ""))
+    ins = summary["question_insertion"]
+    print(f"\nquestion insertion: {ins['papers']} papers, {ins['questions']} questions, "
+          f"p50={ins['p50_ms']}ms p95={ins['p95_ms']}ms, {ins['questions_per_second']} questions/s"
+          + (f", failed: {ins['errors']}" if ins["errors"] else ""))
+    ev = summary["evaluation_prompt"]
+    print(f"evaluation prompt: {ev['builds']} builds, p50={ev['p50_ms']}ms p95={ev['p95_ms']}ms, ~{ev['mean_chars']} chars")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cassettes", default=settings.GEMINI_CASSETTE_DIR)
+    parser.add_argument("--synthesize", action="store_true", help="write a synthetic corpus into --cassettes first")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--kind", choices=["paper", "section", "evaluation"], help="only replay this kind")
+    parser.add_argument("--database-url", default="sqlite://", help="scratch database for question insertion")
+    parser.add_argument("--json", dest="json_path", help="also write the summary to this file")
+    args = parser.parse_args()
+
+    store = CassetteStore(args.cassettes)
+    if args.synthesize:
+        print(f"synthesized {synthesize(store)} cassettes in {args.cassettes}")
+
+    entries = [store.load(path) for path in store.paths()]
+    if args.kind:
+        entries = [e for e in entries if e.get("kind") == args.kind]
+    if not entries:
+        print(f"no cassettes in {args.cassettes} (record with GEMINI_CASSETTE_MODE=record or use --synthesize)")
+        return 1
+
+    summary = summarize(run(entries, args.repeat, args.database_url), len(entries))
+    print_summary(summary)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -55,7 +55,7 @@ function EvaluationScreen() {
 
       // For IN_PROGRESS or SUBMITTED, proceed with evaluation
       // The backend will auto-submit if still IN_PROGRESS
-      const evalResult = await evaluationAPI.evaluate(currentExam.id)
+      const evalResult = await evaluationAPI.evaluateAndWait(currentExam.id)
 
       // Refresh AI info after evaluation to show last-used model/key
       aiAPI
@@ -97,10 +97,30 @@ export const answerAPI = {
 
 // Evaluation endpoints
 export const evaluationAPI = {
+  // Queues evaluation; returns the job
   evaluate: async (examId) => {
     const response = await api.post('/evaluation/evaluate', { exam_id: examId })
     return response.data
   },
+
+  getJob: async (jobId) => {
+    const response = await api.get(`/evaluation/jobs/${jobId}`)
+    return response.data
+  },
+
+  // Queues evaluation, polls the job until it finishes, then returns the report
+  evaluateAndWait: async (examId, pollMs = 2000) => {
+    let job = await evaluationAPI.evaluate(examId)
+    while (job.status === 'queued' || job.status === 'running') {
+      await new Promise((resolve) => setTimeout(resolve, pollMs))
+      job = await evaluationAPI.getJob(job.job_id)
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.last_error || 'Evaluation failed')
+    }
+    return evaluationAPI.getReport(examId)
+  },
+
   getReport: async (examId) => {
     const response = await api.get(`/evaluation/${examId}/report`)
     return response.data
@@ -828,9 +828,19 @@ async function submitExam() {
 
 async function evaluateExam() {
     try {
-        const evaluation = await apiCall('/evaluation/evaluate', 'POST', {
+        // Evaluation runs as a background job; poll until it finishes
+        let job = await apiCall('/evaluation/evaluate', 'POST', {
             exam_id: currentExam.id
         });
+        while (job.status === 'queued' || job.status === 'running') {
+            await new Promise(resolve => setTimeout(resolve, 2000));
+            job = await apiCall(`/evaluation/jobs/${job.job_id}`);
+        }
+        if (job.status === 'failed') {
+            throw new Error(job.last_error || 'Evaluation failed');
+        }
+        
+        const evaluation = await apiCall(`/evaluation/${currentExam.id}/report`);
         
         const summary = await apiCall(`/evaluation/${currentExam.id}/summary`);
         